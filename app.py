@@ -1,164 +1,1003 @@
 import os
+import json
+import time
 import uuid
+import shutil
+import hashlib
 import threading
-import subprocess
+from contextlib import closing
 from pathlib import Path
-from flask import Flask, request, render_template, jsonify, send_file, abort
+from flask import (Flask, Response, request, render_template, jsonify, send_file, abort,
+                   stream_with_context)
+
+import metrics
+from audio import PcmPipe, StreamingTranscription, decode_pcm, iter_pcm_chunks
+from batch_engine import BatchEngine, BatchedTranscription
+from cascade import CascadeTranscription, resolve_fast_model
+from chunking import ParallelTranscription, default_processes
+from cluster import LeaseLost, WorkerRegistry
+from events import EventBus, format_sse
+from job_store import JobStore, TERMINAL_STATUSES
+from media import decode_timeout, probe
+from metrics import span
+from model_cache import get_cache
+from retention import InsufficientStorage, RetentionManager
+from result_cache import CachedSegment, default_cache, hash_file, make_key, save_and_hash
+from scheduler import JobScheduler, JobCancelled, QueueFull
+from search_index import get_search_index
+from url_ingest import RemoteMedia, extract_info, get_download_cache, select_audio_format
+from writers import MultiWriter, parse_formats
 
 # Dossiers d'E/S
-UPLOAD_DIR = Path("uploads")
-OUTPUT_DIR = Path("sorties")
-UPLOAD_DIR.mkdir(exist_ok=True)
-OUTPUT_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR = Path(os.environ.get("UPLOAD_DIR", "uploads"))
+OUTPUT_DIR = Path(os.environ.get("OUTPUT_DIR", "sorties"))
+# Uploads reprenables en cours (fichier partiel + métadonnées JSON)
+PARTIAL_DIR = UPLOAD_DIR / "partial"
+UPLOAD_CHUNK = 1024 * 1024
+
+# Conteneurs dont l'index peut se trouver en fin de fichier (illisibles en flux pur) :
+# en mode streaming, leurs octets sont aussi copiés sur disque en secours
+SPOOL_EXTENSIONS = {".mp4", ".m4a", ".mov", ".3gp"}
 
 # FFmpeg/ffprobe : on privilégie le PATH, avec fallback éventuel via variables d'env
 FFMPEG_PATH = os.environ.get("FFMPEG_BIN", "ffmpeg")
 FFPROBE_PATH = os.environ.get("FFPROBE_BIN", "ffprobe")
 
-app = Flask(__name__)
+# Modèles à précharger au démarrage (ex: "small,medium")
+PRELOAD_MODELS = [m for m in os.environ.get("PRELOAD_MODELS", "").split(",") if m.strip()]
+COMPUTE_TYPE = os.environ.get("COMPUTE_TYPE", "int8")
+
+# Décodage en flux : taille des fenêtres transcrites pendant que ffmpeg décode la suite
+# (0 = tout décoder en mémoire puis transcrire en une passe)
+STREAM_WINDOW_SECONDS = float(os.environ.get("STREAM_WINDOW_SECONDS", "600"))
+
+# Fichiers longs : découpe aux silences et transcription parallèle des blocs
+# (LONG_FILE_SECONDS = 0 désactive ce mode)
+LONG_FILE_SECONDS = float(os.environ.get("LONG_FILE_SECONDS", "1800"))
+CHUNK_SECONDS = float(os.environ.get("CHUNK_SECONDS", "600"))
+CHUNK_PROCESSES = int(os.environ.get("CHUNK_PROCESSES", "0"))
+
+# Ordonnancement : nombre de workers de transcription et taille de la file
+WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", "2"))
+MAX_QUEUE = int(os.environ.get("MAX_QUEUE", "20"))
+
+# Inférence groupée entre jobs (BatchedInferencePipeline) : taille max des lots
+# et attente max avant de lancer un lot incomplet
+BATCH_INFERENCE = os.environ.get("BATCH_INFERENCE", "0") == "1"
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "50"))
+
+# Persistance des jobs : base SQLite et fréquence des checkpoints
+# (durée de conservation et quotas : voir retention.py)
+JOB_DB = Path(os.environ.get("JOB_DB", "jobs.db"))
+CHECKPOINT_SECONDS = float(os.environ.get("CHECKPOINT_SECONDS", "5"))
 
-# Jobs state: job_id -> {...}
+# Cluster : décodage et inférence confiés à des workers distants (`transcribe.py worker`) ;
+# le front garde un thread par job suivi, qui attend les segments de son worker
+CLUSTER_ENABLED = os.environ.get("CLUSTER_ENABLED", "0") == "1"
+CLUSTER_MAX_JOBS = int(os.environ.get("CLUSTER_MAX_JOBS", "32"))
+# Attente maximale d'une demande de job par un worker (long polling)
+CLUSTER_MAX_WAIT = float(os.environ.get("CLUSTER_MAX_WAIT", "30"))
+
+# Le reloader de Flask lance un processus parent qui ne sert aucune requête
+DEBUG = os.environ.get("FLASK_DEBUG", "1") == "1"
+
+# Nombre maximal de résultats par page de /search
+SEARCH_MAX_LIMIT = int(os.environ.get("SEARCH_MAX_LIMIT", "100"))
+
+app = Flask(__name__)
+# Jobs actifs en mémoire (job_id -> {...}) : les lectures de statut ne touchent pas le disque.
+# Les jobs terminés n'y restent pas ; ils sont relus depuis le store SQLite.
 jobs = {}
+# Services du serveur, créés par init_services()
+scheduler = model_cache = result_cache = batch_engine = cluster = None
+store = search_index = retention = event_bus = None
 
-def get_duration(path: Path) -> float:
-    """Durée du média en secondes (via ffprobe)."""
-    try:
-        cmd = [FFPROBE_PATH, "-v", "error", "-show_entries", "format=duration",
-               "-of", "default=noprint_wrappers=1:nokey=1", str(path)]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        if result.returncode == 0 and result.stdout.strip():
-            return float(result.stdout.strip())
-        return 0.0
-    except Exception:
-        return 0.0
+def init_services():
+    """Crée les dossiers et les services du serveur (ordonnanceur, caches, store, index...).
 
-def extract_wav(input_path: Path, out_path: Path):
-    """Extrait l'audio en WAV mono 16kHz (silencieux)."""
-    cmd = [FFMPEG_PATH, "-y", "-i", str(input_path), "-ac", "1", "-ar", "16000",
-           "-vn", str(out_path), "-loglevel", "error"]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        if result.returncode != 0:
-            raise RuntimeError(result.stderr.strip() or "FFmpeg error")
-    except subprocess.TimeoutExpired:
-        raise RuntimeError("Timeout lors de l'extraction audio (5 minutes)")
+    Appelée à l'import de ce module, sauf dans les processus du pool de
+    chunking : lancés en "spawn", ils réimportent ce script sous le nom
+    __mp_main__ et n'ont besoin d'aucun de ces services.
+    """
+    global scheduler, model_cache, result_cache, batch_engine, cluster
+    global store, search_index, retention, event_bus
+    for d in (UPLOAD_DIR, OUTPUT_DIR, PARTIAL_DIR):
+        d.mkdir(parents=True, exist_ok=True)
+    scheduler = JobScheduler(workers=CLUSTER_MAX_JOBS if CLUSTER_ENABLED else WORKERS,
+                             max_queue=MAX_QUEUE,
+                             cpu_threads=int(os.environ.get("CPU_THREADS", "0")) or None)
+    model_cache = get_cache()
+    result_cache = default_cache()
+    # Chaque worker peut utiliser la même instance de modèle en parallèle
+    model_cache.num_workers = scheduler.workers
+    # Même budget de threads que les jobs du scheduler (et même instance de modèle)
+    batch_engine = BatchEngine(model_cache, COMPUTE_TYPE, scheduler.cpu_threads,
+                               batch_size=BATCH_SIZE,
+                               max_wait=BATCH_MAX_WAIT_MS / 1000) if BATCH_INFERENCE else None
+    # Workers distants enregistrés et répartition des jobs (mode cluster)
+    cluster = WorkerRegistry() if CLUSTER_ENABLED else None
+    store = JobStore(JOB_DB)
+    # Recherche plein texte, alimentée au fil des segments de chaque job
+    search_index = get_search_index()
+    # Média source, TTL des jobs, quotas disque et admission des uploads
+    retention = RetentionManager(store, UPLOAD_DIR, OUTPUT_DIR, PARTIAL_DIR,
+                                 extra_dirs={"result_cache": result_cache.root,
+                                             "download_cache": get_download_cache().root},
+                                 search_index=search_index)
+    # Diffusion SSE des changements d'état et des segments décodés
+    event_bus = EventBus()
+    register_gauges()
 
-def transcribe_job(job_id: str, source_path: Path, language: str = None,
-                   model_name: str = "small", vad: bool = False):
-    """Worker de transcription (thread)."""
-    try:
-        from faster_whisper import WhisperModel
+def get_job(job_id: str):
+    info = jobs.get(job_id)
+    return info if info is not None else store.get(job_id)
 
-        jobs[job_id]["status"] = "running"
-        jobs[job_id]["progress"] = 5
+def create_job(job_id: str, params: dict, timings: dict = None, **fields):
+    jobs[job_id] = {"status": "queued", "progress": 0, "txt": None, "msg": None,
+                    "queued_at": time.time(), "timings": timings or {}, **fields}
+    store.create(job_id, params=params, **fields)
 
-        # 1) Extraction audio
-        wav = OUTPUT_DIR / f"{job_id}.wav"
-        extract_wav(source_path, wav)
-        jobs[job_id]["progress"] = 15
+def job_public_state(job_id: str, info: dict) -> dict:
+    payload = {
+        "status": info["status"],
+        "progress": info.get("progress", 0),
+        "msg": info.get("msg"),
+        "language": info.get("language")
+    }
+    if info["status"] == "queued":
+        payload["position"] = scheduler.position(job_id)
+    if info.get("worker"):
+        payload["worker"] = info["worker"]
+    return payload
+
+def update_job(job_id: str, **fields):
+    """Met à jour l'état d'un job et le pousse aux abonnés SSE.
+
+    Sans effet pour un job déjà terminé (retiré de `jobs`) : un job rapide peut
+    finir avant que la route qui l'a mis en file publie son état "queued".
+    """
+    info = jobs.get(job_id)
+    if info is None:
+        return
+    info.update(fields)
+    terminal = info["status"] in TERMINAL_STATUSES
+    if terminal and info.get("timings"):
+        # Détail des temps par étape conservé avec le job terminé
+        fields["timings"] = info["timings"]
+    if fields:
+        store.update(job_id, **fields)
+    event_bus.publish(job_id, "status", job_public_state(job_id, info))
+    if terminal:
+        metrics.JOBS.inc(status=info["status"])
+        event_bus.close(job_id)
+        jobs.pop(job_id, None)
+
+def publish_queue_positions():
+    """Les jobs en attente avancent d'une place : on pousse leur nouvelle position."""
+    for queued_id in scheduler.queued_ids():
+        if queued_id in jobs:
+            update_job(queued_id)
 
-        total_dur = get_duration(source_path) or 0.0
+def check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise JobCancelled("Job annulé")
 
-        # 2) Chargement modèle
-        model = WhisperModel(model_name, device="cpu", compute_type="int8")
-        jobs[job_id]["progress"] = 25
+def transcribe_job(job_id: str, source, language: str = None,
+                   model_name: str = "small", vad: bool = False, cache_key: str = None,
+                   resume_from: float = 0.0, formats=("txt",), words: bool = False,
+                   cascade: str = None, cpu_threads: int = 0, cancel: threading.Event = None,
+                   beam_size: int = 5):
+    """Worker de transcription (exécuté par un worker du scheduler).
 
-        # 3) Transcription
-        params = {"language": language or None, "beam_size": 5}
+    `source` est le chemin du média, un PcmPipe (upload en flux, transcrit
+    pendant la réception) ou un RemoteMedia (URL, décodée pendant le téléchargement).
+    Avec `resume_from` > 0, reprend après le dernier checkpoint : les segments
+    déjà enregistrés sont réutilisés et le décodage repart de cet instant.
+    Les segments sont écrits au fil de l'eau dans chaque format de `formats`.
+    Avec `cascade` (modèle rapide), seules les zones incertaines passent par `model_name`.
+    En mode cluster, décodage et inférence ont lieu sur un worker distant.
+    """
+    started = time.time()
+    timings = jobs[job_id].setdefault("timings", {})
+    metrics.QUEUE_WAIT.observe(started - jobs[job_id].get("queued_at", started))
+    try:
+        check_cancel(cancel)
+        update_job(job_id, status="running", progress=5)
+        publish_queue_positions()
+
+        decoded = [CachedSegment(*row) for row in store.segments(job_id)] if resume_from else []
+        if resume_from and not language:
+            language = jobs[job_id].get("language")
+
+        remote = isinstance(source, RemoteMedia)
+        live = isinstance(source, PcmPipe)
+        if live:
+            # Durée connue seulement à la fin de l'upload
+            total_dur = source.duration if source.finished else 0.0
+        elif remote:
+            total_dur = source.duration
+        else:
+            with span("probe", timings):
+                total_dur = probe(source).duration
+        update_job(job_id, progress=15)
+
+        params = {"language": language or None, "beam_size": beam_size}
+        if words:
+            params["word_timestamps"] = True
         if vad:
             params.update({"vad_filter": True, "vad_parameters": dict(min_silence_duration_ms=500)})
 
-        segments, info = model.transcribe(str(wav), **params)
+        def pcm_chunks():
+            # Blocs PCM de la source, décodés à la demande
+            if live:
+                return source.chunks(start=resume_from)
+            if remote:
+                return source.chunks(FFMPEG_PATH, start=resume_from)
+            return retention.after_decode(
+                iter_pcm_chunks(source, FFMPEG_PATH, start=resume_from), source)
+
+        processes = CHUNK_PROCESSES or default_processes(cpu_threads)
+        if cluster is not None:
+            # Le worker lit le média (ou l'URL) et renvoie ses segments ; sorties écrites ici
+            def on_cluster_event(kind, data):
+                if kind == "assigned":
+                    update_job(job_id, progress=max(jobs[job_id]["progress"], 25),
+                               worker=data["worker"], msg=None)
+                else:
+                    update_job(job_id, worker=None, msg=f"Réattribution : {data['reason']}")
+
+            segments = cluster.submit(
+                job_id, cascade or model_name,
+                {"model": model_name, "cascade": cascade, "params": params,
+                 "url": source.url if remote else None},
+                None if remote else source, resume_from, cancel, on_cluster_event
+            )
+        elif cascade:
+            # Premier passage rapide ; le modèle demandé ne réécoute que les zones incertaines
+            with span("model_load", timings):
+                fast_model = model_cache.get(cascade, COMPUTE_TYPE, cpu_threads)
+            update_job(job_id, progress=25)
+            check_cancel(cancel)
+
+            def load_accurate():
+                with span("model_load", timings):
+                    return model_cache.get(model_name, COMPUTE_TYPE, cpu_threads)
+
+            chunks = pcm_chunks()
+            segments = CascadeTranscription(
+                fast_model, load_accurate, chunks,
+                window_seconds=STREAM_WINDOW_SECONDS, offset=resume_from, **params
+            )
+        elif batch_engine is not None:
+            # Extraits de 30 s regroupés avec ceux des autres jobs sur le même modèle
+            chunks = pcm_chunks()
+            update_job(job_id, progress=25)
+            check_cancel(cancel)
+            segments = BatchedTranscription(batch_engine, chunks, model_name, offset=resume_from,
+                                            vad=vad, **params)
+        elif LONG_FILE_SECONDS and total_dur >= LONG_FILE_SECONDS and processes > 1:
+            # 1-2) Fichier long : décodage complet puis blocs transcrits en parallèle
+            media_path = source
+            if remote:
+                # Décodage complet : le média est d'abord téléchargé dans le cache
+                with span("download", timings):
+                    media_path = source.fetch()
+            remaining = max(total_dur - resume_from, 0)
+            decode_progress = 15
 
-        # 4) Sauvegarde texte (+ progression)
-        txt_path = OUTPUT_DIR / f"{job_id}.txt"
-        with open(txt_path, "w", encoding="utf-8") as f:
+            def on_progress(position):
+                # Décodage complet : 15 -> 25 % selon la position réelle de ffmpeg
+                nonlocal decode_progress
+                cur = 15 + int(10 * min(1.0, (position - resume_from) / remaining))
+                if cur > decode_progress:
+                    decode_progress = cur
+                    update_job(job_id, progress=cur)
+
+            with span("decode", timings):
+                audio = decode_pcm(media_path, FFMPEG_PATH, start=resume_from,
+                                   expected_seconds=remaining or None,
+                                   on_progress=on_progress if remaining else None,
+                                   timeout=decode_timeout(remaining))
+            retention.on_decoded(source)
+            update_job(job_id, progress=25)
+            check_cancel(cancel)
+            segments = ParallelTranscription(
+                audio, model_name, COMPUTE_TYPE, cpu_threads=cpu_threads,
+                processes=processes, chunk_seconds=CHUNK_SECONDS, offset=resume_from, **params
+            )
+        else:
+            # 1) Chargement modèle (partagé via le cache du processus)
+            with span("model_load", timings):
+                model = model_cache.get(model_name, COMPUTE_TYPE, cpu_threads)
+            update_job(job_id, progress=25)
+            check_cancel(cancel)
+
+            # 2) Décodage PCM en flux (ffmpeg -> mémoire) et transcription par fenêtres
+            chunks = pcm_chunks()
+            segments = StreamingTranscription(
+                model, chunks,
+                window_seconds=STREAM_WINDOW_SECONDS, offset=resume_from, **params
+            )
+
+        # 3) Écriture des sorties et de l'index de recherche au fil des segments (+ progression)
+        out = MultiWriter(OUTPUT_DIR, job_id, formats, txt_style="timestamped", words=words)
+        indexed = search_index.writer(job_id, "job", jobs[job_id].get("filename"), OUTPUT_DIR / job_id)
+        # "transcribe" inclut le décodage en flux, qui avance en parallèle de l'inférence
+        with span("transcribe", timings), out, indexed, closing(iter(segments)) as seg_iter:
             last = 25
-            for seg in segments:
-                text = " ".join(seg.text.strip().split())
-                h = int(seg.end // 3600); m = int((seg.end % 3600) // 60); s = int(seg.end % 60)
-                f.write(f"{text} [{h:02d}:{m:02d}:{s:02d}]\n")
+            out.write_all(decoded)
+            indexed.write_all(decoded)
+            # Segments pas encore checkpointés (écrits par lots dans le store)
+            pending, last_flush = [], time.monotonic()
+            for seg in seg_iter:
+                check_cancel(cancel)
+                out.write(seg)
+                indexed.write(seg)
+                cached = CachedSegment(seg.start, seg.end, seg.text)
+                decoded.append(cached)
+                pending.append(cached)
+                if not jobs[job_id].get("language") and getattr(segments.info, "language", None):
+                    update_job(job_id, language=segments.info.language)
+                if time.monotonic() - last_flush >= CHECKPOINT_SECONDS:
+                    with span("checkpoint", timings):
+                        store.add_segments(job_id, pending, seg.end)
+                    pending, last_flush = [], time.monotonic()
+                # Segment poussé en direct aux abonnés SSE
+                event_bus.publish(job_id, "segment", {"start": round(seg.start, 3),
+                                                      "end": round(seg.end, 3),
+                                                      "text": seg.text.strip()})
+                if live and not total_dur and source.finished:
+                    total_dur = source.duration
                 if total_dur > 0:
                     cur = min(95, int(25 + (seg.end / total_dur * 70)))
                     if cur > last:
-                        jobs[job_id]["progress"] = cur
+                        update_job(job_id, progress=cur)
                         last = cur
+            out.close(segments.info)
+            indexed.close(segments.info)
+        if live:
+            total_dur = source.duration
 
-        # Nettoyage
-        try: wav.unlink()
-        except: pass
+        if pending:
+            store.add_segments(job_id, pending, pending[-1].end)
 
-        jobs[job_id].update({
-            "status": "done",
-            "progress": 100,
-            "txt": str(txt_path),
-            "language": getattr(info, "language", "unknown")
-        })
+        # Upload en flux : l'empreinte n'est connue qu'à la fin de la réception
+        cache_key = cache_key or jobs[job_id].get("cache_key")
+        if cache_key:
+            info = segments.info
+            with span("result_cache", timings):
+                result_cache.put(cache_key, decoded, getattr(info, "language", None),
+                                 getattr(info, "language_probability", 0.0), total_dur,
+                                 model=model_name)
+
+        processed = max(total_dur - resume_from, 0)
+        if processed:
+            metrics.AUDIO_SECONDS.inc(processed)
+            metrics.REALTIME_FACTOR.observe((time.time() - started) / processed)
+
+        extra = {"cascade": segments.summary()} if cascade else {}
+        update_job(job_id, status="done", progress=100, txt=str(next(iter(out.paths.values()))),
+                   language=getattr(segments.info, "language", "unknown"), **extra)
+        # Média source libéré après un succès seulement : en erreur ou annulé, il reste
+        # disponible (relance) jusqu'à l'expiration du job
+        retention.on_finished(source.path if live else source)
 
     except Exception as e:
-        jobs[job_id]["status"] = "error"
-        jobs[job_id]["msg"] = str(e)
-        try:
-            wav = OUTPUT_DIR / f"{job_id}.wav"
-            if wav.exists(): wav.unlink()
-        except: pass
+        if isinstance(e, JobCancelled):
+            # Les sorties partielles sont supprimées par MultiWriter
+            update_job(job_id, status="cancelled", msg=str(e))
+        else:
+            update_job(job_id, status="error", msg=str(e))
 
 @app.route("/")
 def index():
     return render_template("index.html")
 
+def safe_filename(name: str) -> str:
+    """Nom de fichier nettoyé."""
+    return "".join(c for c in name if c.isalnum() or c in (" ", "-", "_", ".")).rstrip()
+
+def read_options(values) -> dict:
+    """Options de transcription depuis un formulaire ou une query string."""
+    return {
+        "model": values.get("model", "small"),
+        "language": (values.get("language") or "").strip() or None,
+        "vad": (values.get("vad", "false").lower() == "true"),
+        # Formats de sortie (txt, srt, vtt, json) et horodatage par mot (JSON)
+        "formats": parse_formats(values.get("format")),
+        "words": (values.get("words", "false").lower() == "true"),
+        # Cascade : modèle rapide du premier passage ("true" = CASCADE_FAST_MODEL)
+        "cascade": resolve_fast_model(values.get("cascade")),
+    }
+
+def storage_error(e: InsufficientStorage):
+    """Réponse 507 : l'upload est refusé avant d'écrire sur un disque presque plein."""
+    return jsonify({"error": str(e), "free_bytes": e.free, "needed_bytes": e.needed}), 507
+
+def job_cache_key(content_hash: str, options: dict):
+    """Clé du cache des transcriptions ; aucune pour l'horodatage par mot, que le cache ne conserve pas."""
+    if not content_hash or options.get("words"):
+        return None
+    return make_key(content_hash, options["model"], options["language"], options["vad"],
+                    beam_size=5, cascade=options.get("cascade"))
+
+def set_cache_key(job_id: str, content_hash: str, options: dict):
+    """Clé de cache d'un job mis en file avant la fin de son upload."""
+    cache_key = job_cache_key(content_hash, options)
+    job = store.get(job_id)
+    if cache_key is None or job is None:
+        return
+    if job_id in jobs:
+        jobs[job_id]["cache_key"] = cache_key
+    store.update(job_id, params={**job["params"], "cache_key": cache_key})
+
+def enqueue_job(job_id: str, source, filename: str, content_hash: str, options: dict,
+                timings: dict = None):
+    """Crée le job (ou le termine depuis le cache) et le met en file. Retourne (payload, code HTTP).
+
+    `source` est un chemin (conservé pour la reprise après redémarrage), un
+    PcmPipe (upload en cours, empreinte `content_hash` encore inconnue) ou un
+    RemoteMedia (l'URL est conservée pour la reprise).
+    """
+    model, language, vad = options["model"], options["language"], options["vad"]
+    formats, words = tuple(options.get("formats") or ("txt",)), options.get("words", False)
+    cascade = options.get("cascade")
+    saved = source if isinstance(source, Path) else None
+    url = source.url if isinstance(source, RemoteMedia) else None
+    cache_key = job_cache_key(content_hash, options)
+    create_job(job_id, params={"model": model, "language": language, "vad": vad,
+                               "cache_key": cache_key, "formats": formats, "words": words,
+                               "cascade": cascade, "url": url},
+               timings=timings, filename=filename, source=str(saved) if saved else None)
+    cached = result_cache.get(cache_key) if cache_key else None
+    if cached:
+        # Déjà transcrit avec les mêmes options : résultat immédiat
+        segments, info = cached
+        with MultiWriter(OUTPUT_DIR, job_id, formats, txt_style="timestamped") as out, \
+                search_index.writer(job_id, "job", filename, OUTPUT_DIR / job_id) as indexed:
+            out.write_all(segments)
+            indexed.write_all(segments)
+            out.close(info)
+            indexed.close(info)
+        if saved:
+            retention.on_finished(saved)
+        for seg in segments:
+            event_bus.publish(job_id, "segment", {"start": seg.start, "end": seg.end,
+                                                  "text": seg.text.strip()})
+        update_job(job_id, status="done", progress=100, txt=str(next(iter(out.paths.values()))),
+                   language=info.language, cached=True)
+        return {"job_id": job_id, "filename": filename, "cached": True}, 200
+
+    try:
+        position = scheduler.submit(job_id, transcribe_job, job_id, source, language, model, vad,
+                                    cache_key, formats=formats, words=words, cascade=cascade)
+    except QueueFull as e:
+        jobs.pop(job_id, None)
+        store.delete(job_id)
+        event_bus.close(job_id)
+        if saved:
+            try: saved.unlink()
+            except: pass
+        return {"error": str(e), "queued": e.queued}, 429
+
+    update_job(job_id)
+    return {"job_id": job_id, "filename": filename, "position": position}, 200
+
 @app.route("/upload", methods=["POST"])
 def upload():
     try:
         file = request.files.get("file")
+        if (not file or not file.filename) and request.form.get("url"):
+            return upload_url(request.form["url"].strip())
         if not file or not file.filename:
             return jsonify({"error": "Aucun fichier fourni"}), 400
 
-        job_id = uuid.uuid4().hex
+        try:
+            options = read_options(request.form)
+            retention.check_space(request.content_length)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except InsufficientStorage as e:
+            return storage_error(e)
 
-        # Nom de fichier nettoyé
-        safe = "".join(c for c in file.filename if c.isalnum() or c in (" ", "-", "_", ".")).rstrip()
+        job_id = uuid.uuid4().hex
+        safe = safe_filename(file.filename)
         saved = UPLOAD_DIR / f"{job_id}_{safe}"
-        file.save(saved)
+        # Empreinte SHA-256 calculée pendant l'écriture (pas de relecture du fichier)
+        timings = {}
+        with span("upload", timings):
+            content_hash = save_and_hash(file.stream, saved)
 
-        jobs[job_id] = {"status": "queued", "progress": 0, "txt": None, "msg": None, "filename": safe}
+        payload, code = enqueue_job(job_id, saved, safe, content_hash, options, timings)
+        return jsonify(payload), code
 
-        model = request.form.get("model", "small")
-        language = (request.form.get("language") or "").strip() or None
-        vad = (request.form.get("vad", "false").lower() == "true")
+    except Exception as e:
+        return jsonify({"error": f"Erreur lors de l'upload: {str(e)}"}), 500
 
-        threading.Thread(
-            target=transcribe_job, args=(job_id, saved, language, model, vad), daemon=True
-        ).start()
+def upload_url(url: str):
+    """Variante de /upload avec le champ `url` : le serveur télécharge l'audio seul.
 
-        return jsonify({"job_id": job_id, "filename": safe})
+    Les métadonnées lues pour valider l'URL servent ensuite au téléchargement,
+    qui est décodé au fil de l'eau par le job et gardé dans le cache des téléchargements.
+    """
+    if not url.startswith(("http://", "https://")):
+        return jsonify({"error": "URL invalide (http/https)"}), 400
+    try:
+        options = read_options(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        info = extract_info(url)
+    except Exception as e:
+        return jsonify({"error": f"URL non prise en charge : {e}"}), 400
+    media = RemoteMedia(url, info)
+    try:
+        if media.cached_path() is None:
+            fmt = select_audio_format(info) or {}
+            retention.check_space(fmt.get("filesize") or fmt.get("filesize_approx"))
+    except InsufficientStorage as e:
+        return storage_error(e)
+    job_id = uuid.uuid4().hex
+    payload, code = enqueue_job(job_id, media, safe_filename(media.title) or "media",
+                                media.content_key, options)
+    return jsonify(payload), code
+
+@app.route("/upload/stream", methods=["POST", "PUT"])
+def upload_stream():
+    """Upload en flux : le corps brut est transmis à ffmpeg au fil de la réception.
 
+    L'audio décodé est écrit dans un WAV de uploads/, qui devient la source du
+    job (reprise après redémarrage) ; la vidéo n'est pas écrite sur disque, sauf
+    pour les conteneurs type MP4 (copie de secours si l'index est en fin de
+    fichier). Hors de ces cas et du mode cluster, le job est mis en file dès le
+    début de l'envoi et transcrit l'audio pendant la réception.
+    Options en query string : filename, model, language, vad.
+    """
+    try:
+        options = read_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job_id = uuid.uuid4().hex
+    safe = safe_filename(request.args.get("filename") or "stream") or "stream"
+    try:
+        # Seule la copie de secours des conteneurs MP4 est écrite sur disque
+        spooled = Path(safe).suffix.lower() in SPOOL_EXTENSIONS
+        retention.check_space(request.content_length if spooled else 0)
+    except InsufficientStorage as e:
+        return storage_error(e)
+    # Le worker distant lit un fichier complet : en cluster, job créé à la fin de l'envoi
+    live = not spooled and cluster is None
+    wav_path = UPLOAD_DIR / f"{job_id}_{Path(safe).stem}.wav"
+    try:
+        pipe = PcmPipe(wav_path, FFMPEG_PATH).open()
+    except RuntimeError as e:
+        wav_path.unlink(missing_ok=True)
+        return jsonify({"error": str(e)}), 500
+    if live:
+        # Empreinte inconnue avant la fin de l'envoi : pas de résultat en cache
+        payload, code = enqueue_job(job_id, pipe, safe, None, options)
+        if code != 200:
+            pipe.abort()
+            pipe.path.unlink(missing_ok=True)
+            return jsonify(payload), code
+    spool_path = None
+    spool = None
+    if spooled:
+        spool_path = UPLOAD_DIR / f"{job_id}_{safe}"
+        spool = open(spool_path, "wb")
+    h = hashlib.sha256()
+    streaming = True
+    timings = {}
+    try:
+        with span("upload", timings):
+            while True:
+                chunk = request.stream.read(UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                h.update(chunk)
+                if spool:
+                    spool.write(chunk)
+                if streaming:
+                    streaming = pipe.write(chunk)
+                elif not spool:
+                    break
     except Exception as e:
-        return jsonify({"error": f"Erreur lors de l'upload: {str(e)}"}), 500
+        pipe.abort()
+        pipe.path.unlink(missing_ok=True)
+        if spool:
+            spool.close()
+            spool_path.unlink(missing_ok=True)
+        return jsonify({"error": f"Erreur lors de l'upload: {e}"}), 500
+    if spool:
+        spool.close()
+    content_hash = h.hexdigest()
+    if live:
+        # Le job (peut-être déjà en cours) met son résultat en cache à la fin
+        set_cache_key(job_id, content_hash, options)
+
+    try:
+        with span("decode", timings):
+            source = pipe.finish()
+        if spool_path:
+            spool_path.unlink(missing_ok=True)
+    except RuntimeError as e:
+        # Un job déjà lancé échoue avec la même erreur
+        pipe.path.unlink(missing_ok=True)
+        if not spool_path:
+            return jsonify({"error": f"Flux illisible par FFmpeg : {e}"}), 415
+        # Conteneur non lisible en flux : décodage classique depuis la copie de secours
+        source = spool_path
+
+    if live:
+        # Upload complet : le WAV permet de reprendre le job après un redémarrage
+        store.update(job_id, source=str(source))
+        if job_id in jobs:
+            jobs[job_id]["timings"].update(timings)
+        return jsonify(payload), code
+    payload, code = enqueue_job(job_id, source, safe, content_hash, options, timings)
+    return jsonify(payload), code
+
+def partial_paths(upload_id: str):
+    if not upload_id.isalnum():
+        abort(404)
+    return PARTIAL_DIR / f"{upload_id}.part", PARTIAL_DIR / f"{upload_id}.json"
+
+def load_partial(upload_id: str):
+    data_path, meta_path = partial_paths(upload_id)
+    if not meta_path.exists():
+        abort(404)
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    offset = data_path.stat().st_size if data_path.exists() else 0
+    return meta, data_path, meta_path, offset
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    """Ouvre un upload reprenable : {"filename", "size", "model", "language", "vad"}."""
+    body = request.get_json(silent=True) or request.form
+    try:
+        size = int(body.get("size", 0))
+    except (TypeError, ValueError):
+        size = 0
+    if size <= 0 or not body.get("filename"):
+        return jsonify({"error": "filename et size requis"}), 400
+    try:
+        options = read_options(body)
+        retention.check_space(size)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except InsufficientStorage as e:
+        return storage_error(e)
+    upload_id = uuid.uuid4().hex
+    data_path, meta_path = partial_paths(upload_id)
+    meta = {"filename": safe_filename(body["filename"]), "size": size,
+            "options": options}
+    data_path.touch()
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return jsonify({"upload_id": upload_id, "offset": 0, "size": size}), 201, \
+        {"Location": f"/uploads/{upload_id}", "Upload-Offset": "0"}
+
+@app.route("/uploads/<upload_id>", methods=["HEAD", "GET"])
+def upload_offset(upload_id):
+    """Octets déjà reçus : le client reprend à partir de cet offset."""
+    meta, _, _, offset = load_partial(upload_id)
+    headers = {"Upload-Offset": str(offset), "Upload-Length": str(meta["size"]),
+               "Cache-Control": "no-store"}
+    return jsonify({"upload_id": upload_id, "offset": offset, "size": meta["size"]}), 200, headers
+
+@app.route("/uploads/<upload_id>", methods=["PATCH", "PUT"])
+def upload_chunk(upload_id):
+    """Ajoute des octets à l'offset annoncé (en-tête Upload-Offset) ; lance le job à la fin."""
+    meta, data_path, meta_path, offset = load_partial(upload_id)
+    try:
+        claimed = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return jsonify({"error": "En-tête Upload-Offset requis"}), 400
+    if claimed != offset:
+        # Le client doit reprendre à l'offset réel (connexion coupée entre-temps)
+        return jsonify({"error": "Offset incorrect", "offset": offset}), 409, \
+            {"Upload-Offset": str(offset)}
+    try:
+        retention.check_space(meta["size"] - offset)
+    except InsufficientStorage as e:
+        return storage_error(e)
+
+    with open(data_path, "ab") as f:
+        while offset < meta["size"]:
+            chunk = request.stream.read(min(UPLOAD_CHUNK, meta["size"] - offset))
+            if not chunk:
+                break
+            f.write(chunk)
+            offset += len(chunk)
+    headers = {"Upload-Offset": str(offset)}
+    if offset < meta["size"]:
+        return jsonify({"upload_id": upload_id, "offset": offset, "size": meta["size"]}), 200, headers
+
+    # Upload complet : le fichier rejoint uploads/ et le job démarre
+    job_id = upload_id
+    saved = UPLOAD_DIR / f"{job_id}_{meta['filename']}"
+    os.replace(data_path, saved)
+    meta_path.unlink(missing_ok=True)
+    content_hash = hash_file(saved)
+    payload, code = enqueue_job(job_id, saved, meta["filename"], content_hash, meta["options"])
+    payload.update(offset=offset, size=meta["size"])
+    return jsonify(payload), code, headers
 
 @app.route("/status/<job_id>")
 def status(job_id):
-    info = jobs.get(job_id)
+    info = get_job(job_id)
     if not info:
         return jsonify({"error": "Job inconnu"}), 404
-    return jsonify({
-        "status": info["status"],
-        "progress": info.get("progress", 0),
-        "msg": info.get("msg"),
-        "language": info.get("language")
-    })
+    payload = job_public_state(job_id, info)
+    if request.args.get("timings") in ("1", "true"):
+        # Détail des temps par étape (secondes)
+        payload["timings"] = info.get("timings") or {}
+    if info.get("cascade"):
+        # Part de l'audio réécoutée par le grand modèle, zones, motifs
+        payload["cascade"] = info["cascade"]
+    return jsonify(payload)
+
+@app.route("/events/<job_id>")
+def events(job_id):
+    """Flux SSE : état, progression et segments du job, avec rattrapage via Last-Event-ID."""
+    info = get_job(job_id)
+    if not info:
+        return jsonify({"error": "Job inconnu"}), 404
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_id") or 0
+    try:
+        last_id = int(last_id)
+    except ValueError:
+        last_id = 0
+
+    def stream():
+        if event_bus.channel(job_id, create=False) is None:
+            # Canal expiré : on envoie seulement l'état courant
+            yield format_sse(0, "status", job_public_state(job_id, info))
+            return
+        yield from event_bus.subscribe(job_id, last_id)
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/cancel/<job_id>", methods=["POST"])
+def cancel(job_id):
+    info = get_job(job_id)
+    if not info:
+        return jsonify({"error": "Job inconnu"}), 404
+    state = scheduler.cancel(job_id)
+    if state is None:
+        return jsonify({"error": "Job déjà terminé", "status": info["status"]}), 409
+    if state == "queued":
+        update_job(job_id, status="cancelled", msg="Job annulé")
+        publish_queue_positions()
+        try:
+            for p in UPLOAD_DIR.glob(f"{job_id}_*"):
+                p.unlink()
+        except: pass
+    return jsonify({"job_id": job_id, "cancelled": state})
+
+@app.route("/cache", methods=["GET", "DELETE"])
+def cache():
+    if request.method == "DELETE":
+        removed = result_cache.purge(request.args.get("key"))
+        return jsonify({"removed": removed, **result_cache.snapshot()})
+    return jsonify({**result_cache.snapshot(), "downloads": get_download_cache().snapshot()})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Export Prometheus (désactivé avec METRICS_ENABLED=0)."""
+    if not metrics.ENABLED:
+        return abort(404)
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+def register_gauges():
+    metrics.REGISTRY.gauge("transcribe_queue_depth", "Jobs en attente",
+                           lambda: scheduler.snapshot()["queued"])
+    metrics.REGISTRY.gauge("transcribe_jobs_running", "Jobs en cours",
+                           lambda: scheduler.snapshot()["running"])
+    metrics.REGISTRY.gauge("whisper_models_loaded", "Modèles chargés en mémoire",
+                           lambda: len(model_cache.loaded()))
+    metrics.REGISTRY.gauge("disk_free_bytes", "Espace libre du volume des uploads",
+                           lambda: shutil.disk_usage(UPLOAD_DIR).free)
+    if cluster is not None:
+        metrics.REGISTRY.gauge("cluster_workers", "Workers distants enregistrés",
+                               lambda: len(cluster.snapshot()["workers"]))
+        metrics.REGISTRY.gauge("cluster_free_slots", "Places libres sur les workers distants",
+                               lambda: cluster.snapshot()["free_slots"])
+
+@app.route("/scheduler")
+def scheduler_status():
+    state = scheduler.snapshot()
+    if batch_engine is not None:
+        state["batch_inference"] = batch_engine.snapshot()
+    return jsonify(state)
+
+def cluster_request() -> dict:
+    """Routes des workers : mode cluster actif et jeton partagé valide. Retourne le corps JSON."""
+    if cluster is None:
+        abort(404)
+    if not cluster.authorized(request.headers.get("Authorization")):
+        abort(401)
+    return request.get_json(silent=True) or {}
+
+def lease_lost(e: LeaseLost):
+    """Réponse 409 : le worker doit abandonner le job (annulé ou réattribué)."""
+    return jsonify({"error": str(e), "cancelled": e.cancelled}), 409
+
+@app.route("/workers")
+def workers_status():
+    """Workers enregistrés (modèles chargés, places libres, jobs) et jobs en attente de worker."""
+    if cluster is None:
+        return abort(404)
+    return jsonify(cluster.snapshot())
+
+@app.route("/workers/register", methods=["POST"])
+def worker_register():
+    """Enregistrement d'un worker : {"name", "models", "slots"} -> identifiant et cadences."""
+    body = cluster_request()
+    reply = cluster.register(body.get("name"), body.get("models") or (), body.get("slots") or 1,
+                             address=request.remote_addr)
+    return jsonify(reply), 201
+
+@app.route("/workers/<worker_id>", methods=["DELETE"])
+def worker_unregister(worker_id):
+    cluster_request()
+    try:
+        cluster.unregister(worker_id)
+    except KeyError:
+        return jsonify({"error": "Worker inconnu"}), 404
+    return jsonify({"worker_id": worker_id, "unregistered": True})
+
+@app.route("/workers/<worker_id>/heartbeat", methods=["POST"])
+def worker_heartbeat(worker_id):
+    """Heartbeat : {"models", "free_slots", "jobs"} ; la réponse liste les jobs à abandonner."""
+    body = cluster_request()
+    try:
+        cancel = cluster.heartbeat(worker_id, body.get("models"), body.get("free_slots"),
+                                   body.get("jobs") or ())
+    except KeyError:
+        # Worker déclaré mort ou front redémarré : il doit se réenregistrer
+        return jsonify({"error": "Worker inconnu"}), 404
+    return jsonify({"cancel": cancel})
+
+@app.route("/workers/<worker_id>/lease", methods=["POST"])
+def worker_lease(worker_id):
+    """Demande de job (long polling jusqu'à `wait` secondes) ; 204 si rien à faire."""
+    body = cluster_request()
+    try:
+        wait = min(max(float(body.get("wait", 0)), 0.0), CLUSTER_MAX_WAIT)
+        job = cluster.lease(worker_id, body.get("models"), body.get("free_slots"), wait)
+    except KeyError:
+        return jsonify({"error": "Worker inconnu"}), 404
+    except (TypeError, ValueError):
+        return jsonify({"error": "wait invalide"}), 400
+    if job is None:
+        return "", 204
+    return jsonify(job)
+
+@app.route("/workers/media/<lease>")
+def worker_media(lease):
+    """Média source d'un job pour son worker (le worker le décode lui-même).
+
+    Le bail en cours sert d'accès (URL éphémère, sans le jeton du cluster) : le
+    worker la passe à ffmpeg, dont la ligne de commande est visible de tous.
+    """
+    if cluster is None:
+        return abort(404)
+    try:
+        job = cluster.media(lease)
+    except LeaseLost as e:
+        return lease_lost(e)
+    if job.media is None:
+        return abort(404)
+    # Requêtes Range acceptées : ffmpeg peut se positionner sans tout relire
+    return send_file(Path(job.media).resolve(), conditional=True)
+
+@app.route("/workers/jobs/<job_id>/<op>", methods=["POST"])
+def worker_job_update(job_id, op):
+    """Retour d'un worker (en-tête X-Lease) : "segments" {"first", "segments", "info"},
+    "complete" (mêmes champs + "summary") ou "fail" {"error"}. 409 : job à abandonner."""
+    body = cluster_request()
+    lease = request.headers.get("X-Lease")
+    try:
+        if op == "fail":
+            cluster.fail(job_id, lease, body.get("error"))
+            return jsonify({"job_id": job_id, "requeued": True})
+        if op not in ("segments", "complete"):
+            return abort(404)
+        received = cluster.push_segments(job_id, lease, int(body.get("first", 0)),
+                                         body.get("segments") or [], body.get("info"))
+        if op == "complete":
+            cluster.complete(job_id, lease, body.get("info"), body.get("summary"))
+    except LeaseLost as e:
+        return lease_lost(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Requête invalide : {e}"}), 400
+    return jsonify({"job_id": job_id, "received": received})
 
 @app.route("/download/<job_id>")
 def download(job_id):
-    info = jobs.get(job_id)
+    """Fichier de sortie du job ; `?format=` choisit parmi les formats demandés à l'upload."""
+    info = get_job(job_id)
     if not info or info.get("status") != "done" or not info.get("txt"):
         return abort(404)
-    txt_path = Path(info["txt"])
-    if not txt_path.exists():
+    formats = (info.get("params") or {}).get("formats") or ["txt"]
+    fmt = (request.args.get("format") or formats[0]).lower()
+    if fmt not in formats:
+        return jsonify({"error": f"Format non produit pour ce job : {fmt}",
+                        "formats": formats}), 404
+    path = OUTPUT_DIR / f"{job_id}.{fmt}"
+    if not path.exists():
         return abort(404)
     original_name = info.get("filename", "transcription")
-    download_name = f"transcription_{Path(original_name).stem}.txt"
-    return send_file(txt_path, as_attachment=True, download_name=download_name)
+    download_name = f"transcription_{Path(original_name).stem}.{fmt}"
+    return send_file(path.resolve(), as_attachment=True, download_name=download_name)
+
+def resume_interrupted_jobs():
+    """Au démarrage : remet en file les jobs interrompus, à partir de leur dernier checkpoint."""
+    for job in store.interrupted():
+        if job["params"].get("url"):
+            # Job sur URL : métadonnées relues par le job, média repris du cache si présent
+            source = RemoteMedia(job["params"]["url"])
+        elif job["source"] and Path(job["source"]).exists():
+            source = Path(job["source"])
+        else:
+            store.update(job["id"], status="error", msg="Fichier source introuvable après redémarrage")
+            continue
+        params = job["params"]
+        jobs[job["id"]] = {"status": "queued", "progress": job["progress"], "txt": None,
+                           "msg": None, "filename": job["filename"], "language": job["language"],
+                           "queued_at": time.time(), "timings": job["timings"] or {}}
+        store.update(job["id"], status="queued")
+        scheduler.submit(job["id"], transcribe_job, job["id"], source, params.get("language"),
+                         params.get("model", "small"), params.get("vad", False),
+                         params.get("cache_key"), resume_from=job["checkpoint"],
+                         formats=tuple(params.get("formats") or ("txt",)),
+                         words=params.get("words", False), cascade=params.get("cascade"),
+                         bypass_limit=True)
+        print(f"♻️  Reprise du job {job['id']} à {job['checkpoint']:.1f}s")
+
+@app.route("/search")
+def search():
+    """Recherche plein texte dans toutes les transcriptions : segments classés, bornes en ms.
+
+    Paramètres : `q` (mots, "phrase", préfixe*), `limit`, `offset`, `job` (un seul job).
+    """
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), SEARCH_MAX_LIMIT)
+        offset = max(int(request.args.get("offset", 0)), 0)
+        # Un résultat de plus que demandé : indique s'il existe une page suivante
+        hits = search_index.search(request.args.get("q", ""), limit + 1, offset,
+                                   doc_id=request.args.get("job"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    results = []
+    for hit in hits[:limit]:
+        item = {"job_id": hit.doc_id, "kind": hit.kind, "title": hit.title,
+                "start_ms": hit.start_ms, "end_ms": hit.end_ms, "text": hit.text,
+                "snippet": hit.snippet, "score": hit.score}
+        if hit.kind == "job":
+            item["download"] = f"/download/{hit.doc_id}"
+        results.append(item)
+    return jsonify({"query": request.args.get("q", ""), "offset": offset, "limit": limit,
+                    "has_more": len(hits) > limit, "hits": results})
+
+@app.route("/usage")
+def usage():
+    """Occupation disque (uploads, partiels, sorties, cache), quotas, jobs et purges effectuées."""
+    payload = retention.usage()
+    payload["jobs_in_memory"] = len(jobs)
+    payload["search_index"] = search_index.stats()
+    return jsonify(payload)
+
+@app.route("/models")
+def models():
+    return jsonify(model_cache.snapshot())
+
+if __name__ != "__mp_main__":
+    init_services()
 
 if __name__ == "__main__":
     print("🚀 Démarrage du serveur de transcription...")
@@ -167,5 +1006,21 @@ if __name__ == "__main__":
     print(f"🔧 FFmpeg: {FFMPEG_PATH}")
     print(f"🔧 FFprobe: {FFPROBE_PATH}")
     print("🌐 Interface: http://localhost:5000")
+    # Avec le reloader de Flask, seul le processus enfant sert les requêtes
+    serving = not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    if cluster is not None:
+        # Aucun modèle chargé ici : l'inférence a lieu sur les workers
+        print(f"🖧  Cluster : jobs confiés aux workers distants "
+              f"({scheduler.workers} suivis en parallèle, file max: {MAX_QUEUE})")
+    else:
+        if PRELOAD_MODELS and serving:
+            print(f"🧠 Préchargement des modèles: {', '.join(PRELOAD_MODELS)}")
+            # Même clé de cache que les jobs (threads CPU par worker du scheduler)
+            model_cache.preload(PRELOAD_MODELS, COMPUTE_TYPE, scheduler.cpu_threads)
+        print(f"⚙️  Workers: {scheduler.workers} x {scheduler.cpu_threads} threads CPU (file max: {MAX_QUEUE})")
     print("-" * 50)
-    app.run(debug=True, port=5000, host="0.0.0.0")
+    if serving:
+        resume_interrupted_jobs()
+        retention.start()
+    scheduler.start()
+    app.run(debug=DEBUG, port=5000, host="0.0.0.0")
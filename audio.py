@@ -0,0 +1,579 @@
+import os
+import wave
+import queue
+import threading
+import subprocess
+import dataclasses
+from pathlib import Path
+
+import numpy as np
+
+from metrics import FFMPEG_FAILURES, FFMPEG_TIMEOUTS
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 4  # float32
+# En-tête RIFF/fmt/data d'un WAV PCM écrit par le module `wave`
+WAV_HEADER_BYTES = 44
+# Recouvrement toléré entre les horodatages de deux blocs transcrits séparément
+STITCH_TOLERANCE = 0.2
+
+FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "ffmpeg")
+# Clés des blocs `-progress` de ffmpeg (plus les stream_<i>_<j>_q des flux vidéo)
+PROGRESS_KEYS = {"frame", "fps", "bitrate", "total_size", "out_time_us", "out_time_ms",
+                 "out_time", "dup_frames", "drop_frames", "speed", "progress"}
+
+
+def is_url(value) -> bool:
+    return isinstance(value, str) and value.startswith(("http://", "https://"))
+
+
+class PcmDecoder:
+    """Décode un média en PCM float32 mono 16 kHz via le stdout de ffmpeg (sans fichier WAV).
+
+    S'utilise comme gestionnaire de contexte : le sous-processus est toujours
+    tué et attendu à la sortie, même en cas d'exception ou d'abandon de lecture.
+    `on_progress(secondes)` reçoit la position décodée (sortie `-progress` de
+    ffmpeg) ; au-delà de `timeout` secondes, ffmpeg est tué et close() lève RuntimeError.
+    Avec `feed=True`, le média est lu sur stdin (`proc.stdin`, alimenté par l'appelant).
+    Une URL http(s) est lue directement par ffmpeg.
+    """
+
+    def __init__(self, input_path, ffmpeg_bin: str = None, start: float = 0.0,
+                 duration: float = None, on_progress=None, timeout: float = None,
+                 feed: bool = False):
+        if feed:
+            self.input_path = "pipe:0"
+        else:
+            self.input_path = input_path if is_url(input_path) else Path(input_path)
+        self.feed = feed
+        self.ffmpeg_bin = ffmpeg_bin or FFMPEG_BIN
+        self.start = start
+        self.duration = duration
+        self.on_progress = on_progress
+        self.timeout = timeout
+        self.timed_out = False
+        self.proc = None
+        self._stderr = []
+        self._stderr_thread = None
+        self._timer = None
+
+    def command(self):
+        cmd = [self.ffmpeg_bin, "-loglevel", "error"]
+        if not self.feed:
+            cmd.insert(1, "-nostdin")
+        if self.on_progress:
+            cmd += ["-progress", "pipe:2", "-nostats"]
+        if self.start:
+            cmd += ["-ss", f"{self.start:.3f}"]
+        cmd += ["-i", str(self.input_path)]
+        if self.duration:
+            cmd += ["-t", f"{self.duration:.3f}"]
+        cmd += ["-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "pipe:1"]
+        return cmd
+
+    def open(self):
+        try:
+            self.proc = subprocess.Popen(self.command(),
+                                         stdin=subprocess.PIPE if self.feed else subprocess.DEVNULL,
+                                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            FFMPEG_FAILURES.inc(tool="ffmpeg")
+            raise RuntimeError(f"FFmpeg introuvable : {self.ffmpeg_bin}")
+        # stderr est vidé en continu pour ne jamais bloquer ffmpeg
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout, self._expire, args=(self.proc,))
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def _expire(self, proc):
+        if proc.poll() is None:
+            self.timed_out = True
+            proc.kill()
+
+    def _drain_stderr(self):
+        for line in iter(self.proc.stderr.readline, b""):
+            line = line.decode("utf-8", "replace")
+            if self.on_progress:
+                # Bloc clé=valeur de -progress (out_time_us est en microsecondes) ;
+                # toute autre ligne est gardée pour le message d'erreur
+                key, sep, value = line.strip().partition("=")
+                if sep and (key in PROGRESS_KEYS or key.startswith("stream_")):
+                    if key == "out_time_us" and value.isdigit():
+                        self.on_progress(self.start + int(value) / 1e6)
+                    continue
+            self._stderr.append(line)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, n_samples: int):
+        """Lit jusqu'à n_samples échantillons ; tableau vide en fin de flux."""
+        nbytes = n_samples * BYTES_PER_SAMPLE
+        data = self.proc.stdout.read(nbytes)
+        # On ignore un éventuel octet orphelin en fin de flux
+        usable = len(data) - (len(data) % BYTES_PER_SAMPLE)
+        return np.frombuffer(data[:usable], dtype=np.float32)
+
+    def readinto(self, buf: np.ndarray) -> int:
+        """Remplit `buf` (float32) directement ; retourne le nombre d'échantillons lus."""
+        view = memoryview(buf).cast("B")
+        total = 0
+        while total < len(view):
+            n = self.proc.stdout.readinto(view[total:])
+            if not n:
+                break
+            total += n
+        return total // BYTES_PER_SAMPLE
+
+    def close(self):
+        """Termine ffmpeg et lève RuntimeError s'il a échoué."""
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        if self._timer:
+            self._timer.cancel()
+        finished = proc.poll() is not None
+        if not finished:
+            proc.kill()
+        for pipe in (proc.stdin, proc.stdout):
+            try:
+                if pipe:
+                    pipe.close()
+            except Exception:
+                pass
+        proc.wait()
+        if self._stderr_thread:
+            self._stderr_thread.join(timeout=5)
+        if self.timed_out:
+            FFMPEG_TIMEOUTS.inc(tool="ffmpeg")
+            raise RuntimeError(f"FFmpeg : délai de décodage dépassé ({self.timeout:.0f}s)")
+        if finished and proc.returncode != 0:
+            FFMPEG_FAILURES.inc(tool="ffmpeg")
+            raise RuntimeError("".join(self._stderr).strip() or "FFmpeg error")
+
+    def check(self):
+        """Vérifie le code retour après lecture complète du flux."""
+        proc = self.proc
+        if proc is not None and proc.wait() != 0:
+            self.close()
+
+
+def open_pcm_wav(input_path):
+    """Lecteur `wave` si le fichier est déjà un WAV PCM 16 bits mono 16 kHz, sinon None."""
+    if is_url(input_path) or Path(input_path).suffix.lower() != ".wav":
+        return None
+    try:
+        wav = wave.open(str(input_path), "rb")
+    except (wave.Error, EOFError, OSError):
+        return None
+    if (wav.getnchannels(), wav.getframerate(), wav.getsampwidth()) == (1, SAMPLE_RATE, 2):
+        return wav
+    wav.close()
+    return None
+
+
+def _s16_frames(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def _wav_frames(wav, n_samples: int) -> np.ndarray:
+    return _s16_frames(wav.readframes(n_samples))
+
+
+def decode_pcm(input_path, ffmpeg_bin: str = None, start: float = 0.0,
+               duration: float = None, expected_seconds: float = None,
+               on_progress=None, timeout: float = None) -> np.ndarray:
+    """Décode tout le média en mémoire (float32 mono 16 kHz).
+
+    Si la durée est connue, le tampon est préalloué une seule fois : le pic
+    mémoire est alors celui de l'audio décodé, sans copie intermédiaire. Un WAV
+    déjà au bon format est lu directement, sans lancer ffmpeg.
+    """
+    wav = open_pcm_wav(input_path)
+    if wav is not None:
+        with wav:
+            wav.setpos(min(int(start * SAMPLE_RATE), wav.getnframes()))
+            remaining = wav.getnframes() - wav.tell()
+            audio = _wav_frames(wav, min(remaining, int(duration * SAMPLE_RATE))
+                                if duration else remaining)
+        if on_progress:
+            on_progress(start + len(audio) / SAMPLE_RATE)
+        return audio
+
+    with PcmDecoder(input_path, ffmpeg_bin, start, duration, on_progress, timeout) as dec:
+        capacity = int((expected_seconds or 60) * SAMPLE_RATE) + SAMPLE_RATE
+        buf = np.empty(capacity, dtype=np.float32)
+        size = 0
+        while True:
+            if size == len(buf):
+                # Durée sous-estimée : on agrandit par paliers de 50 %
+                buf = np.resize(buf, len(buf) + len(buf) // 2)
+            n = dec.readinto(buf[size:])
+            if n == 0:
+                break
+            size += n
+        dec.check()
+    return buf[:size]
+
+
+def iter_pcm_chunks(input_path, ffmpeg_bin: str = None, chunk_seconds: float = 30.0,
+                    start: float = 0.0, prefetch: int = 2, on_progress=None):
+    """Générateur de blocs PCM ; le décodage tourne dans un thread en avance de `prefetch` blocs.
+
+    La mémoire reste bornée à (prefetch + 1) blocs ; ffmpeg est bloqué par le
+    pipe tant que le consommateur ne lit pas (backpressure). Pas de délai
+    maximal ici : le rythme dépend du consommateur, pas de ffmpeg.
+    """
+    chunk_samples = int(chunk_seconds * SAMPLE_RATE)
+    wav = open_pcm_wav(input_path)
+    if wav is not None:
+        # WAV déjà au bon format : lecture directe, sans ffmpeg
+        with wav:
+            wav.setpos(min(int(start * SAMPLE_RATE), wav.getnframes()))
+            while True:
+                chunk = _wav_frames(wav, chunk_samples)
+                if not len(chunk):
+                    break
+                if on_progress:
+                    on_progress(wav.tell() / SAMPLE_RATE)
+                yield chunk
+        return
+
+    dec = PcmDecoder(input_path, ffmpeg_bin, start, on_progress=on_progress).open()
+    yield from iter_decoder_chunks(dec, chunk_samples, prefetch)
+
+
+def iter_decoder_chunks(dec: PcmDecoder, chunk_samples: int, prefetch: int = 2):
+    """Blocs PCM d'un PcmDecoder déjà ouvert, lus dans un thread ; ferme le décodeur à la fin."""
+    q = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+    done = object()
+
+    def producer(dec):
+        try:
+            while not stop.is_set():
+                chunk = dec.read(chunk_samples)
+                if len(chunk) == 0:
+                    break
+                q.put(chunk)
+            q.put(done)
+        except Exception as e:
+            q.put(e)
+
+    thread = threading.Thread(target=producer, args=(dec,), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        thread.join()
+        dec.check()
+    finally:
+        stop.set()
+        # Débloque le producteur s'il attend de la place dans la file
+        while thread.is_alive():
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            thread.join(timeout=0.05)
+            if dec.proc is not None and dec.proc.poll() is None:
+                dec.proc.kill()
+        try:
+            dec.close()
+        except RuntimeError:
+            pass
+
+
+def iter_array_chunks(audio: np.ndarray, chunk_seconds: float = 30.0, start: float = 0.0):
+    """Même interface que iter_pcm_chunks pour un audio déjà décodé en mémoire."""
+    step = int(chunk_seconds * SAMPLE_RATE)
+    for i in range(int(start * SAMPLE_RATE), len(audio), step):
+        yield audio[i:i + step]
+
+
+class PcmPipe:
+    """FFmpeg alimenté par son stdin (ex. corps d'une requête HTTP en cours de réception).
+
+    Le décodage progresse au rythme des octets reçus ; un thread écrit le PCM
+    produit dans `path`, un WAV 16 bits mono 16 kHz (environ 115 Mo par heure)
+    dont l'en-tête est tenu à jour à chaque écriture. `chunks()` relit ce
+    fichier au fil du décodage : la transcription peut commencer avant la fin
+    de l'upload sans garder l'audio en mémoire. `finish()` ferme l'entrée et
+    attend la fin du décodage ; `abort()` interrompt les lecteurs en attente.
+    """
+
+    def __init__(self, path, ffmpeg_bin: str = None, input_format: str = None):
+        self.path = Path(path)
+        self.ffmpeg_bin = ffmpeg_bin or FFMPEG_BIN
+        self.input_format = input_format
+        self.proc = None
+        self.samples = 0            # échantillons déjà écrits dans `path`
+        self.finished = False
+        self.error = None
+        self._cond = threading.Condition()
+        self._file = None
+        self._wav = None
+        self._stderr = []
+        self._threads = []
+
+    @property
+    def duration(self) -> float:
+        return self.samples / SAMPLE_RATE
+
+    def open(self):
+        cmd = [self.ffmpeg_bin, "-loglevel", "error"]
+        if self.input_format:
+            cmd += ["-f", self.input_format]
+        cmd += ["-i", "pipe:0", "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"]
+        self._file = open(self.path, "wb")
+        self._wav = wave.open(self._file, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(SAMPLE_RATE)
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            FFMPEG_FAILURES.inc(tool="ffmpeg")
+            self._end(f"FFmpeg introuvable : {self.ffmpeg_bin}")
+            raise RuntimeError(self.error)
+        for target in (self._write_wav, self._drain_stderr):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def _write_wav(self):
+        block = SAMPLE_RATE * 2 * 5
+        try:
+            for data in iter(lambda: self.proc.stdout.read(block), b""):
+                data = data[:len(data) - len(data) % 2]
+                with self._cond:
+                    self._wav.writeframes(data)
+                    self._file.flush()
+                    self.samples += len(data) // 2
+                    self._cond.notify_all()
+        except (OSError, ValueError) as e:
+            # Disque plein, fichier fermé par abort()... : ffmpeg est arrêté
+            self._end(f"Écriture de l'audio impossible : {e}")
+            self.abort()
+
+    def _drain_stderr(self):
+        for line in iter(self.proc.stderr.readline, b""):
+            self._stderr.append(line.decode("utf-8", "replace"))
+
+    def _end(self, error: str = None):
+        """Fin du flux (erreur éventuelle) : le WAV est finalisé et les lecteurs réveillés."""
+        with self._cond:
+            if self.finished:
+                return
+            self.finished = True
+            self.error = error
+            try:
+                self._wav.close()
+                self._file.close()
+            except (OSError, ValueError):
+                pass
+            self._cond.notify_all()
+
+    def write(self, data: bytes) -> bool:
+        """Transmet des octets à ffmpeg ; False si ffmpeg a abandonné (entrée illisible en flux)."""
+        try:
+            self.proc.stdin.write(data)
+            return True
+        except (BrokenPipeError, OSError):
+            return False
+
+    def finish(self) -> Path:
+        """Ferme l'entrée, attend la fin du décodage et retourne le WAV.
+
+        Lève RuntimeError si ffmpeg a échoué ou n'a produit aucun audio.
+        """
+        try:
+            self.proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        self.proc.wait()
+        for t in self._threads:
+            t.join(timeout=5)
+        error = None
+        if self.proc.returncode != 0:
+            FFMPEG_FAILURES.inc(tool="ffmpeg")
+            error = "".join(self._stderr).strip() or "FFmpeg error"
+        elif not self.samples:
+            error = "Aucun audio décodé"
+        self._end(error)
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.path
+
+    def abort(self, reason: str = "Upload interrompu"):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        self._end(reason)
+
+    def chunks(self, start: float = 0.0, chunk_seconds: float = 30.0):
+        """Blocs PCM float32 relus dans `path` ; attend la suite du décodage jusqu'à la fin du flux.
+
+        Lève RuntimeError si le décodage échoue ou si l'upload est interrompu.
+        """
+        chunk_samples = int(chunk_seconds * SAMPLE_RATE)
+        pos = int(start * SAMPLE_RATE)
+        with open(self.path, "rb") as f:
+            while True:
+                with self._cond:
+                    while self.samples - pos < chunk_samples and not self.finished:
+                        self._cond.wait()
+                    if self.error:
+                        raise RuntimeError(self.error)
+                    n = min(chunk_samples, self.samples - pos)
+                if n <= 0:
+                    return
+                f.seek(WAV_HEADER_BYTES + pos * 2)
+                chunk = _s16_frames(f.read(n * 2))
+                pos += len(chunk)
+                yield chunk
+
+
+def replace_fields(obj, **fields):
+    """Copie modifiée d'un Segment/Word faster-whisper (NamedTuple ou dataclass)."""
+    if hasattr(obj, "_replace"):
+        return obj._replace(**fields)
+    return dataclasses.replace(obj, **fields)
+
+
+def shift_segment(seg, offset: float):
+    """Décale les horodatages d'un segment (et de ses mots) de `offset` secondes."""
+    if not offset:
+        return seg
+    fields = {"start": seg.start + offset, "end": seg.end + offset}
+    words = getattr(seg, "words", None)
+    if words:
+        fields["words"] = [replace_fields(w, start=w.start + offset, end=w.end + offset) for w in words]
+    return replace_fields(seg, **fields)
+
+
+def stitch_segments(segments, prev_end: float, end: float, tolerance: float = STITCH_TOLERANCE):
+    """Recolle les segments d'un bloc transcrit à part après ceux des blocs précédents.
+
+    Un segment qui commence avant `prev_end` (fin des segments déjà produits, à
+    `tolerance` près) recouvre le bloc précédent : c'est un doublon, il est
+    ignoré. Retourne (segments gardés, nouvelle fin) ; la fin est bornée à `end`,
+    la fin du bloc, pour qu'un horodatage qui déborde n'écarte pas le bloc suivant.
+    """
+    kept = [seg for seg in segments if seg.start >= prev_end - tolerance]
+    if kept:
+        prev_end = max(prev_end, min(max(seg.end for seg in kept), end))
+    return kept, prev_end
+
+
+class ParallelInfo:
+    """Langue, probabilité et durée, comme le TranscriptionInfo de faster-whisper."""
+
+    def __init__(self, language=None, language_probability=0.0, duration=0.0):
+        self.language = language
+        self.language_probability = language_probability
+        self.duration = duration
+
+
+class StreamingTranscription:
+    """Transcrit un flux de blocs PCM par fenêtres, pendant que ffmpeg continue de décoder.
+
+    Chaque fenêtre est transcrite telle quelle ; les segments qui se terminent
+    dans les `guard` dernières secondes sont rejetés et l'audio à partir de la
+    fin du dernier segment conservé est reporté sur la fenêtre suivante. Si
+    aucun segment ne se termine avant cette marge, tout l'audio depuis le début
+    du premier segment est reporté (une fois, sur une fenêtre double). Aucun
+    mot n'est donc coupé ni dupliqué aux frontières. `info` est disponible dès
+    la première fenêtre transcrite ; sans audio, il ne porte que la langue imposée.
+    """
+
+    def __init__(self, model, chunks, window_seconds: float = 600.0,
+                 guard_seconds: float = 3.0, offset: float = 0.0, **params):
+        self.model = model
+        self.offset = offset  # position du premier bloc dans le média (reprise)
+        self.chunks = chunks
+        self.window_samples = int(window_seconds * SAMPLE_RATE) if window_seconds else 0
+        self.guard = guard_seconds
+        self.params = params
+        self.info = None
+        self.audio_seconds = 0.0
+
+    def _transcribe(self, audio: np.ndarray):
+        segments, info = self.model.transcribe(audio, **self.params)
+        if self.info is None:
+            self.info = info
+            # Les fenêtres suivantes réutilisent la langue détectée sur la première
+            if not self.params.get("language"):
+                self.params["language"] = getattr(info, "language", None)
+        return segments
+
+    def __iter__(self):
+        parts, size, offset = [], 0, self.offset
+        target = self.window_samples
+        chunks = iter(self.chunks)
+        try:
+            exhausted = False
+            while not exhausted:
+                for chunk in chunks:
+                    parts.append(chunk)
+                    size += len(chunk)
+                    self.audio_seconds += len(chunk) / SAMPLE_RATE
+                    if target and size >= target:
+                        break
+                else:
+                    exhausted = True
+                if size == 0:
+                    break
+                buf = np.concatenate(parts) if len(parts) > 1 else parts[0]
+                buf_seconds = len(buf) / SAMPLE_RATE
+
+                if exhausted:
+                    for seg in self._transcribe(buf):
+                        yield shift_segment(seg, offset)
+                    break
+
+                segments = list(self._transcribe(buf))
+                limit = buf_seconds - self.guard
+                keep = [s for s in segments if s.end <= limit]
+                target = self.window_samples
+                if keep:
+                    cut = keep[-1].end
+                elif segments and len(buf) < 2 * self.window_samples:
+                    # Aucun segment ne se termine avant la marge : tout est reporté depuis
+                    # le début du premier, sur une fenêtre double, plutôt que couper un mot
+                    cut = segments[0].start
+                    target = 2 * self.window_samples
+                elif segments:
+                    # Déjà reporté une fois : on accepte pour borner la mémoire
+                    keep, cut = segments, buf_seconds
+                else:
+                    # Pas de parole : on ne garde que la marge de fin
+                    cut = max(0.0, limit)
+                for seg in keep:
+                    yield shift_segment(seg, offset)
+
+                cut_samples = min(len(buf), int(round(cut * SAMPLE_RATE)))
+                rest = buf[cut_samples:]
+                parts, size = ([rest.copy()] if len(rest) else []), len(rest)
+                offset += cut_samples / SAMPLE_RATE
+            if self.info is None:
+                # Aucune fenêtre transcrite (audio vide) : pas de détection possible
+                self.info = ParallelInfo(self.params.get("language"),
+                                         duration=self.audio_seconds)
+        finally:
+            close = getattr(self.chunks, "close", None)
+            if close:
+                close()
@@ -0,0 +1,309 @@
+import os
+import re
+import glob
+import json
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from audio import SAMPLE_RATE, decode_pcm, iter_array_chunks
+from cascade import CascadeTranscription, resolve_fast_model
+from media import decode_timeout, probe
+from model_cache import get_cache
+from result_cache import default_cache, hash_file, make_key
+from scheduler import split_cpu_threads
+from search_index import file_doc_id, get_search_index
+from transcribe import VideoTranscriber
+from url_ingest import RemoteMedia, extract_info
+from writers import MultiWriter
+
+
+def expand_inputs(args) -> list:
+    """Liste d'éléments {"input", "model", "language", "name"} depuis les arguments, --urls et --manifest."""
+    items = []
+
+    def add(src, **overrides):
+        items.append({"input": src, "model": overrides.get("model") or args.model,
+                      "language": overrides.get("language") or args.language,
+                      "name": overrides.get("name")})
+
+    for pattern in args.inputs:
+        if VideoTranscriber.is_url(pattern):
+            add(pattern)
+            continue
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches:
+            # Chemin introuvable : conservé pour apparaître en erreur dans le résumé
+            add(pattern)
+        for m in matches:
+            if os.path.isfile(m):
+                add(m)
+
+    if args.urls:
+        with open(args.urls, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    add(line)
+
+    if args.manifest:
+        with open(args.manifest, "r", encoding="utf-8") as f:
+            text = f.read().strip()
+        entries = json.loads(text) if text.startswith("[") else [
+            json.loads(line) for line in text.splitlines() if line.strip()]
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {"input": entry}
+            add(entry["input"], **entry)
+    return items
+
+
+class BatchRunner:
+    """Pipeline téléchargement → décodage → transcription → écriture, avec un pool de threads par étape.
+
+    Les files entre étapes sont bornées : le téléchargement et le décodage
+    FFmpeg des éléments suivants avancent pendant l'inférence sur l'élément
+    courant, sans accumuler plus de quelques fichiers décodés en mémoire.
+    """
+
+    def __init__(self, args, transcriber: VideoTranscriber = None):
+        self.args = args
+        self.transcriber = transcriber or VideoTranscriber()
+        self.output_dir = Path(args.output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.options = {"use_vad": args.vad, "formats": args.format, "words": args.words,
+                        "cascade": resolve_fast_model(args.cascade)}
+        self.cpu_threads = split_cpu_threads(args.transcribe_workers)
+        self.result_cache = default_cache()
+        self._names = set()
+        self._names_lock = threading.Lock()
+        self._print_lock = threading.Lock()
+        # Les workers de transcription partagent les instances de modèle
+        get_cache().num_workers = max(1, args.transcribe_workers)
+
+    def log(self, msg: str):
+        with self._print_lock:
+            print(msg, flush=True)
+
+    # -- Étapes ------------------------------------------------------------
+
+    def expected_outputs(self, base_name: str):
+        return [self.output_dir / f"{base_name}.{fmt}" for fmt in self.options["formats"]]
+
+    def assign_names(self, items):
+        """Fixe les noms de sortie dans l'ordre des entrées, avant les étapes concurrentes.
+
+        Les métadonnées des URL (titre) sont lues en parallèle ; les suffixes des
+        doublons et les éléments ignorés ne dépendent donc pas de l'ordre dans
+        lequel les téléchargements se terminent.
+        """
+        def base_name(item):
+            src = item["input"]
+            if not VideoTranscriber.is_url(src):
+                if not Path(src).is_file():
+                    raise FileNotFoundError(f"Fichier introuvable : {src}")
+                return item["name"] or Path(src).stem
+            # Métadonnées réutilisées par le téléchargement (audio seul, cache des téléchargements)
+            item["remote"] = RemoteMedia(src, extract_info(src))
+            return item["name"] or item["remote"].title
+
+        def resolve(item):
+            try:
+                return base_name(item)
+            except Exception as e:
+                item.update(status="error", error=f"download: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, self.args.download_workers)) as pool:
+            names = list(pool.map(resolve, items))
+        for item, name in zip(items, names):
+            if name is not None:
+                self.claim_name(item, name)
+
+    def claim_name(self, item, base_name: str) -> bool:
+        """Fixe le nom de sortie ; retourne False si les sorties existent déjà (élément ignoré)."""
+        base_name = re.sub(r'[<>:"/\\|?*]', '_', base_name)
+        with self._names_lock:
+            name, n = base_name, 1
+            while name in self._names:
+                n += 1
+                name = f"{base_name}_{n}"
+            self._names.add(name)
+        item["name"] = name
+        outputs = self.expected_outputs(name)
+        item["outputs"] = [str(p) for p in outputs]
+        if not self.args.force and all(p.exists() for p in outputs):
+            item["status"] = "skipped"
+            return False
+        return True
+
+    def stage_download(self, item):
+        media = item.pop("remote", None)
+        if media is None:
+            item["media"] = Path(item["input"])
+            return
+        item["media"] = media.fetch()
+        item["content_hash"] = media.content_key
+
+    def stage_decode(self, item):
+        # Le cache ne garde pas l'horodatage par mot
+        key = None if self.options["words"] else make_key(
+            item.get("content_hash") or hash_file(item["media"]), item["model"], item["language"],
+            self.options["use_vad"], beam_size=5, cascade=self.options["cascade"])
+        item["cache_key"] = key
+        cached = self.result_cache.get(key) if key else None
+        if cached:
+            item["segments"], item["info"] = cached
+            item["status"] = "cached"
+            return
+        duration = probe(item["media"]).duration
+        item["audio"] = decode_pcm(item["media"], self.transcriber.ffmpeg_bin,
+                                   expected_seconds=duration or None,
+                                   timeout=decode_timeout(duration))
+        item["audio_seconds"] = round(len(item["audio"]) / SAMPLE_RATE, 3)
+
+    def stage_transcribe(self, item):
+        if item.get("status") == "cached":
+            return
+        compute_type = self.transcriber.compute_type
+
+        def load_model():
+            return get_cache().get(item["model"], compute_type, self.cpu_threads)
+
+        params = {"language": item["language"], "beam_size": 5}
+        if self.options["words"]:
+            params["word_timestamps"] = True
+        if self.options["use_vad"]:
+            params.update({"vad_filter": True, "vad_parameters": dict(min_silence_duration_ms=500)})
+        if self.options["cascade"]:
+            # Passage rapide sur tout l'audio, modèle demandé sur les zones incertaines
+            # (le modèle demandé n'est chargé qu'à la première zone à réécouter)
+            fast = get_cache().get(self.options["cascade"], compute_type, self.cpu_threads)
+            stream = CascadeTranscription(fast, load_model, iter_array_chunks(item.pop("audio")),
+                                          window_seconds=0, **params)
+            item["segments"] = list(stream)
+            item["info"], item["cascade"] = stream.info, stream.summary()
+        else:
+            seg_iter, info = load_model().transcribe(item.pop("audio"), **params)
+            item["segments"], item["info"] = list(seg_iter), info
+        info = item["info"]
+        if item["cache_key"]:
+            self.result_cache.put(item["cache_key"], item["segments"], info.language,
+                                  info.language_probability, item.get("audio_seconds", 0.0),
+                                  model=item["model"])
+
+    def stage_write(self, item):
+        segments = item.pop("segments")
+        info = item.pop("info")
+        base = self.output_dir / item["name"]
+        with MultiWriter(self.output_dir, item["name"], self.options["formats"],
+                         words=self.options["words"]) as out, \
+                get_search_index().writer(file_doc_id(base), "file", item["name"], base) as indexed:
+            out.write_all(segments)
+            indexed.write_all(segments)
+            out.close(info)
+            indexed.close(info)
+        item["language"] = getattr(info, "language", None)
+        item["segments_count"] = len(segments)
+        if item.get("status") != "cached":
+            item["status"] = "done"
+
+    # -- Orchestration -------------------------------------------------------
+
+    def _stage_workers(self, name, fn, in_q, out_q, workers):
+        workers = max(1, workers)
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                item = in_q.get()
+                if item is None:
+                    in_q.put(None)  # relaye la fin de flux aux autres workers de l'étape
+                    break
+                if item["status"] in ("pending", "cached"):
+                    t0 = time.perf_counter()
+                    try:
+                        fn(item)
+                    except Exception as e:
+                        item.update(status="error", error=f"{name}: {e}")
+                        item.pop("audio", None)
+                    item["timings"][name] = round(time.perf_counter() - t0, 3)
+                out_q.put(item)
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                out_q.put(None)
+
+        threads = [threading.Thread(target=worker, name=f"batch-{name}-{i}", daemon=True)
+                   for i in range(workers)]
+        for t in threads:
+            t.start()
+        return threads
+
+    def run(self, items) -> dict:
+        args = self.args
+        q_in = queue.Queue()
+        q_downloaded = queue.Queue(maxsize=max(1, args.decode_workers))
+        q_decoded = queue.Queue(maxsize=max(1, args.transcribe_workers))
+        q_transcribed = queue.Queue(maxsize=2)
+        q_done = queue.Queue()
+
+        started = time.time()
+        for item in items:
+            item.update(status="pending", timings={}, outputs=[])
+        self.assign_names(items)
+        for item in items:
+            q_in.put(item)
+        q_in.put(None)
+
+        self._stage_workers("download", self.stage_download, q_in, q_downloaded, args.download_workers)
+        self._stage_workers("decode", self.stage_decode, q_downloaded, q_decoded, args.decode_workers)
+        self._stage_workers("transcribe", self.stage_transcribe, q_decoded, q_transcribed,
+                            args.transcribe_workers)
+        self._stage_workers("write", self.stage_write, q_transcribed, q_done, 1)
+
+        results = []
+        while True:
+            item = q_done.get()
+            if item is None:
+                break
+            item.pop("media", None)
+            item.pop("remote", None)
+            item.pop("cache_key", None)
+            item.pop("content_hash", None)
+            results.append(item)
+            icon = {"done": "✅", "cached": "⚡", "skipped": "⏭️ ", "error": "❌"}.get(item["status"], "•")
+            total = sum(item["timings"].values())
+            self.log(f"{icon} {item['input']} ({item['status']}, {total:.1f}s)"
+                     + (f" - {item['error']}" if item.get("error") else ""))
+
+        order = {id(it): i for i, it in enumerate(items)}
+        results.sort(key=lambda it: order[id(it)])
+        counts = {}
+        for it in results:
+            counts[it["status"]] = counts.get(it["status"], 0) + 1
+        return {
+            "started": started,
+            "wall_seconds": round(time.time() - started, 3),
+            "model": args.model,
+            "counts": counts,
+            "items": results,
+        }
+
+
+def run_batch(args) -> int:
+    items = expand_inputs(args)
+    if not items:
+        print("❌ Aucune entrée à traiter")
+        return 2
+    print(f"🚀 Batch : {len(items)} élément(s) — modèle {args.model}")
+    summary = BatchRunner(args).run(items)
+    summary_path = Path(args.summary) if args.summary else Path(args.output_dir) / "batch_summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2, default=str)
+    print(f"📊 Résumé : {summary['counts']} en {summary['wall_seconds']:.1f}s → {summary_path}")
+    return 1 if summary["counts"].get("error") else 0
@@ -0,0 +1,269 @@
+import time
+import bisect
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+import metrics
+from audio import SAMPLE_RATE, ParallelInfo, shift_segment, stitch_segments
+from chunking import find_speech, plan_chunks
+
+# Un extrait ne dépasse pas la fenêtre de Whisper (30 s)
+MAX_CLIP_SECONDS = 30.0
+# Audio accumulé avant de planifier les extraits d'un job (coupes aux silences)
+PLAN_SECONDS = 120.0
+SPEECH_PAD_SAMPLES = int(0.2 * SAMPLE_RATE)
+
+BATCH_SIZES = metrics.REGISTRY.histogram(
+    "batch_inference_size", "Extraits par passe du modèle (inférence groupée)",
+    buckets=(1, 2, 4, 8, 16, 32))
+BATCH_WAIT = metrics.REGISTRY.histogram(
+    "batch_inference_wait_seconds", "Attente d'un extrait avant son passage dans un lot",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+
+
+def plan_clips(audio: np.ndarray, speech, vad: bool, max_seconds: float = MAX_CLIP_SECONDS):
+    """Extraits (début, fin) en échantillons, chacun de moins de `max_seconds`.
+
+    Sans VAD, tout l'audio est couvert, coupé dans les silences. Avec VAD, seules
+    les zones de parole sont gardées, regroupées tant qu'elles tiennent dans un extrait.
+    """
+    max_len = int(max_seconds * SAMPLE_RATE)
+    if not vad:
+        # plan_chunks coupe entre 0,5x et 1,5x la cible : 1,5x = max_seconds
+        return plan_chunks(speech, len(audio), max_seconds / 1.5)
+    clips = []
+    for sp in speech:
+        start = max(0, sp["start"] - SPEECH_PAD_SAMPLES)
+        end = min(len(audio), sp["end"] + SPEECH_PAD_SAMPLES)
+        if clips and end - clips[-1][0] <= max_len:
+            clips[-1] = (clips[-1][0], max(end, clips[-1][1]))
+            continue
+        if clips:
+            start = max(start, clips[-1][1])
+        while end - start > max_len:
+            clips.append((start, start + max_len))
+            start += max_len
+        if end > start:
+            clips.append((start, end))
+    return clips
+
+
+class _Clip:
+    __slots__ = ("audio", "offset", "future", "submitted")
+
+    def __init__(self, audio: np.ndarray, offset: float):
+        self.audio = audio
+        self.offset = offset
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class BatchEngine:
+    """Inférence groupée entre jobs : une passe BatchedInferencePipeline pour plusieurs extraits.
+
+    Les extraits (≤ 30 s) de tous les jobs qui utilisent le même modèle, la même
+    langue et les mêmes options sont regroupés par lots d'au plus `batch_size`.
+    Un lot part dès qu'il est plein, ou quand son plus ancien extrait a attendu
+    `max_wait` secondes : un job seul n'attend jamais plus longtemps que cela.
+    Chaque extrait reçoit ses segments (horodatages du média) via un Future.
+    `cpu_threads` est le budget par job du scheduler : les modèles sont partagés
+    avec les jobs non groupés (même clé de cache) sans surcharger les cœurs.
+    """
+
+    def __init__(self, cache, compute_type: str, cpu_threads: int, batch_size: int = 8,
+                 max_wait: float = 0.05):
+        self.cache = cache
+        self.compute_type = compute_type
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.cpu_threads = cpu_threads
+        self._groups = {}                 # (modèle, langue, options) -> deque de _Clip
+        self._pipelines = {}              # id(modèle) -> BatchedInferencePipeline
+        self._cond = threading.Condition()
+        self._thread = None
+        self.stats = {"batches": 0, "clips": 0, "audio_s": 0.0, "busy_s": 0.0}
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="batch-inference",
+                                                daemon=True)
+                self._thread.start()
+
+    def model(self, model_name: str):
+        return self.cache.get(model_name, self.compute_type, self.cpu_threads)
+
+    def detect_language(self, model_name: str, audio: np.ndarray):
+        """Langue d'un extrait (exécuté dans le thread du job, hors lots)."""
+        language, probability, _ = self.model(model_name).detect_language(audio=audio)
+        return language, probability
+
+    def submit(self, model_name: str, language: str, options: dict, audio: np.ndarray,
+               offset: float) -> Future:
+        clip = _Clip(audio, offset)
+        key = (model_name, language, tuple(sorted(options.items())))
+        self.start()
+        with self._cond:
+            self._groups.setdefault(key, deque()).append(clip)
+            self._cond.notify()
+        return clip.future
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            queued = sum(len(q) for q in self._groups.values())
+            stats = dict(self.stats)
+        return {"batch_size": self.batch_size, "max_wait_ms": int(self.max_wait * 1000),
+                "queued_clips": queued, **stats}
+
+    def _next_batch(self):
+        """Sous verrou : lot prêt (clé, extraits) ou délai avant le prochain, sinon None."""
+        now = time.perf_counter()
+        oldest_key, oldest = None, None
+        for key, clips in self._groups.items():
+            if len(clips) >= self.batch_size:
+                oldest_key = key
+                break
+            if clips and (oldest is None or clips[0].submitted < oldest):
+                oldest_key, oldest = key, clips[0].submitted
+        if oldest_key is None:
+            return None, None
+        clips = self._groups[oldest_key]
+        if len(clips) < self.batch_size and now - oldest < self.max_wait:
+            return None, self.max_wait - (now - oldest)
+        batch = []
+        while clips and len(batch) < self.batch_size:
+            clip = clips.popleft()
+            # Extraits des jobs annulés entre-temps : ignorés
+            if clip.future.set_running_or_notify_cancel():
+                batch.append(clip)
+        if not clips:
+            del self._groups[oldest_key]
+        return (oldest_key, batch), None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    ready, delay = self._next_batch()
+                    if ready:
+                        break
+                    self._cond.wait(timeout=delay)
+            key, batch = ready
+            if batch:
+                self._run(key, batch)
+
+    def _run(self, key, batch):
+        model_name, language, options = key
+        t0 = time.perf_counter()
+        for clip in batch:
+            BATCH_WAIT.observe(t0 - clip.submitted)
+        BATCH_SIZES.observe(len(batch))
+        try:
+            from faster_whisper import BatchedInferencePipeline
+            model = self.model(model_name)
+            pipeline = self._pipelines.get(id(model))
+            if pipeline is None or pipeline.model is not model:
+                pipeline = self._pipelines[id(model)] = BatchedInferencePipeline(model)
+
+            # Extraits bout à bout ; clip_timestamps en délimite les frontières
+            starts, clip_ts, pos = [], [], 0
+            for clip in batch:
+                starts.append(pos / SAMPLE_RATE)
+                clip_ts.append({"start": pos / SAMPLE_RATE,
+                                "end": (pos + len(clip.audio)) / SAMPLE_RATE})
+                pos += len(clip.audio)
+            audio = np.concatenate([clip.audio for clip in batch])
+            segments, _ = pipeline.transcribe(audio, language=language, clip_timestamps=clip_ts,
+                                              batch_size=len(batch), without_timestamps=False,
+                                              vad_filter=False, **dict(options))
+            results = [[] for _ in batch]
+            for seg in segments:
+                # Rattachement à l'extrait qui contient le milieu du segment
+                i = max(0, bisect.bisect_right(starts, (seg.start + seg.end) / 2) - 1)
+                results[i].append(shift_segment(seg, batch[i].offset - starts[i]))
+        except Exception as e:
+            for clip in batch:
+                clip.future.set_exception(e)
+            return
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._cond:
+                self.stats["batches"] += 1
+                self.stats["clips"] += len(batch)
+                self.stats["audio_s"] += sum(len(c.audio) for c in batch) / SAMPLE_RATE
+                self.stats["busy_s"] += elapsed
+        for clip, segs in zip(batch, results):
+            clip.future.set_result(segs)
+
+
+class BatchedTranscription:
+    """Côté job : découpe le flux PCM en extraits, les confie au BatchEngine, produit les segments dans l'ordre.
+
+    Même interface que StreamingTranscription (itérable + `.info`). Jusqu'à
+    `max_inflight` extraits du job sont en attente à la fois, si bien qu'un job
+    seul remplit déjà un lot.
+    """
+
+    def __init__(self, engine: BatchEngine, chunks, model_name: str, offset: float = 0.0,
+                 vad: bool = False, max_inflight: int = None, **params):
+        self.engine = engine
+        self.chunks = chunks
+        self.model_name = model_name
+        self.offset = offset
+        self.vad = vad
+        self.max_inflight = max_inflight or engine.batch_size
+        # Options de décodage communes au lot (le VAD est appliqué ici, pas dans le lot)
+        self.options = {k: v for k, v in params.items()
+                        if k not in ("language", "vad_filter", "vad_parameters")}
+        self.info = ParallelInfo(params.get("language"))
+
+    def _plan(self, buf: np.ndarray, final: bool):
+        """Extraits à soumettre et nombre d'échantillons consommés du tampon."""
+        speech = find_speech(buf)
+        clips = plan_clips(buf, speech, self.vad)
+        if not final and clips:
+            # Le dernier extrait peut couper une phrase : il attend la suite du flux
+            tail = clips.pop()[0]
+            return clips, tail
+        return clips, len(buf)
+
+    def __iter__(self):
+        pending = deque()
+        buf = np.zeros(0, dtype=np.float32)
+        buf_offset = self.offset
+        last_end = self.offset
+        chunks = iter(self.chunks)
+        try:
+            final = False
+            while not final:
+                chunk = next(chunks, None)
+                final = chunk is None
+                if not final:
+                    buf = np.concatenate([buf, chunk]) if len(buf) else chunk
+                    if len(buf) < PLAN_SECONDS * SAMPLE_RATE:
+                        continue
+                if not len(buf):
+                    break
+                clips, consumed = self._plan(buf, final)
+                for a, b in clips:
+                    if self.info.language is None:
+                        # Langue détectée une fois, sur le premier extrait
+                        self.info.language, self.info.language_probability = \
+                            self.engine.detect_language(self.model_name, buf[a:b])
+                    future = self.engine.submit(self.model_name, self.info.language, self.options,
+                                                np.ascontiguousarray(buf[a:b]),
+                                                buf_offset + a / SAMPLE_RATE)
+                    pending.append((future, buf_offset + b / SAMPLE_RATE))
+                self.info.duration = buf_offset + len(buf) / SAMPLE_RATE - self.offset
+                buf_offset += consumed / SAMPLE_RATE
+                buf = buf[consumed:]
+                while len(pending) > (0 if final else self.max_inflight):
+                    future, clip_end = pending.popleft()
+                    segments, last_end = stitch_segments(future.result(), last_end, clip_end)
+                    yield from segments
+        finally:
+            for future, _ in pending:
+                future.cancel()
@@ -0,0 +1,386 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import platform
+import itertools
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+
+from audio import SAMPLE_RATE, FFMPEG_BIN, decode_pcm
+from writers import parse_formats
+
+try:
+    import resource
+except ImportError:  # Windows : pas de mesure du pic mémoire
+    resource = None
+
+BENCH_DIR = Path("benchmarks")
+DEFAULT_MODELS = ["tiny", "base", "small", "medium", "large-v3"]  # VideoTranscriber.whisper_models
+# Régression signalée si le RTF dépasse la référence de plus de ce ratio
+DEFAULT_THRESHOLD = 0.15
+
+
+def generate_audio(path: Path, seconds: float, seed: int = 0, ffmpeg_bin: str = None):
+    """Fichier de référence hors ligne : sons voisés modulés entrecoupés de silences.
+
+    Ce n'est pas de la parole, mais la durée, les silences (VAD) et le coût
+    du décodage sont reproductibles d'une machine à l'autre. Le fichier est
+    encodé en AAC stéréo 44,1 kHz (.m4a) : un WAV déjà en 16 kHz mono serait lu
+    sans ffmpeg et l'extraction audio ne serait pas mesurée.
+    """
+    rng = np.random.default_rng(seed)
+    out = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    pos = 0
+    while pos < len(out):
+        voiced = int(rng.uniform(1.0, 6.0) * SAMPLE_RATE)
+        t = np.arange(min(voiced, len(out) - pos)) / SAMPLE_RATE
+        f0 = rng.uniform(90, 220)
+        signal = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 6))
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+        out[pos:pos + len(t)] = 0.2 * signal * envelope + 0.01 * rng.standard_normal(len(t))
+        pos += len(t) + int(rng.uniform(0.3, 2.0) * SAMPLE_RATE)
+    pcm = (np.clip(out, -1, 1) * 32767).astype("<i2")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cmd = [ffmpeg_bin or FFMPEG_BIN, "-loglevel", "error", "-y",
+           "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+           "-ar", "44100", "-ac", "2", "-c:a", "aac", "-b:a", "128k", str(path)]
+    proc = subprocess.run(cmd, input=pcm.tobytes(), capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode("utf-8", "replace").strip() or "FFmpeg error")
+    return path
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus et de ses enfants (ffmpeg), en Mo."""
+    if resource is None:
+        return None
+    scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024  # octets sur macOS, Ko ailleurs
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(usage, children) * scale, 1)
+
+
+def load_server():
+    """Module `app` du serveur, avec base, index, sorties et caches isolés sous benchmarks/server/.
+
+    Le média mesuré n'est jamais supprimé (SOURCE_RETENTION=ttl) et les temps
+    par étape sont toujours relevés (METRICS_ENABLED=1).
+    """
+    root = (BENCH_DIR / "server").absolute()
+    root.mkdir(parents=True, exist_ok=True)
+    os.environ.update({
+        "JOB_DB": str(root / "jobs.db"), "SEARCH_DB": str(root / "search.db"),
+        "UPLOAD_DIR": str(root / "uploads"), "OUTPUT_DIR": str(root / "sorties"),
+        "RESULT_CACHE_DIR": str(root / "cache" / "results"),
+        "DOWNLOAD_CACHE_DIR": str(root / "cache" / "downloads"),
+        "SOURCE_RETENTION": "ttl", "METRICS_ENABLED": "1", "CLUSTER_ENABLED": "0",
+    })
+    import app as server
+    return server
+
+
+def discard_job(server, job_id: str):
+    """Efface un job mesuré : ligne en base, segments, index de recherche et sorties."""
+    server.store.delete(job_id)
+    server.search_index.delete(job_id)
+    for path in server.OUTPUT_DIR.glob(f"{job_id}.*"):
+        path.unlink()
+
+
+def run_config(media: str, config: dict, ffmpeg_bin: str = None, repeat: int = 1) -> dict:
+    """Mesure une configuration sur un fichier en la soumettant à transcribe_job, comme le serveur.
+
+    Chaque essai est un job complet : choix du mode (fenêtres en flux, cascade,
+    fichier long en parallèle, inférence groupée), écriture des sorties, index
+    de recherche et checkpoints compris. L'extraction audio seule (decode_pcm)
+    est mesurée à part. Le modèle est chargé au premier essai ; le RTF en est exclu.
+    """
+    server = load_server()
+    server.FFMPEG_PATH = ffmpeg_bin or server.FFMPEG_PATH
+    server.COMPUTE_TYPE = config["compute_type"]
+    if config.get("window_seconds") is not None:
+        server.STREAM_WINDOW_SECONDS = config["window_seconds"]
+    if config.get("long_file_seconds") is not None:
+        server.LONG_FILE_SECONDS = config["long_file_seconds"]
+
+    t0 = time.perf_counter()
+    audio_seconds = len(decode_pcm(media, server.FFMPEG_PATH)) / SAMPLE_RATE
+    extract = time.perf_counter() - t0
+
+    runs = []
+    for _ in range(max(1, repeat)):
+        job_id = uuid.uuid4().hex
+        server.create_job(job_id, params={"benchmark": True, **config}, filename=Path(media).name)
+        # Cumul des spans du job (probe, model_load, transcribe, checkpoint...)
+        timings = server.jobs[job_id]["timings"]
+        t0 = time.perf_counter()
+        server.transcribe_job(job_id, Path(media), config.get("language"), config["model"],
+                              config["vad"], formats=tuple(config.get("formats") or ("txt",)),
+                              words=config.get("words", False), cascade=config.get("cascade"),
+                              cpu_threads=config.get("cpu_threads", 0), beam_size=config["beam_size"])
+        wall = time.perf_counter() - t0
+        job = server.store.get(job_id)
+        segments = len(server.store.segments(job_id))
+        discard_job(server, job_id)
+        if job["status"] != "done":
+            raise RuntimeError(job.get("msg") or f"Job {job['status']}")
+        runs.append({"wall": wall, "timings": timings, "segments": segments,
+                     "language": job.get("language")})
+
+    # Meilleur des essais (hors chargement du modèle) : moins sensible au bruit de la machine
+    def processing(run):
+        return run["wall"] - run["timings"].get("model_load", 0.0)
+
+    best = min(runs, key=processing)
+    stages = {"extract": extract, "model_load": runs[0]["timings"].get("model_load", 0.0),
+              **{k: v for k, v in best["timings"].items() if k != "model_load"},
+              "job": processing(best)}
+
+    return {
+        "file": str(media),
+        **config,
+        "audio_seconds": round(audio_seconds, 3),
+        "stages": {k: round(v, 3) for k, v in stages.items()},
+        "runs": [round(r["wall"], 3) for r in runs],
+        "rtf": round(stages["job"] / audio_seconds, 4) if audio_seconds else None,
+        "segments": best["segments"],
+        "segments_per_sec": round(best["segments"] / stages["job"], 2) if stages["job"] else None,
+        "detected_language": best["language"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure_startup(media: str, model: str, repeat: int = 3) -> dict:
+    """Temps de bout en bout de `transcribe.py run` : processus neuf sans démon, puis via un démon chaud.
+
+    Interpréteur, imports et chargement du modèle compris. `--words` évite le
+    cache des transcriptions : chaque exécution transcrit réellement.
+    """
+    import daemon
+
+    script = str(Path(__file__).with_name("transcribe.py"))
+    sock = (BENCH_DIR / "startup.sock").absolute()
+    env = dict(os.environ, TRANSCRIBE_SOCKET=str(sock))
+    cmd = [sys.executable, script, "run", str(media), "--model", model, "--format", "json",
+           "--words", "--output-dir", str(BENCH_DIR / "startup"), "--json"]
+
+    def timed(extra=()):
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd + list(extra), env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - t0
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stdout.strip().splitlines()[-1:] or proc.stderr.strip())
+        return elapsed
+
+    cold = [timed(["--no-daemon"]) for _ in range(max(1, repeat))]
+    server = subprocess.Popen([sys.executable, script, "daemon", "--preload", model], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 600
+        while True:
+            try:
+                daemon.request({"op": "ping"}, path=sock)
+                break
+            except daemon.DaemonUnavailable:
+                if server.poll() is not None or time.time() > deadline:
+                    raise RuntimeError("Le démon n'a pas démarré")
+                time.sleep(0.2)
+        timed()  # premier passage : imports restants du démon (numpy, ffmpeg...)
+        warm = [timed() for _ in range(max(1, repeat))]
+    finally:
+        try:
+            daemon.request({"op": "shutdown"}, path=sock)
+        except (daemon.DaemonUnavailable, ConnectionError):
+            pass
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return {"file": str(media), "model": model,
+            "cold_s": [round(t, 3) for t in cold], "warm_s": [round(t, 3) for t in warm],
+            "speedup": round(min(cold) / min(warm), 2) if min(warm) else None}
+
+
+def _isolated(args):
+    media, config, ffmpeg_bin, repeat = args
+    return run_config(media, config, ffmpeg_bin, repeat)
+
+
+def config_key(result: dict) -> str:
+    return "|".join(str(result.get(k)) for k in ("file", "model", "compute_type", "beam_size", "vad",
+                                                 "cascade"))
+
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """Configurations dont le RTF a régressé par rapport à la référence."""
+    reference = {config_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        ref = reference.get(config_key(r))
+        if not ref or not ref.get("rtf") or r.get("rtf") is None:
+            continue
+        r["baseline_rtf"] = ref["rtf"]
+        r["delta"] = round(r["rtf"] / ref["rtf"] - 1, 4)
+        if r["delta"] > threshold:
+            regressions.append(r)
+    return regressions
+
+
+def environment(ffmpeg_bin: str) -> dict:
+    try:
+        from faster_whisper import __version__ as fw_version
+    except ImportError:
+        fw_version = None
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "faster_whisper": fw_version,
+        "ffmpeg": ffmpeg_bin,
+    }
+
+
+def csv_list(value: str):
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark des modèles Whisper : temps par étape, RTF, pic mémoire")
+    parser.add_argument("files", nargs="*", help="Fichiers audio/vidéo de référence")
+    parser.add_argument("--generate", default="60",
+                        help="Durées (s) de fichiers générés hors ligne, ex: 30,300 (vide : aucun)")
+    parser.add_argument("--models", default="tiny,base",
+                        help="Modèles à mesurer, ou 'all' (défaut: tiny,base)")
+    parser.add_argument("--compute-types", default="int8", help="ex: int8,float32")
+    parser.add_argument("--beam-sizes", default="5", help="ex: 1,5")
+    parser.add_argument("--vad", choices=["off", "on", "both"], default="off")
+    parser.add_argument("--language", default=None, help="Langue imposée (défaut: détection auto)")
+    parser.add_argument("--cascades", default="off",
+                        help="Modèles rapides de la cascade à mesurer, ex: off,tiny (off = sans cascade)")
+    parser.add_argument("--format", default="txt", help="Formats de sortie écrits, ex: txt,srt,json")
+    parser.add_argument("--words", action="store_true", help="Horodatage par mot")
+    parser.add_argument("--long-file-seconds", type=float, default=None,
+                        help="Seuil du mode fichier long en parallèle (défaut: LONG_FILE_SECONDS du serveur)")
+    parser.add_argument("--cpu-threads", type=int, default=0, help="Threads CPU (0 = défaut CTranslate2)")
+    parser.add_argument("--repeat", type=int, default=1, help="Essais par configuration (meilleur retenu)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Pas de processus séparé par configuration (pic mémoire cumulé)")
+    parser.add_argument("--startup", action="store_true",
+                        help="Mesure `transcribe.py run` à froid (sans démon) puis via le démon local")
+    parser.add_argument("--output", default=str(BENCH_DIR / "results.json"))
+    parser.add_argument("--baseline", default=str(BENCH_DIR / "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Enregistre les résultats comme nouvelle référence")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Hausse de RTF tolérée avant de signaler une régression (défaut: 0.15)")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    ffmpeg_bin = os.environ.get("FFMPEG_BIN", FFMPEG_BIN)
+
+    files = list(args.files)
+    for seconds in csv_list(args.generate):
+        path = BENCH_DIR / "audio" / f"generated_{int(float(seconds))}s.m4a"
+        if not path.exists():
+            generate_audio(path, float(seconds), ffmpeg_bin=ffmpeg_bin)
+        files.append(str(path))
+    if not files:
+        print("❌ Aucun fichier à mesurer")
+        return 2
+
+    models = DEFAULT_MODELS if args.models == "all" else csv_list(args.models)
+    if args.startup:
+        return run_startup(files, models, args)
+    vads = {"off": [False], "on": [True], "both": [False, True]}[args.vad]
+    cascades = [None if c == "off" else c for c in csv_list(args.cascades)]
+    configs = [{"model": m, "compute_type": ct, "beam_size": int(b), "vad": v, "cascade": c,
+                "language": args.language, "cpu_threads": args.cpu_threads,
+                "formats": list(parse_formats(args.format)), "words": args.words,
+                "long_file_seconds": args.long_file_seconds}
+               for m, ct, b, v, c in itertools.product(models, csv_list(args.compute_types),
+                                                       csv_list(args.beam_sizes), vads, cascades)]
+
+    results = []
+    # Un processus neuf par configuration : chargement à froid et pic mémoire isolés
+    ctx = multiprocessing.get_context("spawn")
+    for media, config in itertools.product(files, configs):
+        label = f"{Path(media).name} · {config['model']}/{config['compute_type']} " \
+                f"beam={config['beam_size']} vad={'on' if config['vad'] else 'off'}" \
+                f"{' cascade=' + config['cascade'] if config['cascade'] else ''}"
+        try:
+            if args.in_process:
+                result = run_config(media, config, ffmpeg_bin, args.repeat)
+            else:
+                with ctx.Pool(1) as pool:
+                    result = pool.apply(_isolated, ((media, config, ffmpeg_bin, args.repeat),))
+        except Exception as e:
+            print(f"❌ {label} : {e}")
+            results.append({"file": media, **config, "error": str(e)})
+            continue
+        results.append(result)
+        s = result["stages"]
+        print(f"✅ {label} : RTF {result['rtf']} — extraction {s['extract']}s, "
+              f"modèle {s['model_load']}s, job {s['job']}s, "
+              f"{result['segments_per_sec']} seg/s, pic {result['peak_rss_mb']} Mo")
+
+    report = {"created": time.time(), "environment": environment(ffmpeg_bin), "results": results}
+
+    baseline_path = Path(args.baseline)
+    regressions = []
+    if baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report["regressions"] = [config_key(r) for r in regressions]
+        for r in regressions:
+            print(f"⚠️  Régression : {config_key(r)} RTF {r['baseline_rtf']} → {r['rtf']} "
+                  f"(+{r['delta']:.0%})")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📊 Résultats : {output}")
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📌 Référence enregistrée : {baseline_path}")
+
+    if any("error" in r for r in results):
+        return 2
+    return 1 if regressions else 0
+
+
+def run_startup(files: list, models: list, args) -> int:
+    results = []
+    for media, model in itertools.product(files, models):
+        label = f"{Path(media).name} · {model}"
+        try:
+            result = measure_startup(media, model, args.repeat)
+        except Exception as e:
+            print(f"❌ {label} : {e}")
+            results.append({"file": media, "model": model, "error": str(e)})
+            continue
+        results.append(result)
+        print(f"✅ {label} : à froid {min(result['cold_s'])}s, démon chaud {min(result['warm_s'])}s "
+              f"(x{result['speedup']})")
+    output = Path(args.output).with_name("startup.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"created": time.time(), "environment": environment(FFMPEG_BIN),
+                   "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"📊 Résultats : {output}")
+    return 2 if any("error" in r for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
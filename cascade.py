@@ -0,0 +1,190 @@
+import os
+from collections import deque, namedtuple
+
+import numpy as np
+
+import metrics
+from audio import SAMPLE_RATE, StreamingTranscription, shift_segment
+
+# Modèle rapide du premier passage quand la cascade est demandée sans précision
+CASCADE_FAST_MODEL = os.environ.get("CASCADE_FAST_MODEL", "tiny")
+
+# Un segment du premier passage est incertain si l'un des seuils est franchi
+# (mêmes grandeurs que les seuils de repli de Whisper)
+Thresholds = namedtuple("Thresholds", "logprob no_speech compression pad max_fraction max_region")
+
+DEFAULT_THRESHOLDS = Thresholds(
+    logprob=float(os.environ.get("CASCADE_LOGPROB_THRESHOLD", "-0.8")),
+    no_speech=float(os.environ.get("CASCADE_NO_SPEECH_THRESHOLD", "0.6")),
+    compression=float(os.environ.get("CASCADE_COMPRESSION_THRESHOLD", "2.4")),
+    # Marge ajoutée autour d'une zone réécoutée (sans empiéter sur les segments voisins)
+    pad=float(os.environ.get("CASCADE_PAD_SECONDS", "0.5")),
+    # Part maximale de l'audio confiée au grand modèle (plafond de coût)
+    max_fraction=float(os.environ.get("CASCADE_MAX_FRACTION", "0.5")),
+    # Durée maximale d'une zone : au-delà, elle est réécoutée sans attendre sa fin
+    # (l'audio gardé pour la relire reste borné)
+    max_region=float(os.environ.get("CASCADE_MAX_REGION_SECONDS", "120")),
+)
+
+CASCADE_AUDIO = metrics.REGISTRY.counter(
+    "cascade_audio_seconds_total", "Audio traité en cascade, par passage", ("stage",))
+CASCADE_REGIONS = metrics.REGISTRY.counter(
+    "cascade_regions_total", "Zones réécoutées par le grand modèle, par motif", ("reason",))
+
+
+def resolve_fast_model(value):
+    """Option `cascade` d'un formulaire / de la CLI -> modèle du premier passage (ou None)."""
+    value = str(value or "").strip()
+    if value.lower() in ("", "0", "false", "non"):
+        return None
+    if value.lower() in ("1", "true", "oui"):
+        return CASCADE_FAST_MODEL
+    return value
+
+
+def uncertainty(seg, thresholds: Thresholds = DEFAULT_THRESHOLDS):
+    """Motif pour lequel le segment doit être réécouté, ou None s'il est fiable."""
+    if getattr(seg, "compression_ratio", 0.0) > thresholds.compression:
+        return "compression"
+    if getattr(seg, "no_speech_prob", 0.0) > thresholds.no_speech:
+        return "no_speech"
+    if getattr(seg, "avg_logprob", 0.0) < thresholds.logprob:
+        return "logprob"
+    return None
+
+
+class AudioTap:
+    """Laisse passer un flux de blocs PCM en gardant l'audio récent, relisible par intervalle."""
+
+    def __init__(self, chunks, offset: float = 0.0):
+        self.chunks = chunks
+        self.parts = deque()
+        self.first = int(round(offset * SAMPLE_RATE))  # échantillon (média) du premier bloc gardé
+        self.end = self.first
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.parts.append(chunk)
+            self.end += len(chunk)
+            yield chunk
+
+    def close(self):
+        close = getattr(self.chunks, "close", None)
+        if close:
+            close()
+
+    @property
+    def end_seconds(self) -> float:
+        return self.end / SAMPLE_RATE
+
+    def read(self, start: float, end: float) -> np.ndarray:
+        """Audio entre `start` et `end` (secondes du média)."""
+        a = max(int(start * SAMPLE_RATE), self.first) - self.first
+        b = min(int(end * SAMPLE_RATE), self.end) - self.first
+        if b <= a:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self.parts)[a:b]
+
+    def release(self, before: float):
+        """Oublie les blocs entièrement antérieurs à `before` (secondes)."""
+        limit = int(before * SAMPLE_RATE)
+        while self.parts and self.first + len(self.parts[0]) <= limit:
+            self.first += len(self.parts.popleft())
+
+
+class CascadeTranscription:
+    """Premier passage avec un petit modèle, réécoute des seules zones incertaines par un grand.
+
+    Les segments consécutifs jugés incertains (`uncertainty`) forment une zone ;
+    dès que la zone est refermée par un segment fiable, ou qu'elle dépasse
+    `max_region` secondes, son audio est retranscrit par le grand modèle et ses
+    segments remplacent ceux du premier passage.
+    Même interface que StreamingTranscription (itérable + `.info`). Le grand
+    modèle n'est chargé (`load_accurate()`) qu'à la première zone réécoutée.
+    """
+
+    def __init__(self, fast_model, load_accurate, chunks, window_seconds: float = 600.0,
+                 offset: float = 0.0, thresholds: Thresholds = None, **params):
+        self.tap = AudioTap(chunks, offset)
+        self.fast = StreamingTranscription(fast_model, self.tap, window_seconds=window_seconds,
+                                           offset=offset, **params)
+        self.load_accurate = load_accurate
+        self.accurate = None
+        self.offset = offset
+        self.thresholds = thresholds or DEFAULT_THRESHOLDS
+        self.params = params
+        self.stats = {"audio_s": 0.0, "escalated_s": 0.0, "regions": 0, "skipped_regions": 0,
+                      "segments": 0, "escalated_segments": 0, "reasons": {}}
+
+    @property
+    def info(self):
+        return self.fast.info
+
+    def summary(self) -> dict:
+        """Statistiques de la cascade, dont la part d'audio réécoutée."""
+        audio, escalated = float(self.stats["audio_s"]), float(self.stats["escalated_s"])
+        stats = dict(self.stats, audio_s=round(audio, 2), escalated_s=round(escalated, 2))
+        stats["escalated_fraction"] = round(escalated / audio, 4) if audio else 0.0
+        return stats
+
+    def _escalate(self, region, reasons, start: float, end: float):
+        """Segments du grand modèle pour [start, end], ou ceux du premier passage si le budget est épuisé."""
+        duration = end - start
+        processed = max(self.tap.end_seconds - self.offset, duration)
+        if (self.stats["escalated_s"] + duration) / processed > self.thresholds.max_fraction:
+            self.stats["skipped_regions"] += 1
+            return region
+        if self.accurate is None:
+            self.accurate = self.load_accurate()
+        params = dict(self.params, language=self.params.get("language")
+                      or getattr(self.info, "language", None))
+        # La zone est déjà délimitée : pas de VAD sur un extrait aussi court
+        params.pop("vad_filter", None)
+        params.pop("vad_parameters", None)
+        segments, _ = self.accurate.transcribe(self.tap.read(start, end), **params)
+        segments = [shift_segment(seg, start) for seg in segments]
+        self.stats["regions"] += 1
+        self.stats["escalated_s"] += duration
+        self.stats["escalated_segments"] += len(region)
+        for reason in reasons:
+            self.stats["reasons"][reason] = self.stats["reasons"].get(reason, 0) + 1
+            CASCADE_REGIONS.inc(reason=reason)
+        CASCADE_AUDIO.inc(duration, stage="escalated")
+        return segments
+
+    def _close_region(self, region, reasons, prev_end: float, next_start: float):
+        pad = self.thresholds.pad
+        start = max(prev_end, region[0].start - pad)
+        end = min(next_start, region[-1].end + pad)
+        return self._escalate(region, reasons, start, end)
+
+    def __iter__(self):
+        region, reasons = [], set()
+        prev_end = self.offset
+        try:
+            for seg in self.fast:
+                self.stats["segments"] += 1
+                reason = uncertainty(seg, self.thresholds)
+                if reason:
+                    region.append(seg)
+                    reasons.add(reason)
+                    if seg.end - region[0].start >= self.thresholds.max_region:
+                        # Zone trop longue : réécoutée jusqu'ici, l'audio gardé est libéré
+                        yield from self._close_region(region, reasons, prev_end, seg.end)
+                        region, reasons = [], set()
+                        prev_end = seg.end
+                        self.tap.release(prev_end)
+                    continue
+                if region:
+                    yield from self._close_region(region, reasons, prev_end, seg.start)
+                    region, reasons = [], set()
+                prev_end = seg.end
+                # L'audio antérieur au dernier segment fiable ne sera plus relu
+                self.tap.release(prev_end)
+                yield seg
+            if region:
+                yield from self._close_region(region, reasons, prev_end, self.tap.end_seconds)
+        finally:
+            audio = max(self.tap.end_seconds - self.offset, 0.0)
+            self.stats["audio_s"] = audio
+            CASCADE_AUDIO.inc(audio, stage="fast")
@@ -0,0 +1,175 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from audio import SAMPLE_RATE, ParallelInfo, shift_segment, stitch_segments
+
+# Paramètres VAD utilisés pour trouver les silences de découpe
+SPLIT_MIN_SILENCE_MS = 500
+LANGUAGE_PROBE_SECONDS = 30
+# Trames d'énergie (20 ms) pour couper au plus calme quand aucun silence n'est détecté
+ENERGY_FRAME_SAMPLES = SAMPLE_RATE // 50
+
+
+def find_speech(audio: np.ndarray, min_silence_duration_ms: int = SPLIT_MIN_SILENCE_MS):
+    """Zones de parole (en échantillons) détectées par le VAD Silero de faster-whisper."""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    opts = VadOptions(min_silence_duration_ms=min_silence_duration_ms, speech_pad_ms=0)
+    return get_speech_timestamps(audio, opts, sampling_rate=SAMPLE_RATE)
+
+
+def quietest_point(audio: np.ndarray, lo: int, hi: int,
+                   frame: int = ENERGY_FRAME_SAMPLES) -> int:
+    """Milieu de la trame la moins énergétique de audio[lo:hi]."""
+    n = (hi - lo) // frame
+    if n <= 0:
+        return (lo + hi) // 2
+    frames = audio[lo:lo + n * frame].reshape(n, frame)
+    energy = np.einsum("ij,ij->i", frames, frames)
+    return lo + int(np.argmin(energy)) * frame + frame // 2
+
+
+def plan_chunks(speech, total_samples: int, target_seconds: float = 600.0,
+                audio: np.ndarray = None):
+    """Découpe [0, total_samples) en blocs d'environ `target_seconds`, coupés dans les silences.
+
+    Parmi les silences qui recoupent [0,5x ; 1,5x] la cible, on retient les plus
+    longs (à 80 % près du plus long) et on coupe au milieu de celui qui est le
+    plus proche de la cible, ramené dans la fenêtre : le VAD ne marge pas la
+    parole, un bord de silence tomberait sur le début ou la fin d'un mot. À
+    défaut (parole continue), on coupe à la trame la moins énergétique de cette
+    fenêtre (à la cible si `audio` n'est pas fourni). Le dernier bloc absorbe un
+    reliquat trop court.
+    """
+    target = int(target_seconds * SAMPLE_RATE)
+    if total_samples <= target * 1.5:
+        return [(0, total_samples)]
+
+    # Silences = intervalles entre deux zones de parole (plus le début et la fin)
+    gaps, prev_end = [], 0
+    for sp in speech:
+        if sp["start"] > prev_end:
+            gaps.append((prev_end, sp["start"]))
+        prev_end = max(prev_end, sp["end"])
+    if prev_end < total_samples:
+        gaps.append((prev_end, total_samples))
+
+    chunks, start = [], 0
+    while total_samples - start > target * 1.5:
+        lo, hi, ideal = start + target // 2, start + target + target // 2, start + target
+        candidates = []
+        for g0, g1 in gaps:
+            a, b = max(g0, lo), min(g1, hi)
+            if a < b:
+                candidates.append((g1 - g0, min(max((g0 + g1) // 2, a), b)))
+        if candidates:
+            longest = max(length for length, _ in candidates)
+            cut = min((c for length, c in candidates if length >= 0.8 * longest),
+                      key=lambda c: abs(c - ideal))
+        elif audio is not None:
+            cut = quietest_point(audio, lo, hi)
+        else:
+            cut = ideal
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, total_samples))
+    return chunks
+
+
+def _detect_language(model_name: str, compute_type: str, cpu_threads: int, audio: np.ndarray):
+    from model_cache import get_model
+    model = get_model(model_name, compute_type, cpu_threads)
+    _, info = model.transcribe(audio, beam_size=1, without_timestamps=True)
+    return info.language, info.language_probability
+
+
+def _transcribe_chunk(model_name: str, compute_type: str, cpu_threads: int,
+                      audio: np.ndarray, offset: float, params: dict):
+    """Exécuté dans un processus du pool : le modèle y reste chargé entre deux blocs."""
+    from model_cache import get_model
+    model = get_model(model_name, compute_type, cpu_threads)
+    segments, info = model.transcribe(audio, **params)
+    return [shift_segment(seg, offset) for seg in segments], info.language
+
+
+# Pool de processus partagé : les modèles restent chauds d'un job à l'autre
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(processes: int):
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is None or _pool_key != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # "spawn" : pas de fork d'un processus qui contient déjà des threads
+            _pool = ProcessPoolExecutor(max_workers=processes,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            _pool_key = processes
+        return _pool
+
+
+class ParallelTranscription:
+    """Transcrit un long audio par blocs découpés aux silences, en parallèle sur un pool de processus.
+
+    Les segments sont produits dans l'ordre chronologique avec des horodatages
+    globaux, dès que les blocs précédents sont terminés.
+    """
+
+    def __init__(self, audio: np.ndarray, model_name: str, compute_type: str = "int8",
+                 cpu_threads: int = 0, processes: int = 2, chunk_seconds: float = 600.0,
+                 offset: float = 0.0, **params):
+        self.audio = audio
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.processes = processes
+        self.chunk_seconds = chunk_seconds
+        self.offset = offset  # position de l'audio dans le média (reprise)
+        self.params = params
+        self.info = ParallelInfo(params.get("language"), duration=len(audio) / SAMPLE_RATE)
+        self.chunks = []
+
+    def __iter__(self):
+        speech = find_speech(self.audio)
+        self.chunks = plan_chunks(speech, len(self.audio), self.chunk_seconds, self.audio)
+        pool = get_pool(self.processes)
+        model_args = (self.model_name, self.compute_type, self.cpu_threads)
+
+        params = dict(self.params)
+        if not params.get("language") and speech:
+            # Langue détectée une fois pour tous les blocs, sur le début de la parole
+            s0 = speech[0]["start"]
+            probe = self.audio[s0:s0 + LANGUAGE_PROBE_SECONDS * SAMPLE_RATE]
+            lang, prob = pool.submit(_detect_language, *model_args, probe).result()
+            params["language"] = self.info.language = lang
+            self.info.language_probability = prob
+
+        futures = [
+            pool.submit(_transcribe_chunk, *model_args, self.audio[a:b],
+                        self.offset + a / SAMPLE_RATE, params)
+            for a, b in self.chunks
+        ]
+        try:
+            last_end = self.offset
+            for (_, b), fut in zip(self.chunks, futures):
+                segments, language = fut.result()
+                if self.info.language is None:
+                    self.info.language = language
+                segments, last_end = stitch_segments(segments, last_end,
+                                                     self.offset + b / SAMPLE_RATE)
+                yield from segments
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+
+def default_processes(cpu_threads: int) -> int:
+    """Nombre de processus pour que processus x threads couvre les cœurs de la machine."""
+    cores = os.cpu_count() or 1
+    return max(1, cores // max(1, cpu_threads or 1))
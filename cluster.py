@@ -0,0 +1,419 @@
+import os
+import time
+import uuid
+import queue
+import threading
+from collections import namedtuple
+
+from scheduler import JobCancelled
+
+# Les workers envoient un heartbeat toutes les HEARTBEAT_SECONDS secondes ;
+# sans nouvelles depuis WORKER_TIMEOUT secondes, ils sont considérés comme morts
+HEARTBEAT_SECONDS = float(os.environ.get("CLUSTER_HEARTBEAT_SECONDS", "5"))
+WORKER_TIMEOUT = float(os.environ.get("CLUSTER_WORKER_TIMEOUT", "15"))
+# Bail d'un job attribué, renouvelé par chaque heartbeat et chaque envoi de segments
+LEASE_SECONDS = float(os.environ.get("CLUSTER_LEASE_SECONDS", "30"))
+# Un job attend au plus AFFINITY_WAIT secondes qu'un worker ayant déjà son modèle se libère
+AFFINITY_WAIT = float(os.environ.get("CLUSTER_AFFINITY_WAIT", "10"))
+# Attributions d'un même job (worker mort, erreur) avant de le passer en erreur
+MAX_ATTEMPTS = int(os.environ.get("CLUSTER_MAX_ATTEMPTS", "3"))
+# Jeton partagé entre le front et les workers (Authorization: Bearer ...), vide = pas de contrôle
+CLUSTER_TOKEN = os.environ.get("CLUSTER_TOKEN", "")
+
+# Segments et infos reçus des workers (mêmes attributs que ceux de faster-whisper)
+RemoteSegment = namedtuple("RemoteSegment", "start end text words")
+RemoteWord = namedtuple("RemoteWord", "start end word probability")
+RemoteInfo = namedtuple("RemoteInfo", "language language_probability duration")
+
+
+class LeaseLost(Exception):
+    """Le job n'est plus attribué à ce worker (annulé, réattribué ou terminé)."""
+
+    def __init__(self, message: str, cancelled: bool = False):
+        super().__init__(message)
+        self.cancelled = cancelled
+
+
+def encode_segment(seg) -> dict:
+    item = {"start": round(seg.start, 3), "end": round(seg.end, 3), "text": seg.text}
+    words = getattr(seg, "words", None)
+    if words:
+        item["words"] = [[round(w.start, 3), round(w.end, 3), w.word, round(w.probability, 4)]
+                         for w in words]
+    return item
+
+
+def decode_segment(item: dict) -> RemoteSegment:
+    words = [RemoteWord(*w) for w in item["words"]] if item.get("words") else None
+    return RemoteSegment(float(item["start"]), float(item["end"]), item["text"], words)
+
+
+def encode_info(info) -> dict:
+    return {"language": getattr(info, "language", None),
+            "language_probability": getattr(info, "language_probability", None),
+            "duration": getattr(info, "duration", None)}
+
+
+def decode_info(item) -> RemoteInfo:
+    item = item or {}
+    return RemoteInfo(item.get("language"), item.get("language_probability"), item.get("duration"))
+
+
+class RegisteredWorker:
+    """Worker connu du front : modèles chargés, places libres, jobs attribués."""
+
+    def __init__(self, name: str, models, slots: int, address: str = None):
+        self.id = uuid.uuid4().hex
+        self.name = name or self.id[:8]
+        self.models = set(models or ())
+        self.slots = max(1, int(slots or 1))
+        self.reported_free = self.slots
+        self.address = address
+        self.registered = self.last_seen = time.time()
+        self.jobs = set()
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def free_slots(self) -> int:
+        # Une annonce envoyée juste avant une attribution ne compte pas ce job
+        return max(0, min(self.reported_free, self.slots - len(self.jobs)))
+
+    def snapshot(self, now: float) -> dict:
+        return {"id": self.id, "name": self.name, "address": self.address,
+                "models": sorted(self.models), "slots": self.slots,
+                "free_slots": self.free_slots, "jobs": sorted(self.jobs),
+                "last_seen_s": round(now - self.last_seen, 1),
+                "uptime_s": round(now - self.registered, 1),
+                "completed": self.completed, "failed": self.failed}
+
+
+class RemoteJob:
+    """Job confié au cluster. Les messages des workers passent par `events` (file du job)."""
+
+    def __init__(self, job_id: str, model: str, payload: dict, media, resume_from: float = 0.0):
+        self.id = job_id
+        self.model = model          # modèle du premier passage : critère d'affinité
+        self.payload = payload      # envoyé tel quel au worker (modèles, paramètres, URL)
+        self.media = media          # chemin du média source, ou None (URL)
+        self.checkpoint = resume_from  # fin du dernier segment reçu : reprise d'un autre worker
+        self.resume_from = resume_from
+        self.events = queue.Queue()
+        self.worker_id = None
+        self.lease = None
+        self.lease_expires = 0.0
+        self.received = 0           # segments reçus sur le bail en cours
+        self.attempts = 0
+        self.pending_since = time.time()
+        self.language = None        # détectée par un premier worker, imposée aux suivants
+
+
+class WorkerRegistry:
+    """Registre des workers distants et répartition des jobs (côté front).
+
+    Les workers s'enregistrent, annoncent leurs modèles chargés et leurs places
+    libres, puis demandent des jobs (long polling). Un job va en priorité à un
+    worker qui a déjà son modèle en mémoire ; faute de worker chaud libre, il
+    part chez n'importe lequel après `affinity_wait` secondes (tout de suite si
+    aucun worker n'a ce modèle). Chaque attribution est un bail : un worker
+    sans heartbeat ou un bail expiré remet le job en attente, repris à partir
+    du dernier segment reçu.
+    """
+
+    def __init__(self, token: str = CLUSTER_TOKEN, heartbeat_seconds: float = HEARTBEAT_SECONDS,
+                 worker_timeout: float = WORKER_TIMEOUT, lease_seconds: float = LEASE_SECONDS,
+                 affinity_wait: float = AFFINITY_WAIT, max_attempts: int = MAX_ATTEMPTS):
+        self.token = token
+        self.heartbeat_seconds = heartbeat_seconds
+        self.worker_timeout = worker_timeout
+        self.lease_seconds = lease_seconds
+        self.affinity_wait = affinity_wait
+        self.max_attempts = max(1, max_attempts)
+        self._workers = {}          # worker_id -> RegisteredWorker
+        self._jobs = {}             # job_id -> RemoteJob (en attente ou attribué)
+        self._pending = []          # jobs en attente, par ordre de priorité
+        self._cond = threading.Condition()
+        self.stats = {"assigned": 0, "affinity_hits": 0, "reassigned": 0, "completed": 0,
+                      "failed": 0, "workers_lost": 0}
+
+    def authorized(self, header: str) -> bool:
+        return not self.token or header == f"Bearer {self.token}"
+
+    # --- Côté workers -------------------------------------------------------
+
+    def register(self, name: str, models=(), slots: int = 1, address: str = None) -> dict:
+        worker = RegisteredWorker(name, models, slots, address)
+        with self._cond:
+            self._workers[worker.id] = worker
+            self._cond.notify_all()
+        return {"worker_id": worker.id, "name": worker.name,
+                "heartbeat_seconds": self.heartbeat_seconds, "lease_seconds": self.lease_seconds}
+
+    def unregister(self, worker_id: str):
+        """Départ propre : ses jobs sont remis en attente sans compter de tentative."""
+        with self._cond:
+            worker = self._workers.pop(worker_id, None)
+            if worker is None:
+                raise KeyError(worker_id)
+            for job_id in list(worker.jobs):
+                job = self._jobs[job_id]
+                job.attempts -= 1
+                self._requeue_locked(job, f"worker {worker.name} arrêté")
+
+    def heartbeat(self, worker_id: str, models=None, free_slots: int = None, jobs=()) -> list:
+        """Renouvelle les baux des jobs annoncés ; retourne ceux que le worker doit abandonner."""
+        with self._cond:
+            self._reap_locked()
+            worker = self._touch_locked(worker_id, models, free_slots)
+            now = time.time()
+            for job_id in jobs:
+                if job_id in worker.jobs:
+                    self._jobs[job_id].lease_expires = now + self.lease_seconds
+            return [job_id for job_id in jobs if job_id not in worker.jobs]
+
+    def lease(self, worker_id: str, models=None, free_slots: int = None, wait: float = 0.0):
+        """Attribue un job au worker (attend jusqu'à `wait` secondes), ou None."""
+        deadline = time.monotonic() + max(0.0, wait)
+        with self._cond:
+            worker = self._touch_locked(worker_id, models, free_slots)
+            while True:
+                self._reap_locked()
+                if worker_id not in self._workers:
+                    raise KeyError(worker_id)
+                job = self._pick_locked(worker) if worker.free_slots > 0 else None
+                if job is not None:
+                    return self._assign_locked(job, worker)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                # Réveil périodique : les baux expirés sont détectés même sans autre appel
+                self._cond.wait(min(remaining, 1.0))
+
+    def media(self, lease: str) -> RemoteJob:
+        """Job dont `lease` est le bail en cours : le bail sert d'accès éphémère à son média."""
+        with self._cond:
+            for job in self._jobs.values():
+                if lease and job.lease == lease:
+                    return job
+            raise LeaseLost("Bail expiré ou inconnu")
+
+    def push_segments(self, job_id: str, lease: str, first: int, segments, info=None) -> int:
+        """Segments envoyés par le worker, à partir du rang `first` sur ce bail.
+
+        Un lot renvoyé après une erreur réseau n'est pas dupliqué. Retourne le
+        nombre de segments reçus sur le bail.
+        """
+        with self._cond:
+            job = self._leased_locked(job_id, lease)
+            job.lease_expires = time.time() + self.lease_seconds
+            fresh = segments[max(0, job.received - first):]
+            if fresh:
+                decoded = [decode_segment(item) for item in fresh]
+                job.received += len(decoded)
+                job.checkpoint = max(job.checkpoint, decoded[-1].end)
+                job.language = job.language or (info or {}).get("language")
+                job.events.put(("segments", decoded, decode_info(info)))
+            return job.received
+
+    def complete(self, job_id: str, lease: str, info=None, summary: dict = None):
+        with self._cond:
+            job = self._leased_locked(job_id, lease)
+            worker = self._release_locked(job)
+            if worker is not None:
+                worker.completed += 1
+            self.stats["completed"] += 1
+            job.events.put(("done", decode_info(info), summary))
+
+    def fail(self, job_id: str, lease: str, error: str):
+        with self._cond:
+            job = self._leased_locked(job_id, lease)
+            worker = self._workers.get(job.worker_id)
+            if worker is not None:
+                worker.failed += 1
+            self.stats["failed"] += 1
+            self._requeue_locked(job, error or "erreur du worker")
+
+    # --- Côté front ---------------------------------------------------------
+
+    def submit(self, job_id: str, model: str, payload: dict, media, resume_from: float = 0.0,
+               cancel: threading.Event = None, on_event=None) -> "RemoteTranscription":
+        job = RemoteJob(job_id, model, payload, media, resume_from)
+        with self._cond:
+            self._jobs[job_id] = job
+            self._pending.append(job)
+            self._cond.notify_all()
+        return RemoteTranscription(self, job, cancel, on_event)
+
+    def cancel(self, job_id: str):
+        """Retire le job ; son worker l'abandonne au prochain heartbeat ou envoi."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._release_locked(job)
+
+    def reap(self):
+        with self._cond:
+            self._reap_locked()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            self._reap_locked()
+            now = time.time()
+            return {"workers": [w.snapshot(now) for w in self._workers.values()],
+                    "slots": sum(w.slots for w in self._workers.values()),
+                    "free_slots": sum(w.free_slots for w in self._workers.values()),
+                    "pending": [job.id for job in self._pending],
+                    "running": {job.id: self._workers[job.worker_id].name
+                                 for job in self._jobs.values() if job.worker_id in self._workers},
+                    **self.stats}
+
+    # --- Interne (sous self._cond) ------------------------------------------
+
+    def _touch_locked(self, worker_id: str, models=None, free_slots: int = None):
+        worker = self._workers.get(worker_id)
+        if worker is None:
+            raise KeyError(worker_id)
+        worker.last_seen = time.time()
+        if models is not None:
+            # Les modèles des jobs en cours sont en cours de chargement : déjà « chauds »
+            worker.models = set(models) | {self._jobs[j].model for j in worker.jobs}
+        if free_slots is not None:
+            worker.reported_free = int(free_slots)
+        return worker
+
+    def _warm_elsewhere_locked(self, model: str, worker: RegisteredWorker) -> bool:
+        return any(model in w.models for w in self._workers.values() if w is not worker)
+
+    def _pick_locked(self, worker: RegisteredWorker):
+        now = time.time()
+        fallback = None
+        for job in self._pending:
+            if job.model in worker.models or now - job.pending_since >= self.affinity_wait:
+                return job
+            if fallback is None and not self._warm_elsewhere_locked(job.model, worker):
+                # Aucun autre worker n'a ce modèle : inutile d'attendre
+                fallback = job
+        return fallback
+
+    def _assign_locked(self, job: RemoteJob, worker: RegisteredWorker) -> dict:
+        self._pending.remove(job)
+        if job.model in worker.models:
+            self.stats["affinity_hits"] += 1
+        self.stats["assigned"] += 1
+        job.worker_id = worker.id
+        job.lease = uuid.uuid4().hex
+        job.lease_expires = time.time() + self.lease_seconds
+        job.received = 0
+        job.attempts += 1
+        job.resume_from = job.checkpoint
+        worker.jobs.add(job.id)
+        worker.models.add(job.model)
+        job.events.put(("assigned", {"worker": worker.name, "attempt": job.attempts}))
+        # Le worker télécharge lui-même une URL ; un fichier est lu depuis le front
+        media = "url" if job.payload.get("url") else "file"
+        return {**job.payload, "job_id": job.id, "lease": job.lease, "attempt": job.attempts,
+                "resume_from": job.resume_from, "media": media,
+                "lease_seconds": self.lease_seconds}
+
+    def _leased_locked(self, job_id: str, lease: str) -> RemoteJob:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise LeaseLost("Job annulé ou terminé", cancelled=True)
+        if not lease or job.lease != lease:
+            raise LeaseLost("Bail expiré : job réattribué")
+        return job
+
+    def _release_locked(self, job: RemoteJob):
+        """Retire le job du registre ; retourne le worker qui le détenait."""
+        self._jobs.pop(job.id, None)
+        if job in self._pending:
+            self._pending.remove(job)
+        worker = self._workers.get(job.worker_id)
+        if worker is not None:
+            worker.jobs.discard(job.id)
+        job.worker_id = job.lease = None
+        return worker
+
+    def _requeue_locked(self, job: RemoteJob, reason: str):
+        worker = self._workers.get(job.worker_id)
+        if worker is not None:
+            worker.jobs.discard(job.id)
+        job.worker_id = job.lease = None
+        if job.attempts >= self.max_attempts:
+            self._jobs.pop(job.id, None)
+            job.events.put(("error", f"Échec après {job.attempts} tentative(s) : {reason}"))
+            return
+        params = job.payload.setdefault("params", {})
+        if job.language and not params.get("language"):
+            params["language"] = job.language
+        self.stats["reassigned"] += 1
+        job.pending_since = time.time()
+        # Job déjà entamé : repris en priorité
+        self._pending.insert(0, job)
+        job.events.put(("requeued", {"reason": reason}))
+        self._cond.notify_all()
+
+    def _reap_locked(self):
+        now = time.time()
+        for worker in list(self._workers.values()):
+            if now - worker.last_seen > self.worker_timeout:
+                del self._workers[worker.id]
+                self.stats["workers_lost"] += 1
+                for job_id in list(worker.jobs):
+                    self._requeue_locked(self._jobs[job_id], f"worker {worker.name} perdu")
+        for job in list(self._jobs.values()):
+            if job.lease and now > job.lease_expires:
+                self._requeue_locked(job, "bail expiré")
+
+
+class RemoteTranscription:
+    """Segments d'un job exécuté par un worker distant (même interface que StreamingTranscription).
+
+    Itère sur les messages du worker ; `on_event(kind, data)` est appelé à
+    chaque attribution ("assigned") ou remise en attente ("requeued"). Un job
+    abandonné par le front (annulation, erreur d'écriture) est retiré du registre.
+    """
+
+    def __init__(self, registry: WorkerRegistry, job: RemoteJob, cancel: threading.Event = None,
+                 on_event=None):
+        self.registry = registry
+        self.job = job
+        self.cancel = cancel
+        self.on_event = on_event
+        self.info = None
+        self._summary = None
+
+    def summary(self) -> dict:
+        """Statistiques de cascade renvoyées par le worker."""
+        return self._summary or {}
+
+    def __iter__(self):
+        finished = False
+        try:
+            while True:
+                if self.cancel is not None and self.cancel.is_set():
+                    raise JobCancelled("Job annulé")
+                try:
+                    item = self.job.events.get(timeout=1.0)
+                except queue.Empty:
+                    self.registry.reap()
+                    continue
+                kind = item[0]
+                if kind == "segments":
+                    if self.info is None and item[2].language:
+                        self.info = item[2]
+                    yield from item[1]
+                elif kind == "done":
+                    finished = True
+                    if item[1].language or self.info is None:
+                        self.info = item[1]
+                    self._summary = item[2]
+                    return
+                elif kind == "error":
+                    finished = True
+                    raise RuntimeError(item[1])
+                elif self.on_event:
+                    self.on_event(kind, item[1])
+        finally:
+            if not finished:
+                self.registry.cancel(self.job.id)
@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import socket
+import threading
+from pathlib import Path
+
+# Socket du démon local (un par utilisateur) ; TRANSCRIBE_SOCKET pour un autre chemin
+SOCKET_PATH = Path(os.environ.get("TRANSCRIBE_SOCKET") or
+                   Path(os.environ.get("XDG_RUNTIME_DIR") or "/tmp")
+                   / f"transcribe-{os.environ.get('USER') or os.environ.get('USERNAME') or 'user'}.sock")
+# Au-delà de ce délai de connexion, le client transcrit dans son propre processus
+CONNECT_TIMEOUT = float(os.environ.get("DAEMON_CONNECT_TIMEOUT", "0.5"))
+# Arrêt automatique après ce délai sans requête (secondes, 0 = jamais)
+IDLE_TIMEOUT = float(os.environ.get("DAEMON_IDLE_TIMEOUT", "0"))
+COMPUTE_TYPE = os.environ.get("COMPUTE_TYPE", "int8")
+
+# Événements qui terminent une réponse du démon
+FINAL_EVENTS = ("done", "error", "pong", "bye")
+
+
+class DaemonUnavailable(Exception):
+    """Aucun démon n'écoute sur le socket : le client transcrit lui-même."""
+
+
+def connect(path=SOCKET_PATH, timeout: float = CONNECT_TIMEOUT) -> socket.socket:
+    if not hasattr(socket, "AF_UNIX"):
+        raise DaemonUnavailable("Sockets Unix non disponibles sur ce système")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path))
+    except OSError as e:
+        # Socket absent ou orphelin (démon arrêté sans nettoyage)
+        sock.close()
+        raise DaemonUnavailable(str(e)) from e
+    sock.settimeout(None)
+    return sock
+
+
+def request(payload: dict, on_event=None, path=SOCKET_PATH,
+            timeout: float = CONNECT_TIMEOUT) -> dict:
+    """Envoie une requête JSON au démon ; les événements intermédiaires vont à `on_event`.
+
+    Retourne l'événement final ("done", "error"...). Lève DaemonUnavailable si
+    personne n'écoute, ConnectionError si le démon s'interrompt en cours de route.
+    """
+    with connect(path, timeout) as sock, sock.makefile("rb") as f:
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        for line in f:
+            event = json.loads(line)
+            if event.get("event") in FINAL_EVENTS:
+                return event
+            if on_event:
+                on_event(event)
+    raise ConnectionError("Connexion au démon interrompue")
+
+
+def print_event(event: dict):
+    """Relaie la sortie console (messages, barres de progression) du démon."""
+    if event.get("event") == "log":
+        stream = sys.stderr if event.get("stream") == "stderr" else sys.stdout
+        stream.write(event["text"])
+        stream.flush()
+
+
+def execute(transcriber, req: dict, log=None) -> dict:
+    """Exécute une requête "transcribe" avec un VideoTranscriber (dans le démon ou en repli local).
+
+    La sortie console de la transcription passe par `log(texte, flux)` si fourni.
+    Retourne l'événement final : chemins des sorties, langue et temps par étape.
+    """
+    from cascade import resolve_fast_model
+    from writers import parse_formats
+
+    transcriber.timings = {}
+    transcriber.cascade_stats = None
+    transcriber.log = log
+    opts = req.get("options") or {}
+    options = {"use_vad": bool(opts.get("use_vad")),
+               "formats": parse_formats(opts.get("formats"), ("txt", "srt")),
+               "words": bool(opts.get("words")),
+               "cascade": resolve_fast_model(opts.get("cascade"))}
+    output_dir = Path(req.get("output_dir") or "transcriptions")
+    try:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        media, base_name = transcriber.prepare_media(req["source"])
+        paths, info = transcriber.transcribe_and_save(
+            media, req.get("model") or "small", req.get("language"), options, output_dir,
+            req.get("name") or base_name)
+    except Exception as e:
+        return {"event": "error", "message": str(e)}
+    return {"event": "done", "paths": {fmt: str(p) for fmt, p in paths.items()},
+            "language": getattr(info, "language", None),
+            "language_probability": getattr(info, "language_probability", None),
+            "timings": {k: round(v, 3) for k, v in transcriber.timings.items()},
+            "cascade": transcriber.cascade_stats}
+
+
+class TranscriptionDaemon:
+    """Démon local : modèles gardés en mémoire, transcriptions servies sur un socket Unix.
+
+    Protocole : une ligne JSON par requête ({"op": "transcribe" | "ping" |
+    "shutdown", ...}), puis des lignes JSON d'événements jusqu'à l'événement
+    final. Les transcriptions passent une à une (leur sortie console est
+    relayée au client qui l'a demandée, sans rediriger sys.stdout) ; "ping"
+    répond même pendant une transcription. Un client qui se déconnecte interrompt sa transcription ;
+    "shutdown" attend la fin de celle en cours.
+    """
+
+    def __init__(self, path=SOCKET_PATH, preload=(), compute_type: str = COMPUTE_TYPE,
+                 idle_timeout: float = IDLE_TIMEOUT):
+        self.path = Path(path)
+        self.preload = [m for m in preload if m.strip()]
+        self.compute_type = compute_type
+        self.idle_timeout = idle_timeout
+        self.started = time.time()
+        self.last_request = time.time()
+        self.requests = 0
+        self.transcriber = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _bind(self) -> socket.socket:
+        if self.path.exists():
+            try:
+                connect(self.path).close()
+            except DaemonUnavailable:
+                self.path.unlink()  # socket orphelin d'un démon arrêté brutalement
+            else:
+                raise RuntimeError(f"Un démon écoute déjà sur {self.path}")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(self.path))
+        os.chmod(self.path, 0o600)
+        server.listen(16)
+        server.settimeout(1.0)
+        return server
+
+    def serve(self):
+        """Charge les modèles puis sert les requêtes jusqu'à "shutdown" (ou l'inactivité)."""
+        from model_cache import get_cache
+        from transcribe import VideoTranscriber
+
+        server = self._bind()
+        try:
+            # Les requêtes utilisent le type de calcul des modèles préchargés
+            self.transcriber = VideoTranscriber(self.compute_type)
+            if self.preload:
+                print(f"🧠 Préchargement des modèles : {', '.join(self.preload)}")
+                get_cache().preload(self.preload, self.compute_type)
+            print(f"🟢 Démon prêt sur {self.path} (pid {os.getpid()})")
+            while not self._stop.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    idle = time.time() - self.last_request
+                    if self.idle_timeout and idle > self.idle_timeout and not self._run_lock.locked():
+                        print("💤 Arrêt après inactivité")
+                        break
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), name="daemon-client",
+                                 daemon=True).start()
+        finally:
+            server.close()
+            self.path.unlink(missing_ok=True)
+            # Transcription en cours : terminée avant l'arrêt (pas de sorties partielles)
+            with self._run_lock:
+                pass
+
+    def status(self) -> dict:
+        from model_cache import get_cache
+        return {"event": "pong", "pid": os.getpid(), "uptime_s": round(time.time() - self.started, 1),
+                "requests": self.requests, "busy": self._run_lock.locked(),
+                "models": get_cache().loaded()}
+
+    def _handle(self, conn: socket.socket):
+        conn.settimeout(None)
+        lock = threading.Lock()
+
+        def send(event: dict):
+            # Le spinner de la CLI écrit depuis son propre thread
+            data = json.dumps(event, ensure_ascii=False).encode() + b"\n"
+            with lock:
+                conn.sendall(data)
+
+        with conn, conn.makefile("rb") as f:
+            try:
+                line = f.readline()
+                if not line:
+                    return
+                req = json.loads(line)
+                op = req.get("op")
+                self.last_request = time.time()
+                if op == "ping":
+                    send(self.status())
+                elif op == "shutdown":
+                    self._stop.set()
+                    send({"event": "bye"})
+                elif op == "transcribe":
+                    send(self._transcribe(req, send, conn))
+                else:
+                    send({"event": "error", "message": f"Opération inconnue : {op}"})
+            except (OSError, ValueError):
+                pass  # client parti ou requête illisible
+            finally:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)  # débloque le thread de surveillance
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _watch(conn: socket.socket, cancel: threading.Event):
+        """Le client n'envoie rien après sa requête : une lecture qui aboutit = déconnexion."""
+        try:
+            conn.recv(1)
+        except OSError:
+            pass
+        cancel.set()
+
+    def _transcribe(self, req: dict, send, conn: socket.socket) -> dict:
+        with self._run_lock:
+            self.requests += 1
+            cancel = self.transcriber.cancel = threading.Event()
+            threading.Thread(target=self._watch, args=(conn, cancel), name="daemon-watch",
+                             daemon=True).start()
+            # Sortie console de la transcription relayée à ce client seulement
+            result = execute(self.transcriber, req,
+                             log=lambda text, stream: send({"event": "log", "stream": stream,
+                                                            "text": text}))
+            self.last_request = time.time()
+            return result
@@ -0,0 +1,104 @@
+import json
+import time
+import threading
+
+
+def format_sse(event_id: int, event: str, data) -> str:
+    """Sérialise un événement au format text/event-stream."""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class JobChannel:
+    """Tampon d'événements d'un job, rejouable par les abonnés arrivés en retard."""
+
+    def __init__(self, max_events: int):
+        self.events = []            # (id, event, data)
+        self.next_id = 1
+        self.max_events = max_events
+        self.closed = False
+        self.closed_at = None
+        self.cond = threading.Condition()
+
+    def publish(self, event: str, data):
+        with self.cond:
+            if self.closed:
+                return
+            self.events.append((self.next_id, event, data))
+            self.next_id += 1
+            if len(self.events) > self.max_events:
+                # On ne garde que la fin : le texte complet reste téléchargeable
+                del self.events[: len(self.events) - self.max_events]
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.closed_at = time.time()
+            self.cond.notify_all()
+
+    def since(self, last_id: int):
+        """Événements d'identifiant > last_id (appel sous verrou)."""
+        if not self.events or last_id < self.events[0][0]:
+            return list(self.events)
+        return self.events[last_id - self.events[0][0] + 1:]
+
+
+class EventBus:
+    """Diffusion des événements de jobs vers des abonnés SSE (fan-out en mémoire).
+
+    Chaque job a son canal ; un abonné reçoit d'abord l'historique bufferisé
+    puis les nouveaux événements, sans rien recalculer. Les canaux des jobs
+    terminés sont supprimés après `ttl` secondes.
+    """
+
+    def __init__(self, max_events: int = 5000, ttl: float = 600.0, heartbeat: float = 15.0):
+        self.max_events = max_events
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def channel(self, job_id: str, create: bool = True):
+        with self._lock:
+            ch = self._channels.get(job_id)
+            if ch is None and create:
+                ch = self._channels[job_id] = JobChannel(self.max_events)
+            return ch
+
+    def publish(self, job_id: str, event: str, data):
+        self.channel(job_id).publish(event, data)
+
+    def close(self, job_id: str):
+        ch = self.channel(job_id, create=False)
+        if ch is not None:
+            ch.close()
+        self.prune()
+
+    def prune(self):
+        now = time.time()
+        with self._lock:
+            for job_id, ch in list(self._channels.items()):
+                if ch.closed and now - ch.closed_at > self.ttl:
+                    del self._channels[job_id]
+
+    def subscribe(self, job_id: str, last_id: int = 0):
+        """Générateur SSE : rattrapage depuis last_id puis flux en direct jusqu'à la fin du job."""
+        ch = self.channel(job_id, create=False)
+        if ch is None:
+            return
+        while True:
+            with ch.cond:
+                pending = ch.since(last_id)
+                if not pending and not ch.closed:
+                    ch.cond.wait(timeout=self.heartbeat)
+                    pending = ch.since(last_id)
+                closed = ch.closed
+            if pending:
+                for event_id, event, data in pending:
+                    yield format_sse(event_id, event, data)
+                last_id = pending[-1][0]
+            elif not closed:
+                # Commentaire SSE : garde la connexion ouverte et détecte les clients partis
+                yield ": keep-alive\n\n"
+            if closed and not ch.since(last_id):
+                return
@@ -51,6 +51,6 @@ fi
 
 # Dépendances Python (CPU)
 echo "📦 Installation des dépendances Python..."
-pip install faster-whisper ffmpeg-python yt-dlp tqdm flask
+pip install faster-whisper yt-dlp tqdm flask
 
 echo "=== Installation terminée ==="
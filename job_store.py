@@ -0,0 +1,166 @@
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    progress    INTEGER NOT NULL DEFAULT 0,
+    msg         TEXT,
+    filename    TEXT,
+    source      TEXT,
+    txt         TEXT,
+    language    TEXT,
+    params      TEXT NOT NULL DEFAULT '{}',
+    checkpoint  REAL NOT NULL DEFAULT 0,
+    timings     TEXT,
+    cascade     TEXT,
+    created     REAL NOT NULL,
+    updated     REAL NOT NULL,
+    finished    REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, finished);
+CREATE TABLE IF NOT EXISTS segments (
+    job_id  TEXT NOT NULL,
+    idx     INTEGER NOT NULL,
+    start   REAL NOT NULL,
+    end     REAL NOT NULL,
+    text    TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = ("status", "progress", "msg", "filename", "source", "txt", "language",
+           "params", "checkpoint", "timings", "cascade", "finished")
+JSON_COLUMNS = ("params", "timings", "cascade")
+ACTIVE_STATUSES = ("queued", "running")
+TERMINAL_STATUSES = ("done", "error", "cancelled")
+
+
+class JobStore:
+    """Stockage durable des jobs (SQLite en mode WAL).
+
+    Une connexion par thread : en WAL les lectures de statut ne bloquent pas
+    les écritures des workers (et inversement). Les segments déjà décodés sont
+    enregistrés par lots avec le point de reprise (checkpoint, en secondes).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # Bases créées avant l'ajout des colonnes timings / cascade
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("timings", "cascade"):
+            if column not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"] or "{}")
+        for column in ("timings", "cascade"):
+            job[column] = json.loads(job[column]) if job.get(column) else None
+        return job
+
+    @staticmethod
+    def _encode(fields: dict) -> dict:
+        for k in JSON_COLUMNS:
+            if k in fields and not isinstance(fields[k], str):
+                fields[k] = json.dumps(fields[k])
+        return fields
+
+    def create(self, job_id: str, status: str = "queued", params: dict = None, **fields):
+        now = time.time()
+        fields = {k: v for k, v in fields.items() if k in COLUMNS}
+        fields.update(status=status, params=params or {})
+        self._encode(fields)
+        cols = ", ".join(["id", "created", "updated", *fields])
+        marks = ", ".join("?" * (len(fields) + 3))
+        self._conn().execute(f"INSERT INTO jobs ({cols}) VALUES ({marks})",
+                             (job_id, now, now, *fields.values()))
+
+    def update(self, job_id: str, **fields):
+        fields = self._encode({k: v for k, v in fields.items() if k in COLUMNS})
+        if fields.get("status") in TERMINAL_STATUSES:
+            fields.setdefault("finished", time.time())
+        fields["updated"] = time.time()
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        self._conn().execute(f"UPDATE jobs SET {sets} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def add_segments(self, job_id: str, segments, checkpoint: float):
+        """Enregistre un lot de segments et le nouveau point de reprise (une transaction)."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            base = conn.execute("SELECT COUNT(*) FROM segments WHERE job_id = ?",
+                                (job_id,)).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO segments (job_id, idx, start, end, text) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, base + i, s.start, s.end, s.text) for i, s in enumerate(segments)])
+            conn.execute("UPDATE jobs SET checkpoint = ?, updated = ? WHERE id = ?",
+                         (checkpoint, time.time(), job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def segments(self, job_id: str):
+        return self._conn().execute(
+            "SELECT start, end, text FROM segments WHERE job_id = ? ORDER BY idx", (job_id,)
+        ).fetchall()
+
+    def interrupted(self):
+        """Jobs en file ou en cours lors du dernier arrêt, du plus ancien au plus récent."""
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created", ACTIVE_STATUSES
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def delete(self, job_id: str):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM segments WHERE job_id = ?", (job_id,))
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        conn.execute("COMMIT")
+
+    def expired(self, ttl_seconds: float):
+        """Jobs terminés depuis plus de ttl_seconds."""
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE finished IS NOT NULL AND finished < ?",
+            (time.time() - ttl_seconds,)
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def finished(self):
+        """Jobs terminés, du plus anciennement terminé au plus récent (éviction)."""
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE finished IS NOT NULL ORDER BY finished"
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def counts(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
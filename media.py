@@ -0,0 +1,116 @@
+import os
+import json
+import threading
+import subprocess
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+from metrics import FFMPEG_FAILURES, FFMPEG_TIMEOUTS
+
+FFPROBE_BIN = os.environ.get("FFPROBE_BIN", "ffprobe")
+PROBE_TIMEOUT = 30
+PROBE_CACHE_SIZE = 256
+
+# Délai de décodage complet : base + facteur x durée du média
+DECODE_TIMEOUT_BASE = float(os.environ.get("DECODE_TIMEOUT_BASE", "60"))
+DECODE_TIMEOUT_FACTOR = float(os.environ.get("DECODE_TIMEOUT_FACTOR", "1.0"))
+
+AudioStream = namedtuple("AudioStream", "index codec sample_rate channels")
+MediaInfo = namedtuple("MediaInfo", "duration format_name size audio_streams has_video")
+
+EMPTY_INFO = MediaInfo(0.0, None, 0, (), False)
+
+
+def _parse(data: dict, size: int) -> MediaInfo:
+    fmt = data.get("format") or {}
+    streams = data.get("streams") or []
+    audio = tuple(
+        AudioStream(s.get("index"), s.get("codec_name"), int(s.get("sample_rate") or 0),
+                    int(s.get("channels") or 0))
+        for s in streams if s.get("codec_type") == "audio"
+    )
+    # Les pochettes d'album (attached_pic) ne comptent pas comme vidéo
+    has_video = any(s.get("codec_type") == "video"
+                    and not (s.get("disposition") or {}).get("attached_pic") for s in streams)
+    duration = float(fmt.get("duration") or 0.0)
+    if not duration:
+        duration = max((float(s.get("duration") or 0.0) for s in streams), default=0.0)
+    return MediaInfo(duration, fmt.get("format_name"), size, audio, has_video)
+
+
+class ProbeCache:
+    """Un seul appel ffprobe par média : durée, flux, codec, fréquence d'échantillonnage.
+
+    Les résultats sont mis en cache par (chemin, mtime, taille) : un fichier
+    modifié est sondé à nouveau.
+    """
+
+    def __init__(self, ffprobe_bin: str = None, max_entries: int = PROBE_CACHE_SIZE):
+        self.ffprobe_bin = ffprobe_bin or FFPROBE_BIN
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "errors": 0}
+
+    def probe(self, path) -> MediaInfo:
+        """Infos du média ; EMPTY_INFO si ffprobe échoue (durée inconnue = 0)."""
+        path = Path(path)
+        try:
+            st = path.stat()
+        except OSError:
+            return EMPTY_INFO
+        key = (str(path.resolve()), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            info = self._entries.get(key)
+            if info is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return info
+            self.stats["misses"] += 1
+
+        info = self._run(path, st.st_size)
+        if info is EMPTY_INFO:
+            return info
+        with self._lock:
+            self._entries[key] = info
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return info
+
+    def _run(self, path: Path, size: int) -> MediaInfo:
+        cmd = [self.ffprobe_bin, "-v", "error", "-print_format", "json",
+               "-show_format", "-show_streams", str(path)]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+            if result.returncode == 0 and result.stdout.strip():
+                return _parse(json.loads(result.stdout), size)
+            FFMPEG_FAILURES.inc(tool="ffprobe")
+        except subprocess.TimeoutExpired:
+            FFMPEG_TIMEOUTS.inc(tool="ffprobe")
+        except Exception:
+            FFMPEG_FAILURES.inc(tool="ffprobe")
+        with self._lock:
+            self.stats["errors"] += 1
+        return EMPTY_INFO
+
+
+def decode_timeout(duration: float) -> float:
+    """Délai maximal d'un décodage complet, proportionnel à la durée du média."""
+    return DECODE_TIMEOUT_BASE + DECODE_TIMEOUT_FACTOR * max(duration or 0.0, 0.0)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_probe_cache() -> ProbeCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ProbeCache()
+        return _default_cache
+
+
+def probe(path) -> MediaInfo:
+    """Raccourci : sondage via le cache par défaut du processus."""
+    return get_probe_cache().probe(path)
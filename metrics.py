@@ -0,0 +1,180 @@
+import os
+import time
+import threading
+
+# Désactivé (METRICS_ENABLED=0) : chaque appel se réduit à un test de booléen
+ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+
+DEFAULT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _labels_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for key, value in self._values.items():
+                yield f"{self.name}{_labels_text(self.labels, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}                 # key -> [compteurs par bucket, somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, n in zip(self.buckets, counts):
+                    yield f"{self.name}_bucket{_labels_text(names, key + (bound,))} {n}"
+                yield f"{self.name}_bucket{_labels_text(names, key + ('+Inf',))} {count}"
+                yield f"{self.name}_sum{_labels_text(self.labels, key)} {total}"
+                yield f"{self.name}_count{_labels_text(self.labels, key)} {count}"
+
+
+class Gauge:
+    """Valeur lue au moment de l'export (taille de file, modèles chargés...)."""
+
+    def __init__(self, name: str, help: str, fn):
+        self.name, self.help, self.fn = name, help, fn
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            yield f"{self.name} {float(self.fn())}"
+        except Exception:
+            pass
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, fn) -> Gauge:
+        with self._lock:
+            # Remplace la fonction si le module qui l'enregistre est rechargé
+            metric = self._metrics[name] = Gauge(name, help, fn)
+            return metric
+
+    def render(self) -> str:
+        """Export au format texte Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "transcribe_stage_seconds", "Durée des étapes du pipeline", ("stage",))
+JOBS = REGISTRY.counter("transcribe_jobs_total", "Jobs terminés par statut", ("status",))
+QUEUE_WAIT = REGISTRY.histogram(
+    "transcribe_queue_wait_seconds", "Attente en file avant le démarrage d'un job")
+AUDIO_SECONDS = REGISTRY.counter(
+    "transcribe_audio_seconds_total", "Secondes d'audio transcrites")
+REALTIME_FACTOR = REGISTRY.histogram(
+    "transcribe_realtime_factor", "Temps de traitement / durée audio",
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 5))
+MODEL_LOAD = REGISTRY.histogram(
+    "model_load_seconds", "Durée de chargement des modèles Whisper", ("model",))
+FFMPEG_FAILURES = REGISTRY.counter(
+    "ffmpeg_failures_total", "Échecs de FFmpeg/ffprobe", ("tool",))
+FFMPEG_TIMEOUTS = REGISTRY.counter(
+    "ffmpeg_timeouts_total", "Dépassements de délai de FFmpeg/ffprobe", ("tool",))
+
+
+class _Span:
+    __slots__ = ("stage", "timings", "t0")
+
+    def __init__(self, stage: str, timings):
+        self.stage = stage
+        self.timings = timings
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        if self.timings is not None:
+            self.timings[self.stage] = round(self.timings.get(self.stage, 0.0) + elapsed, 3)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage: str, timings: dict = None):
+    """Chronomètre une étape : `with span("decode", timings): ...`.
+
+    La durée alimente l'histogramme par étape et, si fourni, le dictionnaire
+    `timings` du job (cumul en secondes).
+    """
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(stage, timings)
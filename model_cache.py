@@ -0,0 +1,179 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from metrics import MODEL_LOAD
+
+# Taille approximative des modèles (millions de paramètres)
+MODEL_PARAMS_M = {
+    "tiny": 39, "tiny.en": 39,
+    "base": 74, "base.en": 74,
+    "small": 244, "small.en": 244,
+    "medium": 769, "medium.en": 769,
+    "large-v1": 1550, "large-v2": 1550, "large-v3": 1550, "large": 1550,
+    "distil-large-v3": 756, "distil-medium.en": 394, "distil-small.en": 166,
+}
+
+# Octets par paramètre selon le compute_type CTranslate2
+BYTES_PER_PARAM = {
+    "int8": 1, "int8_float32": 1, "int8_float16": 1, "int8_bfloat16": 1,
+    "int16": 2, "float16": 2, "bfloat16": 2, "float32": 4, "default": 1,
+}
+
+
+def estimate_model_mb(model_name: str, compute_type: str = "int8") -> float:
+    """Empreinte mémoire estimée d'un modèle (Mo)."""
+    params = MODEL_PARAMS_M.get(model_name, MODEL_PARAMS_M["large-v3"])
+    return params * BYTES_PER_PARAM.get(compute_type, 4)
+
+
+class ModelCache:
+    """Registre de modèles WhisperModel partagé entre threads, avec éviction LRU.
+
+    Les modèles sont indexés par (nom, compute_type, cpu_threads). Le budget
+    porte sur le nombre de modèles chargés et/ou sur la mémoire estimée.
+    """
+
+    def __init__(self, max_models: int = 2, max_memory_mb: float = 0,
+                 device: str = "cpu", num_workers: int = 1, loader=None):
+        self.max_models = max_models
+        self.max_memory_mb = max_memory_mb
+        self.device = device
+        # Nombre d'appels transcribe() concurrents qu'une instance peut servir
+        self.num_workers = num_workers
+        self._loader = loader
+        self._models = OrderedDict()      # key -> (model, size_mb)
+        self._lock = threading.Lock()
+        self._loading = {}                # key -> Event (chargement en cours)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0,
+                      "loads": 0, "load_time_s": 0.0, "load_errors": 0}
+
+    @staticmethod
+    def make_key(model_name: str, compute_type: str = "int8", cpu_threads: int = 0):
+        return (model_name, compute_type, int(cpu_threads or 0))
+
+    def _load(self, model_name: str, compute_type: str, cpu_threads: int):
+        if self._loader is not None:
+            return self._loader(model_name, compute_type, cpu_threads)
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_name, device=self.device, compute_type=compute_type,
+                            cpu_threads=cpu_threads, num_workers=self.num_workers)
+
+    def get(self, model_name: str, compute_type: str = "int8", cpu_threads: int = 0):
+        """Retourne le modèle demandé, en le chargeant au besoin (un seul chargement par clé)."""
+        key = self.make_key(model_name, compute_type, cpu_threads)
+        while True:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[0]
+                pending = self._loading.get(key)
+                if pending is None:
+                    # Ce thread se charge du chargement
+                    pending = self._loading[key] = threading.Event()
+                    self.stats["misses"] += 1
+                    break
+            # Un autre thread charge déjà ce modèle : on attend puis on relit le cache
+            pending.wait()
+
+        try:
+            t0 = time.perf_counter()
+            model = self._load(*key)
+            elapsed = time.perf_counter() - t0
+            MODEL_LOAD.observe(elapsed, model=model_name)
+        except Exception:
+            with self._lock:
+                self.stats["load_errors"] += 1
+                self._loading.pop(key).set()
+            raise
+
+        with self._lock:
+            self.stats["loads"] += 1
+            self.stats["load_time_s"] += elapsed
+            self._models[key] = (model, estimate_model_mb(model_name, compute_type))
+            self._models.move_to_end(key)
+            self._evict_locked(keep=key)
+            self._loading.pop(key).set()
+        return model
+
+    def _evict_locked(self, keep=None):
+        """Évince les modèles les moins récemment utilisés jusqu'à respecter le budget."""
+        def over_budget():
+            if self.max_models and len(self._models) > self.max_models:
+                return True
+            if self.max_memory_mb and self.memory_mb() > self.max_memory_mb:
+                return True
+            return False
+
+        for key in list(self._models):
+            if not over_budget():
+                break
+            if key == keep:
+                continue
+            # Les threads qui utilisent encore ce modèle en gardent une référence
+            del self._models[key]
+            self.stats["evictions"] += 1
+
+    def memory_mb(self) -> float:
+        return sum(size for _, size in self._models.values())
+
+    def preload(self, model_names, compute_type: str = "int8", cpu_threads: int = 0):
+        """Charge une liste de modèles (ex. au démarrage du serveur)."""
+        loaded = []
+        for name in model_names:
+            name = name.strip()
+            if not name:
+                continue
+            self.get(name, compute_type, cpu_threads)
+            loaded.append(name)
+        return loaded
+
+    def evict(self, model_name: str = None):
+        """Vide le cache (ou seulement les entrées d'un modèle donné)."""
+        with self._lock:
+            for key in list(self._models):
+                if model_name is None or key[0] == model_name:
+                    del self._models[key]
+                    self.stats["evictions"] += 1
+
+    def loaded(self):
+        with self._lock:
+            return [{"model": k[0], "compute_type": k[1], "cpu_threads": k[2], "size_mb": size}
+                    for k, (_, size) in self._models.items()]
+
+    def snapshot(self) -> dict:
+        """Statistiques du cache (hits/misses/temps de chargement)."""
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["hits"] / lookups) if lookups else 0.0
+            stats["avg_load_time_s"] = (stats["load_time_s"] / stats["loads"]) if stats["loads"] else 0.0
+            stats["memory_mb"] = self.memory_mb()
+            stats["max_models"] = self.max_models
+            stats["max_memory_mb"] = self.max_memory_mb
+        stats["loaded"] = self.loaded()
+        return stats
+
+
+# Cache par défaut du processus, configurable par variables d'environnement
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache() -> ModelCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ModelCache(
+                max_models=int(os.environ.get("MODEL_CACHE_MAX", "2")),
+                max_memory_mb=float(os.environ.get("MODEL_CACHE_MB", "0")),
+            )
+        return _default_cache
+
+
+def get_model(model_name: str, compute_type: str = "int8", cpu_threads: int = 0):
+    """Raccourci : modèle depuis le cache par défaut du processus."""
+    return get_cache().get(model_name, compute_type, cpu_threads)
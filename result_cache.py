@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+HASH_CHUNK = 1024 * 1024
+
+# Segments et infos restitués depuis le cache (mêmes attributs que faster-whisper)
+CachedSegment = namedtuple("CachedSegment", "start end text")
+CachedInfo = namedtuple("CachedInfo", "language language_probability duration")
+
+
+def save_and_hash(stream, dest: Path) -> str:
+    """Écrit un flux binaire sur disque en calculant son SHA-256 au passage (une seule lecture)."""
+    h = hashlib.sha256()
+    with open(dest, "wb") as f:
+        while True:
+            chunk = stream.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+            f.write(chunk)
+    return h.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(content_hash: str, model: str, language: str = None, vad: bool = False,
+             beam_size: int = 5, cascade: str = None) -> str:
+    """Clé de cache : empreinte du média + options de décodage qui influent sur le résultat."""
+    opts = {"model": model, "language": language or None, "vad": bool(vad),
+            "beam_size": beam_size}
+    if cascade:
+        # Premier passage du mode cascade (absent des clés existantes)
+        opts["cascade"] = cascade
+    opts = json.dumps(opts, sort_keys=True)
+    return hashlib.sha256(f"{content_hash}:{opts}".encode()).hexdigest()
+
+
+class ResultCache:
+    """Cache disque des transcriptions, adressé par contenu, avec éviction LRU sur la taille.
+
+    Une entrée = un fichier JSON (langue + segments). La date de modification
+    sert d'horodatage LRU : elle est mise à jour à chaque lecture.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 500 * 1024 * 1024):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._size = sum(p.stat().st_size for p in self._entries())
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _entries(self):
+        return self.root.glob("*/*.json")
+
+    def get(self, key: str):
+        """Retourne (segments, info) ou None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)  # LRU : dernière utilisation
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["hits"] += 1
+        segments = [CachedSegment(*s) for s in data["segments"]]
+        info = CachedInfo(data.get("language"), data.get("language_probability", 0.0),
+                          data.get("duration", 0.0))
+        return segments, info
+
+    def put(self, key: str, segments, language: str = None,
+            language_probability: float = 0.0, duration: float = 0.0, **meta):
+        """Enregistre une transcription (écriture atomique) puis applique le quota."""
+        data = {
+            "language": language,
+            "language_probability": language_probability,
+            "duration": duration,
+            "created": time.time(),
+            "segments": [[round(s.start, 3), round(s.end, 3), s.text] for s in segments],
+            **meta,
+        }
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        with self._lock:
+            old = path.stat().st_size if path.exists() else 0
+            os.replace(tmp, path)
+            self._size += path.stat().st_size - old
+            self.stats["stores"] += 1
+            self._evict_locked()
+
+    def _evict_locked(self):
+        if not self.max_bytes or self._size <= self.max_bytes:
+            return
+        entries = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        for _, size, p in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            self._size -= size
+            self.stats["evictions"] += 1
+
+    def purge(self, key: str = None) -> int:
+        """Supprime une entrée (ou tout le cache). Retourne le nombre d'entrées supprimées."""
+        with self._lock:
+            paths = [self._path(key)] if key else list(self._entries())
+            removed = 0
+            for p in paths:
+                try:
+                    size = p.stat().st_size
+                    p.unlink()
+                except OSError:
+                    continue
+                self._size -= size
+                removed += 1
+            return removed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({"entries": sum(1 for _ in self._entries()), "size_bytes": self._size,
+                          "max_bytes": self.max_bytes, "root": str(self.root.absolute())})
+        return stats
+
+
+def default_cache() -> ResultCache:
+    """Cache partagé par le serveur et la CLI (mêmes variables d'environnement)."""
+    root = Path(os.environ.get("RESULT_CACHE_DIR", "cache/results"))
+    max_mb = float(os.environ.get("RESULT_CACHE_MB", "500"))
+    return ResultCache(root, int(max_mb * 1024 * 1024))
@@ -0,0 +1,250 @@
+import os
+import time
+import shutil
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+# Durée de conservation des jobs terminés (base, sorties, média source)
+JOB_TTL_HOURS = float(os.environ.get("JOB_TTL_HOURS", "24"))
+PRUNE_INTERVAL_SECONDS = float(os.environ.get("RETENTION_INTERVAL_SECONDS", "300"))
+
+# Média source : "decoded" = supprimé dès l'audio extrait (pas de reprise après
+# redémarrage), "done" = à la fin du job s'il réussit, "ttl" = avec le job à l'expiration
+SOURCE_RETENTION = os.environ.get("SOURCE_RETENTION", "done")
+
+# Quotas disque (Mo, 0 = aucun) ; au-delà, les jobs terminés les plus anciens sont évincés
+UPLOADS_QUOTA_MB = float(os.environ.get("UPLOADS_QUOTA_MB", "0"))
+OUTPUTS_QUOTA_MB = float(os.environ.get("OUTPUTS_QUOTA_MB", "0"))
+# Espace libre minimal : en dessous, les nouveaux uploads sont refusés (507)
+MIN_FREE_MB = float(os.environ.get("MIN_FREE_MB", "1024"))
+
+MB = 1024 * 1024
+
+DirUsage = namedtuple("DirUsage", "files bytes oldest")
+
+
+class InsufficientStorage(Exception):
+    """Espace disque ou quota insuffisant : l'upload est refusé avant d'écrire quoi que ce soit."""
+
+    def __init__(self, message: str, free: int, needed: int):
+        super().__init__(message)
+        self.free = free
+        self.needed = needed
+
+
+def dir_usage(path: Path) -> DirUsage:
+    """Nombre de fichiers, octets et date du plus ancien fichier sous `path` (récursif)."""
+    files, total, oldest = 0, 0, None
+    stack = [Path(path)]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files += 1
+            total += st.st_size
+            oldest = st.st_mtime if oldest is None else min(oldest, st.st_mtime)
+    return DirUsage(files, total, oldest)
+
+
+def _unlink(path) -> int:
+    """Supprime un fichier ; octets libérés (0 s'il n'existait pas)."""
+    try:
+        path = Path(path)
+        size = path.stat().st_size
+        path.unlink()
+        return size
+    except OSError:
+        return 0
+
+
+class RetentionManager:
+    """Rétention de uploads/, sorties/ et de la table des jobs.
+
+    - suppression du média source après extraction de l'audio (SOURCE_RETENTION) ;
+    - expiration des jobs terminés après `ttl_hours` (ligne, segments, sorties) ;
+    - quotas par dossier, avec éviction des jobs terminés du plus ancien au plus récent ;
+    - refus des uploads (InsufficientStorage) avant que le disque ne soit plein.
+    """
+
+    def __init__(self, store, upload_dir: Path, output_dir: Path, partial_dir: Path,
+                 ttl_hours: float = JOB_TTL_HOURS, uploads_quota_mb: float = UPLOADS_QUOTA_MB,
+                 outputs_quota_mb: float = OUTPUTS_QUOTA_MB, min_free_mb: float = MIN_FREE_MB,
+                 source_retention: str = SOURCE_RETENTION, extra_dirs: dict = None,
+                 search_index=None):
+        self.store = store
+        self.upload_dir = Path(upload_dir)
+        self.output_dir = Path(output_dir)
+        self.partial_dir = Path(partial_dir)
+        self.ttl = ttl_hours * 3600
+        self.quotas = {"uploads": int(uploads_quota_mb * MB), "outputs": int(outputs_quota_mb * MB)}
+        self.min_free = int(min_free_mb * MB)
+        self.source_retention = source_retention
+        # Dossiers seulement mesurés (ex. cache des transcriptions, qui a sa propre éviction)
+        self.extra_dirs = {name: Path(p) for name, p in (extra_dirs or {}).items()}
+        # Un job supprimé disparaît aussi des résultats de recherche
+        self.search_index = search_index
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {"sources_deleted": 0, "jobs_expired": 0, "jobs_evicted": 0,
+                      "partials_expired": 0, "bytes_freed": 0, "uploads_refused": 0}
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    # -- Média source --------------------------------------------------------
+
+    def release_source(self, path) -> int:
+        """Supprime un média source conservé dans uploads/ (ignoré pour l'audio en mémoire)."""
+        if not isinstance(path, (str, Path)) or not path:
+            return 0
+        freed = _unlink(path)
+        if freed:
+            self._count("sources_deleted")
+            self._count("bytes_freed", freed)
+        return freed
+
+    def on_decoded(self, path):
+        if self.source_retention == "decoded":
+            self.release_source(path)
+
+    def on_finished(self, path):
+        """Job terminé avec succès (un job en erreur ou annulé garde sa source jusqu'au TTL)."""
+        if self.source_retention in ("decoded", "done"):
+            self.release_source(path)
+
+    def after_decode(self, chunks, path):
+        """Relaye les blocs PCM ; le média source est libéré quand ffmpeg a tout décodé."""
+        yield from chunks
+        self.on_decoded(path)
+
+    # -- Jobs terminés -------------------------------------------------------
+
+    def job_files(self, job) -> list:
+        outputs = [self.output_dir / f"{job['id']}.{fmt}"
+                   for fmt in (job.get("params") or {}).get("formats") or ["txt"]]
+        return [Path(p) for p in (job.get("txt"), job.get("source"), *outputs) if p]
+
+    def delete_job(self, job) -> int:
+        freed = sum(_unlink(p) for p in set(self.job_files(job)))
+        self.store.delete(job["id"])
+        if self.search_index is not None:
+            self.search_index.delete(job["id"])
+        self._count("bytes_freed", freed)
+        return freed
+
+    def expire(self) -> int:
+        """Jobs terminés depuis plus du TTL et uploads reprenables abandonnés."""
+        expired = 0
+        for job in self.store.expired(self.ttl):
+            self.delete_job(job)
+            expired += 1
+        self._count("jobs_expired", expired)
+        limit = time.time() - self.ttl
+        for meta_path in self.partial_dir.glob("*.json"):
+            data_path = meta_path.with_suffix(".part")
+            try:
+                last = max(p.stat().st_mtime for p in (meta_path, data_path) if p.exists())
+            except ValueError:
+                continue
+            if last < limit:
+                self._count("bytes_freed", _unlink(data_path) + _unlink(meta_path))
+                self._count("partials_expired")
+        return expired
+
+    def enforce_quotas(self, extra_upload_bytes: int = 0) -> int:
+        """Évince les jobs terminés les plus anciens tant qu'un dossier dépasse son quota.
+
+        Pour uploads/, seul le média source est supprimé (le résultat reste
+        téléchargeable) ; pour sorties/, le job entier disparaît.
+        """
+        quota_up, quota_out = self.quotas["uploads"], self.quotas["outputs"]
+        excess_up = dir_usage(self.upload_dir).bytes + extra_upload_bytes - quota_up if quota_up else 0
+        excess_out = dir_usage(self.output_dir).bytes - quota_out if quota_out else 0
+        if excess_up <= 0 and excess_out <= 0:
+            return 0
+        evicted = 0
+        for job in self.store.finished():
+            if excess_up <= 0 and excess_out <= 0:
+                break
+            if excess_out > 0:
+                source = Path(job["source"]) if job.get("source") else None
+                size_up = source.stat().st_size if source and source.exists() else 0
+                excess_out -= self.delete_job(job) - size_up
+                excess_up -= size_up
+                evicted += 1
+            elif job.get("source"):
+                freed = self.release_source(job["source"])
+                self.store.update(job["id"], source=None)
+                excess_up -= freed
+        self._count("jobs_evicted", evicted)
+        return evicted
+
+    # -- Admission des uploads -----------------------------------------------
+
+    def check_space(self, expected_bytes: int = 0):
+        """Lève InsufficientStorage si l'upload ne tient pas (espace libre ou quota)."""
+        expected_bytes = max(int(expected_bytes or 0), 0)
+        if self.quotas["uploads"]:
+            self.enforce_quotas(expected_bytes)
+            used = dir_usage(self.upload_dir).bytes
+            if used + expected_bytes > self.quotas["uploads"]:
+                self._count("uploads_refused")
+                raise InsufficientStorage(
+                    f"Quota des uploads atteint ({used / MB:.0f} / {self.quotas['uploads'] / MB:.0f} Mo)",
+                    max(self.quotas["uploads"] - used, 0), expected_bytes)
+        free = shutil.disk_usage(self.upload_dir).free
+        if free - expected_bytes < self.min_free:
+            self._count("uploads_refused")
+            raise InsufficientStorage(
+                f"Espace disque insuffisant ({free / MB:.0f} Mo libres, "
+                f"minimum {self.min_free / MB:.0f} Mo après l'upload)", free, expected_bytes)
+
+    # -- Suivi et boucle de fond ---------------------------------------------
+
+    def usage(self) -> dict:
+        disk = shutil.disk_usage(self.upload_dir)
+        dirs = {"uploads": self.upload_dir, "partial": self.partial_dir,
+                "outputs": self.output_dir, **self.extra_dirs}
+        folders = {}
+        for name, path in dirs.items():
+            u = dir_usage(path)
+            folders[name] = {"path": str(path.absolute()), "files": u.files, "bytes": u.bytes,
+                             "oldest": u.oldest}
+            if self.quotas.get(name):
+                folders[name]["quota_bytes"] = self.quotas[name]
+        with self._lock:
+            stats = dict(self.stats)
+        return {"disk": {"total": disk.total, "used": disk.used, "free": disk.free,
+                         "min_free": self.min_free},
+                "folders": folders, "jobs": self.store.counts(),
+                "ttl_hours": self.ttl / 3600, "source_retention": self.source_retention,
+                "stats": stats}
+
+    def run_once(self):
+        self.expire()
+        self.enforce_quotas()
+
+    def _loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"⚠️  Rétention : {e}")
+
+    def start(self, interval: float = PRUNE_INTERVAL_SECONDS):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, args=(interval,),
+                                            name="retention", daemon=True)
+            self._thread.start()
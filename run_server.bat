@@ -32,7 +32,7 @@ python -m pip install --upgrade pip wheel setuptools
 
 echo [INFO] Installation des dependances Python...
 REM plus leger et suffisant pour CPU
-python -m pip install faster-whisper ffmpeg-python yt-dlp tqdm flask
+python -m pip install faster-whisper yt-dlp tqdm flask
 
 REM 4) Verification FFmpeg (optionnel mais recommande)
 where ffmpeg >nul 2>nul
@@ -0,0 +1,123 @@
+import os
+import threading
+from collections import deque
+
+
+class QueueFull(Exception):
+    """File d'attente pleine : le job est refusé (admission control)."""
+
+    def __init__(self, queued: int):
+        super().__init__(f"File d'attente pleine ({queued} jobs en attente)")
+        self.queued = queued
+
+
+class JobCancelled(Exception):
+    """Levée par un job qui constate qu'il a été annulé."""
+
+
+def split_cpu_threads(workers: int, cores: int = None) -> int:
+    """Nombre de threads CPU par worker pour que le total corresponde aux cœurs."""
+    cores = cores or os.cpu_count() or 1
+    return max(1, cores // max(1, workers))
+
+
+class JobScheduler:
+    """Ordonnanceur borné : file FIFO + nombre fixe de workers de transcription.
+
+    La cible est appelée avec `cpu_threads` et `cancel` (threading.Event) en
+    arguments nommés, en plus des arguments fournis à `submit`.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 20, cpu_threads: int = None):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.cpu_threads = cpu_threads or split_cpu_threads(self.workers)
+        self._queue = deque()             # (job_id, target, args, kwargs)
+        self._running = {}                # job_id -> Event d'annulation
+        self._cancel_events = {}          # job_id -> Event (jobs en file)
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"transcribe-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    def submit(self, job_id: str, target, *args, bypass_limit: bool = False, **kwargs) -> int:
+        """Met un job en file. Retourne sa position (1 = prochain) ou lève QueueFull."""
+        with self._cond:
+            if not bypass_limit and self.max_queue and len(self._queue) >= self.max_queue:
+                raise QueueFull(len(self._queue))
+            self._cancel_events[job_id] = threading.Event()
+            self._queue.append((job_id, target, args, kwargs))
+            self._cond.notify()
+            return len(self._queue)
+
+    def position(self, job_id: str):
+        """Position dans la file (1 = prochain), 0 si en cours, None si inconnu."""
+        with self._cond:
+            if job_id in self._running:
+                return 0
+            for i, item in enumerate(self._queue, start=1):
+                if item[0] == job_id:
+                    return i
+            return None
+
+    def queued_ids(self):
+        """Identifiants des jobs en attente, dans l'ordre de la file."""
+        with self._cond:
+            return [item[0] for item in self._queue]
+
+    def cancel(self, job_id: str):
+        """Annule un job. Retourne "queued", "running" ou None si inconnu/terminé."""
+        with self._cond:
+            for item in self._queue:
+                if item[0] == job_id:
+                    self._queue.remove(item)
+                    self._cancel_events.pop(job_id).set()
+                    return "queued"
+            event = self._running.get(job_id)
+            if event is not None:
+                # Annulation coopérative : le job vérifie l'événement entre deux étapes
+                event.set()
+                return "running"
+            return None
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "cpu_threads_per_worker": self.cpu_threads,
+                "max_queue": self.max_queue,
+                "queued": len(self._queue),
+                "running": len(self._running),
+            }
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                job_id, target, args, kwargs = self._queue.popleft()
+                cancel = self._cancel_events.pop(job_id)
+                self._running[job_id] = cancel
+            try:
+                target(*args, cpu_threads=self.cpu_threads, cancel=cancel, **kwargs)
+            except Exception:
+                # La cible gère elle-même l'état du job ; le worker ne doit pas mourir
+                pass
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
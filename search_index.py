@@ -0,0 +1,390 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from result_cache import CachedSegment
+
+# Index plein texte partagé par le serveur, la CLI et le mode batch
+SEARCH_DB = Path(os.environ.get("SEARCH_DB", "search.db"))
+# Segments accumulés avant une écriture (une transaction par lot)
+INDEX_BATCH = int(os.environ.get("SEARCH_INDEX_BATCH", "64"))
+# Ordre de préférence quand un même transcript existe en plusieurs formats (backfill)
+BACKFILL_FORMATS = (".json", ".srt", ".vtt", ".txt")
+
+# Segments dans une table ordinaire (index par document : remplacement rapide),
+# texte indexé par FTS5 en "external content", synchronisé par triggers.
+# remove_diacritics : "eleve" trouve "élève".
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id        TEXT PRIMARY KEY,
+    kind      TEXT NOT NULL,
+    title     TEXT,
+    path      TEXT,
+    language  TEXT,
+    segments  INTEGER NOT NULL DEFAULT 0,
+    complete  INTEGER NOT NULL DEFAULT 0,
+    mtime     REAL,
+    indexed   REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id        INTEGER PRIMARY KEY,
+    doc_id    TEXT NOT NULL,
+    start_ms  INTEGER,
+    end_ms    INTEGER,
+    text      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_doc ON segments(doc_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content='segments', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='3'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts(segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+Hit = namedtuple("Hit", "doc_id kind title path start_ms end_ms text snippet score")
+
+
+def to_ms(seconds):
+    return None if seconds is None else int(round(seconds * 1000))
+
+
+def file_doc_id(base: Path) -> str:
+    """Identifiant d'un transcript de la CLI : chemin des sorties sans extension."""
+    return f"file:{Path(base).resolve()}"
+
+
+def fts_query(text: str) -> str:
+    """Requête utilisateur -> requête FTS5 sûre : mots (ET implicite), "phrases" et préfixes mot*."""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        if phrase:
+            words = re.findall(r"\w+", phrase)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+        prefix = word.endswith("*")
+        for w in re.findall(r"\w+", word):
+            terms.append(f'"{w}"')
+        if prefix and terms and re.search(r"\w", word):
+            terms[-1] += "*"
+    if not terms:
+        raise ValueError("Requête vide")
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """Index plein texte (SQLite FTS5) des segments de toutes les transcriptions.
+
+    Un document = un job du serveur (id du job) ou un transcript de la CLI
+    (`file_doc_id`). Chaque segment garde son document et ses bornes en
+    millisecondes ; les résultats sont classés par BM25.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # -- Écriture ------------------------------------------------------------
+
+    def begin(self, doc_id: str, kind: str, title: str = None, path=None,
+              language: str = None, mtime: float = None):
+        """(Ré)initialise un document : ses anciens segments sont supprimés."""
+        def run(conn):
+            conn.execute("DELETE FROM segments WHERE doc_id = ?", (doc_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (id, kind, title, path, language, segments, "
+                "complete, mtime, indexed) VALUES (?, ?, ?, ?, ?, 0, 0, ?, ?)",
+                (doc_id, kind, title, str(path) if path else None, language, mtime, time.time()))
+        self._transaction(run)
+
+    def add_segments(self, doc_id: str, segments):
+        rows = [(doc_id, to_ms(s.start), to_ms(s.end), s.text.strip())
+                for s in segments if s.text.strip()]
+        if not rows:
+            return
+
+        def run(conn):
+            conn.executemany(
+                "INSERT INTO segments (doc_id, start_ms, end_ms, text) VALUES (?, ?, ?, ?)", rows)
+            conn.execute("UPDATE documents SET segments = segments + ?, indexed = ? WHERE id = ?",
+                         (len(rows), time.time(), doc_id))
+        self._transaction(run)
+
+    def finish(self, doc_id: str, language: str = None):
+        self._conn().execute(
+            "UPDATE documents SET complete = 1, language = COALESCE(?, language), indexed = ? "
+            "WHERE id = ?", (language, time.time(), doc_id))
+
+    def delete(self, doc_id: str):
+        def run(conn):
+            conn.execute("DELETE FROM segments WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        self._transaction(run)
+
+    def writer(self, doc_id: str, kind: str, title: str = None, path=None) -> "IndexWriter":
+        return IndexWriter(self, doc_id, kind, title, path)
+
+    def optimize(self):
+        """Fusionne les segments FTS5 (après un gros backfill)."""
+        self._conn().execute("INSERT INTO segments_fts(segments_fts) VALUES ('optimize')")
+
+    # -- Lecture -------------------------------------------------------------
+
+    def document(self, doc_id: str):
+        row = self._conn().execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+        return dict(row) if row else None
+
+    def search(self, query: str, limit: int = 20, offset: int = 0, doc_id: str = None,
+               kind: str = None) -> list:
+        """Segments correspondant à `query`, du plus pertinent au moins pertinent (BM25)."""
+        sql = ("SELECT s.doc_id, d.kind, d.title, d.path, s.start_ms, s.end_ms, s.text, "
+               "snippet(segments_fts, 0, '[', ']', '…', 16) AS snippet, "
+               "bm25(segments_fts) AS score "
+               "FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid "
+               "JOIN documents d ON d.id = s.doc_id WHERE segments_fts MATCH ?")
+        args = [fts_query(query)]
+        if doc_id:
+            sql += " AND s.doc_id = ?"
+            args.append(doc_id)
+        if kind:
+            sql += " AND d.kind = ?"
+            args.append(kind)
+        sql += " ORDER BY score LIMIT ? OFFSET ?"
+        args += [max(int(limit), 1), max(int(offset), 0)]
+        rows = self._conn().execute(sql, args).fetchall()
+        return [Hit(r["doc_id"], r["kind"], r["title"], r["path"], r["start_ms"], r["end_ms"],
+                    r["text"], r["snippet"], round(-r["score"], 4)) for r in rows]
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        docs, complete = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(complete), 0) FROM documents").fetchone()
+        segments = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {"documents": docs, "complete": complete, "segments": segments,
+                "path": str(self.path.absolute())}
+
+
+class IndexWriter:
+    """Alimente l'index au fil des segments d'une transcription (même interface que MultiWriter).
+
+    Les segments sont écrits par lots de INDEX_BATCH : ils deviennent
+    cherchables pendant la transcription. En cas d'exception dans le bloc
+    `with`, le document partiel est retiré de l'index.
+    """
+
+    def __init__(self, index: SearchIndex, doc_id: str, kind: str, title: str = None, path=None,
+                 batch: int = INDEX_BATCH):
+        self.index = index
+        self.doc_id = doc_id
+        self.batch = batch
+        self.pending = []
+        self.count = 0
+        index.begin(doc_id, kind, title, path)
+
+    def write(self, seg):
+        self.pending.append(seg)
+        self.count += 1
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def write_all(self, segments):
+        for seg in segments:
+            self.write(seg)
+
+    def flush(self):
+        if self.pending:
+            self.index.add_segments(self.doc_id, self.pending)
+            self.pending = []
+
+    def close(self, info=None):
+        self.flush()
+        self.index.finish(self.doc_id, getattr(info, "language", None))
+
+    def abort(self):
+        self.pending = []
+        self.index.delete(self.doc_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+# -- Backfill des sorties existantes -------------------------------------------
+
+TIMESTAMP = r"(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{3})"
+CUE = re.compile(rf"{TIMESTAMP}\s*-->\s*{TIMESTAMP}")
+TXT_LINE = re.compile(r"^(.*?)\s*\[(\d+):(\d{2}):(\d{2})\]\s*$")
+
+
+def _seconds(h, m, s, ms) -> float:
+    return int(h or 0) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000
+
+
+def parse_cues(text: str):
+    """Segments d'un fichier SRT ou WebVTT."""
+    segments, cue = [], None
+    for line in text.splitlines() + [""]:
+        line = line.strip()
+        match = CUE.search(line)
+        if match:
+            g = match.groups()
+            cue = [_seconds(*g[:4]), _seconds(*g[4:]), []]
+        elif not line:
+            if cue and cue[2]:
+                segments.append(CachedSegment(cue[0], cue[1], " ".join(cue[2])))
+            cue = None
+        elif cue is not None:
+            cue[2].append(line)
+    return segments
+
+
+def parse_txt(text: str):
+    """Segments d'un TXT : horodaté (serveur, heure de fin par ligne) ou texte brut (CLI, sans temps)."""
+    segments, prev_end, plain = [], 0.0, []
+    for line in text.splitlines():
+        match = TXT_LINE.match(line)
+        if match:
+            end = _seconds(match.group(2), match.group(3), match.group(4), 0)
+            segments.append(CachedSegment(prev_end, end, match.group(1)))
+            prev_end = end
+        elif line.strip():
+            plain.append(line.strip())
+    if segments:
+        return segments
+    # Texte sans horodatage : une entrée par phrase, bornes inconnues
+    sentences = re.split(r"(?<=[.!?…])\s+", " ".join(plain))
+    return [CachedSegment(None, None, s) for s in sentences if s.strip()]
+
+
+def read_transcript(path: Path):
+    """(segments, langue) d'un fichier de sortie TXT, SRT, WebVTT ou JSON."""
+    path = Path(path)
+    text = path.read_text(encoding="utf-8", errors="replace")
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        data = json.loads(text)
+        items = data.get("segments") if isinstance(data, dict) else None
+        if not isinstance(items, list) or not all(isinstance(s, dict) for s in items):
+            raise ValueError("JSON sans liste de segments (pas une sortie de transcription)")
+        return ([CachedSegment(s.get("start"), s.get("end"), str(s.get("text", "")))
+                 for s in items], data.get("language"))
+    if suffix in (".srt", ".vtt"):
+        return parse_cues(text), None
+    return parse_txt(text), None
+
+
+def find_transcripts(paths):
+    """Un fichier par transcript (base sans extension), le format le plus précis l'emportant."""
+    best = {}
+    for root in paths:
+        root = Path(root)
+        files = [root] if root.is_file() else (p for p in root.rglob("*") if p.is_file())
+        for p in files:
+            suffix = p.suffix.lower()
+            if suffix not in BACKFILL_FORMATS:
+                continue
+            base = p.with_suffix("")
+            current = best.get(base)
+            if current is None or BACKFILL_FORMATS.index(suffix) < \
+                    BACKFILL_FORMATS.index(current.suffix.lower()):
+                best[base] = p
+    return sorted(best.values())
+
+
+def backfill(index: SearchIndex, paths, jobs: bool = False, force: bool = False,
+             on_file=None) -> dict:
+    """Indexe les sorties déjà présentes sur disque (dossiers ou fichiers).
+
+    Avec `jobs`, les fichiers sont des sorties du serveur (`sorties/<job_id>.<ext>`)
+    et le nom du fichier est l'identifiant du job. Sont ignorés (sauf `force`) les
+    fichiers inchangés depuis leur dernière indexation et les transcripts déjà
+    indexés au fil de la transcription (horodatage exact, sans `mtime`).
+    """
+    stats = {"indexed": 0, "skipped": 0, "errors": 0, "segments": 0}
+    for path in find_transcripts(paths):
+        base = path.with_suffix("")
+        doc_id = base.name if jobs else file_doc_id(base)
+        mtime = path.stat().st_mtime
+        doc = index.document(doc_id)
+        if not force and doc and doc["complete"] and doc["mtime"] in (None, mtime):
+            stats["skipped"] += 1
+            continue
+        try:
+            segments, language = read_transcript(path)
+        except (OSError, ValueError) as e:
+            stats["errors"] += 1
+            if on_file:
+                on_file(path, e)
+            continue
+        index.begin(doc_id, "job" if jobs else "file", base.name, base, language, mtime)
+        index.add_segments(doc_id, segments)
+        index.finish(doc_id, language)
+        stats["indexed"] += 1
+        stats["segments"] += len(segments)
+        if on_file:
+            on_file(path, None)
+    if stats["indexed"]:
+        index.optimize()
+    return stats
+
+
+def format_ms(ms) -> str:
+    """HH:MM:SS.mmm (ou "--:--:--" si l'horodatage est inconnu)."""
+    if ms is None:
+        return "--:--:--"
+    h, ms = divmod(int(ms), 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    """Index partagé par le serveur et la CLI (variable d'environnement SEARCH_DB)."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = SearchIndex(SEARCH_DB)
+        return _default_index
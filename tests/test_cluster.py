@@ -0,0 +1,178 @@
+"""Répartition des jobs par WorkerRegistry, en mémoire (ni HTTP ni modèles)."""
+import time
+from pathlib import Path
+
+import pytest
+
+from cluster import LeaseLost, WorkerRegistry
+
+
+def drain(job) -> list:
+    """Messages en attente dans la file du job."""
+    events = []
+    while not job.events.empty():
+        events.append(job.events.get_nowait())
+    return events
+
+
+def kinds(job) -> list:
+    return [item[0] for item in drain(job)]
+
+
+def segment(start: float, end: float, text: str = "x") -> dict:
+    return {"start": start, "end": end, "text": text}
+
+
+@pytest.fixture
+def registry():
+    return WorkerRegistry(token="", worker_timeout=15, lease_seconds=30,
+                          affinity_wait=10, max_attempts=3)
+
+
+def submit(registry, job_id: str, model: str = "small", media=Path("media.mp3")):
+    registry.submit(job_id, model, {"model": model, "params": {}}, media)
+    return registry._jobs[job_id]
+
+
+# --- Affinité ----------------------------------------------------------------
+
+def test_job_goes_to_worker_with_model_loaded(registry):
+    cold = registry.register("cold", ["medium"])["worker_id"]
+    warm = registry.register("warm", ["small"])["worker_id"]
+    submit(registry, "j1", "small")
+
+    assert registry.lease(cold) is None
+    assigned = registry.lease(warm)
+    assert assigned["job_id"] == "j1"
+    assert assigned["media"] == "file"
+    assert registry.stats["affinity_hits"] == 1
+
+
+def test_affinity_wait_fallback(registry):
+    busy = registry.register("busy", ["small"], slots=1)["worker_id"]
+    other = registry.register("other", [])["worker_id"]
+    submit(registry, "j1", "small")
+    job = submit(registry, "j2", "small")
+    assert registry.lease(busy)["job_id"] == "j1"
+
+    # Le worker chaud est occupé : j2 l'attend jusqu'à affinity_wait
+    assert registry.lease(other) is None
+    job.pending_since -= registry.affinity_wait
+    assigned = registry.lease(other)
+    assert assigned["job_id"] == "j2"
+    assert registry.stats["affinity_hits"] == 1
+
+
+def test_model_unknown_everywhere_is_assigned_at_once(registry):
+    registry.register("a", ["small"])
+    other = registry.register("b", [])["worker_id"]
+    submit(registry, "j1", "large-v3")
+
+    assert registry.lease(other)["job_id"] == "j1"
+
+
+# --- Remise en attente -----------------------------------------------------
+
+def test_requeue_on_lease_expiry(registry):
+    worker = registry.register("w", ["small"])["worker_id"]
+    job = submit(registry, "j1")
+    first = registry.lease(worker)
+    registry.push_segments("j1", first["lease"], 0, [segment(0.0, 4.0)])
+    drain(job)
+
+    job.lease_expires = time.time() - 1
+    registry.reap()
+    assert kinds(job) == ["requeued"]
+    assert registry.snapshot()["pending"] == ["j1"]
+    with pytest.raises(LeaseLost):
+        registry.push_segments("j1", first["lease"], 1, [segment(4.0, 6.0)])
+
+    second = registry.lease(worker)
+    assert second["attempt"] == 2
+    assert second["resume_from"] == 4.0
+    assert second["lease"] != first["lease"]
+
+
+def test_requeue_on_worker_reap(registry):
+    lost = registry.register("lost", ["small"])["worker_id"]
+    spare = registry.register("spare", ["small"])["worker_id"]
+    job = submit(registry, "j1")
+    registry.lease(lost)
+    drain(job)
+
+    registry._workers[lost].last_seen -= registry.worker_timeout + 1
+    registry.reap()
+    assert kinds(job) == ["requeued"]
+    assert registry.stats["workers_lost"] == 1
+    with pytest.raises(KeyError):
+        registry.heartbeat(lost)
+    assert registry.lease(spare)["job_id"] == "j1"
+
+
+def test_error_after_max_attempts(registry):
+    worker = registry.register("w", ["small"])["worker_id"]
+    job = submit(registry, "j1")
+    for _ in range(registry.max_attempts):
+        registry.lease(worker)
+        job.lease_expires = time.time() - 1
+        registry.reap()
+
+    events = drain(job)
+    assert events[-1][0] == "error"
+    assert f"{registry.max_attempts} tentative(s)" in events[-1][1]
+    assert "j1" not in registry._jobs
+    assert registry.lease(worker) is None
+
+
+def test_unregister_does_not_count_an_attempt(registry):
+    leaving = registry.register("leaving", ["small"])["worker_id"]
+    spare = registry.register("spare", ["small"])["worker_id"]
+    job = submit(registry, "j1")
+    registry.lease(leaving)
+
+    registry.unregister(leaving)
+    assert job.attempts == 0
+    assert registry.lease(spare)["attempt"] == 1
+
+
+def test_language_pinned_on_reassignment(registry):
+    worker = registry.register("w", ["small"])["worker_id"]
+    job = submit(registry, "j1")
+    first = registry.lease(worker)
+    assert "language" not in first["params"]
+    registry.push_segments("j1", first["lease"], 0, [segment(0.0, 2.0)], {"language": "fr"})
+
+    registry.fail("j1", first["lease"], "plantage")
+    second = registry.lease(worker)
+    assert second["params"]["language"] == "fr"
+    assert kinds(job)[-2:] == ["requeued", "assigned"]
+
+
+# --- Segments ----------------------------------------------------------------
+
+def test_push_segments_ignores_resent_batch(registry):
+    worker = registry.register("w", ["small"])["worker_id"]
+    job = submit(registry, "j1")
+    lease = registry.lease(worker)["lease"]
+    drain(job)
+
+    batch = [segment(0.0, 1.0, "a"), segment(1.0, 2.0, "b")]
+    assert registry.push_segments("j1", lease, 0, batch) == 2
+    # Même lot renvoyé (réponse perdue), puis lot qui chevauche le précédent
+    assert registry.push_segments("j1", lease, 0, batch) == 2
+    assert registry.push_segments("j1", lease, 1, batch[1:] + [segment(2.0, 3.0, "c")]) == 3
+
+    texts = [seg.text for kind, segments, _ in drain(job) for seg in segments]
+    assert texts == ["a", "b", "c"]
+    assert job.checkpoint == 3.0
+
+
+def test_media_is_reachable_only_with_current_lease(registry):
+    worker = registry.register("w", ["small"])["worker_id"]
+    job = submit(registry, "j1")
+    lease = registry.lease(worker)["lease"]
+
+    assert registry.media(lease) is job
+    registry.complete("j1", lease)
+    with pytest.raises(LeaseLost):
+        registry.media(lease)
@@ -3,21 +3,54 @@ import re
 import sys
 import time
 import threading
-import tempfile
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import ffmpeg
-from faster_whisper import WhisperModel
-from tqdm import tqdm
-from yt_dlp import YoutubeDL
+# Modules légers seulement : numpy (audio, cascade, url_ingest), tqdm et faster-whisper
+# sont importés au premier besoin, pour que le client du démon démarre vite
+from media import probe
+from metrics import span
+from model_cache import get_model
+from result_cache import CachedSegment, default_cache, hash_file, make_key
+from search_index import file_doc_id, get_search_index
+from writers import MultiWriter, parse_formats
+
+if TYPE_CHECKING:  # annotations seulement : url_ingest reste importé au premier besoin
+    from url_ingest import RemoteMedia
+
+# Choix du menu interactif -> formats de sortie
+FORMAT_CHOICES = {"1": ("txt",), "2": ("srt",), "3": ("txt", "srt"), "4": ("vtt",),
+                  "5": ("json",), "6": ("txt", "srt", "vtt", "json")}
+
+class LogStream:
+    """Fichier texte dont chaque écriture est passée au callback `log(texte, flux)`."""
+
+    encoding = "utf-8"
+
+    def __init__(self, log, name: str):
+        self.log = log
+        self.name = name
+
+    def write(self, text: str) -> int:
+        if text:
+            self.log(text, self.name)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
 
 class ProgressTracker:
     def __init__(self):
         self.stop_animation = False
         self.animation_thread = None
+        self.file = None
 
-    def start_spinner(self, message: str):
+    def start_spinner(self, message: str, file=None):
         self.stop_animation = False
+        self.file = file
         self.animation_thread = threading.Thread(target=self._animate_spinner, args=(message,), daemon=True)
         self.animation_thread.start()
 
@@ -25,42 +58,24 @@ class ProgressTracker:
         self.stop_animation = True
         if self.animation_thread:
             self.animation_thread.join()
-        print()
+        print(file=self.file)
 
     def _animate_spinner(self, message: str):
         spinner = ['⠋','⠙','⠹','⠸','⠼','⠴','⠦','⠧','⠇','⠏']
         i = 0
         while not self.stop_animation:
-            print(f'\r{spinner[i]} {message}', end='', flush=True)
+            print(f'\r{spinner[i]} {message}', end='', flush=True, file=self.file)
             i = (i + 1) % len(spinner)
             time.sleep(0.1)
 
-class ProgressHook:
-    def __init__(self):
-        self.pbar = None
-
-    def __call__(self, d):
-        if d['status'] == 'downloading':
-            if self.pbar is None:
-                total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                self.pbar = tqdm(
-                    total=total, unit='B', unit_scale=True,
-                    desc="📥 Téléchargement",
-                    bar_format='{desc}: {percentage:3.1f}%|{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]'
-                )
-            downloaded = d.get('downloaded_bytes', 0)
-            if self.pbar.total and downloaded:
-                self.pbar.n = downloaded
-                self.pbar.refresh()
-        elif d['status'] == 'finished':
-            if self.pbar:
-                self.pbar.close()
-                print("✅ Téléchargement terminé")
-
 class VideoTranscriber:
-    def __init__(self):
+    def __init__(self, compute_type: str = None):
         # Utilise un binaire FFmpeg depuis PATH (ou var d'env), avec fallback optionnel
         self.ffmpeg_bin = os.environ.get("FFMPEG_BIN", "ffmpeg")
+        # Type de calcul des modèles (même clé de cache que le préchargement du démon)
+        self.compute_type = compute_type or os.environ.get("COMPUTE_TYPE", "int8")
+        # Fenêtre de transcription en flux (secondes, 0 = fichier entier)
+        self.stream_window = float(os.environ.get("STREAM_WINDOW_SECONDS", "600"))
         self.supported_formats = ['.mp4','.mkv','.mov','.avi','.mp3','.wav','.m4a','.flac','.webm']
         self.whisper_models = {
             'tiny': 'Très rapide, précision basique (39 MB)',
@@ -70,6 +85,22 @@ class VideoTranscriber:
             'large-v3': 'Très lent, meilleure précision (1550 MB)'
         }
         self.progress_tracker = ProgressTracker()
+        self.result_cache = None
+        # Temps par étape de la dernière transcription (secondes)
+        self.timings = {}
+        self.cascade_stats = None
+        # Événement qui interrompt la transcription en cours (client du démon déconnecté)
+        self.cancel = None
+        # Sortie console de la transcription : callback log(texte, "stdout" | "stderr"),
+        # ou la console du processus (le démon relaie ainsi chaque requête à son client)
+        self.log = None
+
+    def console(self, name: str = "stdout"):
+        """Fichier où écrire les messages et barres de progression de la transcription."""
+        return LogStream(self.log, name) if self.log else getattr(sys, name)
+
+    def say(self, *values, end: str = "\n"):
+        print(*values, end=end, flush=True, file=self.console())
 
     @staticmethod
     def is_url(s: str) -> bool:
@@ -119,7 +150,8 @@ class VideoTranscriber:
             print(f"✅ Fichier valide : {Path(file_path).name} ({size_mb:.1f} MB)")
             return file_path
 
-    def get_youtube_url(self) -> str:
+    def get_youtube_url(self) -> "RemoteMedia":
+        from url_ingest import RemoteMedia, extract_info
         print("\n🌐 URL YOUTUBE")
         print("-" * 15)
         print("💡 Formats acceptés : youtube.com, youtu.be, etc.\n")
@@ -133,8 +165,7 @@ class VideoTranscriber:
                 continue
             self.progress_tracker.start_spinner("Vérification de l'URL...")
             try:
-                with YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
-                    info = ydl.extract_info(url, download=False)
+                info = extract_info(url)
                 self.progress_tracker.stop_spinner()
                 title = info.get('title', 'Titre non disponible')
                 duration = info.get('duration', 0) or 0
@@ -142,7 +173,8 @@ class VideoTranscriber:
                 if duration:
                     m, s = divmod(duration, 60)
                     print(f"   ⏱️  Durée : {m:02d}:{s:02d}")
-                return url
+                # Ces métadonnées servent ensuite au téléchargement (pas de 2e aller-retour)
+                return RemoteMedia(url, info)
             except Exception as e:
                 self.progress_tracker.stop_spinner()
                 print(f"❌ Erreur URL : {e}")
@@ -193,102 +225,169 @@ class VideoTranscriber:
             print("❌ Saisie invalide")
 
     def get_advanced_options(self) -> dict:
+        from cascade import CASCADE_FAST_MODEL, resolve_fast_model
         print("\n⚙️  OPTIONS AVANCÉES")
         print("-" * 20)
         vad_choice = input("Activer la détection d'activité vocale (VAD) ? (o/N) : ").strip().lower()
         use_vad = vad_choice == 'o'
-        print("\nFormats de sortie : 1) TXT  2) SRT  3) TXT+SRT (défaut)")
+        print("\nFormats de sortie : 1) TXT  2) SRT  3) TXT+SRT (défaut)  4) WebVTT  "
+              "5) JSON (horodatage par mot)  6) Tous")
         while True:
-            f = input("Format de sortie (1-3, défaut 3) : ").strip()
-            if f in ("", "1", "2", "3"):
+            f = input("Format de sortie (1-6, défaut 3) : ").strip()
+            if f == "" or f in FORMAT_CHOICES:
                 break
-        return {"use_vad": use_vad, "output_format": f or "3"}
-
-    def download_media(self, url: str, out_dir: Path) -> Path:
-        out_tpl = str(out_dir / "%(title).200B.%(ext)s")
-        progress_hook = ProgressHook()
-        ydl_opts = {
-            "outtmpl": out_tpl,
-            "format": "bestaudio/best",
-            "quiet": True,
-            "no_warnings": True,
-            "progress_hooks": [progress_hook],
-        }
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            fn = ydl.prepare_filename(info)
-        return Path(fn)
-
-    def extract_wav(self, input_path: Path, out_dir: Path) -> Path:
-        wav_path = out_dir / (input_path.stem + ".wav")
-        print(f"🎵 Extraction audio de : {input_path.name}")
-        try:
-            (
-                ffmpeg
-                .input(str(input_path))
-                .output(str(wav_path), ac=1, ar=16000, format="wav", loglevel="error")
-                .overwrite_output()
-                .run(cmd=self.ffmpeg_bin)
-            )
-            print("✅ Audio extrait avec succès")
-            return wav_path
-        except Exception as e:
-            print(f"❌ Erreur extraction audio : {e}")
-            print(f"💡 Vérifiez que FFmpeg est accessible (PATH ou FFMPEG_BIN).")
-            sys.exit(1)
-
-    @staticmethod
-    def format_timestamp_srt(seconds: float) -> str:
-        ms = int(round(seconds * 1000))
-        h, ms = divmod(ms, 3_600_000)
-        m, ms = divmod(ms, 60_000)
-        s, ms = divmod(ms, 1000)
-        return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
-
-    def write_srt(self, segments, srt_path: Path):
-        with open(srt_path, "w", encoding="utf-8") as f:
-            for i, seg in enumerate(segments, start=1):
-                start = self.format_timestamp_srt(seg.start)
-                end = self.format_timestamp_srt(seg.end)
-                text = re.sub(r"\s+", " ", seg.text.strip())
-                f.write(f"{i}\n{start} --> {end}\n{text}\n\n")
-
-    def transcribe_and_save(self, wav_path: Path, model_name: str, language: str,
+        formats = FORMAT_CHOICES[f or "3"]
+        cascade_choice = input(f"Cascade : premier passage rapide ({CASCADE_FAST_MODEL}), modèle choisi "
+                               "seulement sur les passages incertains ? (o/N) : ").strip().lower()
+        return {"use_vad": use_vad, "formats": formats, "words": "json" in formats,
+                "cascade": resolve_fast_model(cascade_choice)}
+
+    def stream_audio(self, input_path: Path, on_progress=None):
+        """Blocs PCM 16 kHz lus depuis ffmpeg au fil de l'eau (pas de WAV temporaire)."""
+        from audio import iter_pcm_chunks
+        self.say(f"🎵 Décodage audio en flux : {input_path.name}")
+        return iter_pcm_chunks(input_path, self.ffmpeg_bin, on_progress=on_progress)
+
+    def transcribe_and_save(self, media_path, model_name: str, language: str,
                             options: dict, output_dir: Path, base_name: str):
-        self.progress_tracker.start_spinner(f"Chargement du modèle {model_name}...")
-        model = WhisperModel(model_name, device="cpu", compute_type="int8")
+        """Transcrit et écrit chaque segment dans tous les formats demandés, en un seul passage.
+
+        `media_path` est un fichier local ou un RemoteMedia. Retourne ({format: chemin}, info).
+        Un échec du décodage lève RuntimeError (message de ffmpeg), sorties partielles supprimées.
+        """
+        from cascade import CascadeTranscription
+        from url_ingest import RemoteMedia
+        words = options.get("words", False)
+        if self.result_cache is None:
+            self.result_cache = default_cache()
+        cached, cache_key = None, None
+        if not words:
+            # Cache de résultats partagé avec le serveur : même média + mêmes options = pas de
+            # re-transcription (le cache ne garde pas l'horodatage par mot)
+            if isinstance(media_path, RemoteMedia):
+                # URL : clé extracteur+id, connue sans rien télécharger
+                content_hash = media_path.content_key
+            else:
+                self.progress_tracker.start_spinner("Calcul de l'empreinte du média...",
+                                                    self.console())
+                try:
+                    with span("hash", self.timings):
+                        content_hash = hash_file(media_path)
+                finally:
+                    self.progress_tracker.stop_spinner()
+            cache_key = make_key(content_hash, model_name, language, options['use_vad'], beam_size=5,
+                                 cascade=options.get("cascade"))
+            cached = self.result_cache.get(cache_key)
+
+        out = MultiWriter(output_dir, base_name, options["formats"], words=words)
+        # Index de recherche partagé avec le serveur (transcript = chemin des sorties)
+        base = Path(output_dir) / base_name
+        indexed = get_search_index().writer(file_doc_id(base), "file", base_name, base)
+        if cached:
+            self.say("⚡ Transcription déjà en cache, aucune re-transcription nécessaire")
+            segments, info = cached
+            with span("write", self.timings), out, indexed:
+                out.write_all(segments)
+                indexed.write_all(segments)
+                out.close(info)
+                indexed.close(info)
+            return out.paths, info
+
+        stream, bar = self.transcribe(media_path, model_name, language, options)
+        self.say(f"💾 Écriture au fil de l'eau : {', '.join(out.paths)}")
+        segments = []  # version compacte (début, fin, texte) pour le cache
+        try:
+            with span("transcribe", self.timings), out, indexed:
+                for seg in stream:
+                    if self.cancel is not None and self.cancel.is_set():
+                        # Sorties partielles et document de l'index supprimés par les writers
+                        raise InterruptedError("Transcription interrompue")
+                    out.write(seg)
+                    indexed.write(seg)
+                    segments.append(CachedSegment(seg.start, seg.end, seg.text))
+                out.close(stream.info)
+                indexed.close(stream.info)
+        finally:
+            if bar:
+                bar.close()
+        info = stream.info
+        if isinstance(stream, CascadeTranscription):
+            self.cascade_stats = stream.summary()
+        if cache_key:
+            self.result_cache.put(cache_key, segments, info.language, info.language_probability,
+                                  getattr(info, "duration", 0.0), model=model_name)
+        return out.paths, info
+
+    def transcribe(self, media_path, model_name: str, language: str, options: dict):
+        """Segments en flux (décodage et transcription à la demande) + barre de décodage à fermer."""
+        from tqdm import tqdm
+        from audio import StreamingTranscription
+        from cascade import CascadeTranscription
+        from url_ingest import RemoteMedia
+        cascade = options.get("cascade")
+        # En cascade, seul le modèle rapide est chargé d'emblée
+        first = cascade or model_name
+        self.progress_tracker.start_spinner(f"Chargement du modèle {first}...", self.console())
+        with span("model_load", self.timings):
+            model = get_model(first, self.compute_type)
         self.progress_tracker.stop_spinner()
-        print(f"✅ Modèle {model_name} chargé")
-        print(f"▶️ Transcription en cours...")
+        self.say(f"✅ Modèle {first} chargé")
+        self.say("▶️ Transcription en cours...")
 
         params = {"language": language, "beam_size": 5}
+        if options.get("words"):
+            params["word_timestamps"] = True
         if options['use_vad']:
             params.update({"vad_filter": True, "vad_parameters": dict(min_silence_duration_ms=500)})
 
-        # Effectue une seule transcription et met en cache la liste des segments
-        seg_iter, info = model.transcribe(str(wav_path), **params)
-        segments = list(seg_iter)  # évite une 2e passe couteuse
-
-        txt_path = output_dir / f"{base_name}.txt"
-        srt_path = output_dir / f"{base_name}.srt"
-
-        if options['output_format'] in ['1', '3']:
-            print("💾 Génération du fichier TXT...")
-            with open(txt_path, "w", encoding="utf-8") as f:
-                for seg in tqdm(segments, desc="TXT", unit="segment"):
-                    f.write(seg.text.strip() + " ")
-
-        if options['output_format'] in ['2', '3']:
-            print("💾 Génération du fichier SRT...")
-            self.write_srt(list(tqdm(segments, desc="SRT", unit="segment")), srt_path)
-
-        return txt_path, srt_path, info
+        # Barre de progression du décodage, d'après la sortie -progress de ffmpeg
+        remote = isinstance(media_path, RemoteMedia)
+        if remote:
+            # Audio seul, transmis à ffmpeg pendant le téléchargement (et gardé en cache)
+            self.say(f"🌐 Téléchargement et décodage en flux : {media_path.title}")
+            duration = media_path.duration
+        else:
+            with span("probe", self.timings):
+                duration = probe(media_path).duration
+        bar = tqdm(total=round(duration), desc="Décodage", unit="s",
+                   file=self.console("stderr")) if duration else None
+
+        def on_progress(position):
+            bar.update(max(0, min(round(position), bar.total) - bar.n))
+
+        # Une seule transcription, consommée une seule fois par les writers
+        # (le décodage ffmpeg se poursuit pendant la transcription des premières fenêtres)
+        if remote:
+            chunks = media_path.chunks(self.ffmpeg_bin, on_progress=on_progress if bar else None)
+        else:
+            chunks = self.stream_audio(media_path, on_progress if bar else None)
+        if cascade:
+            def load_accurate():
+                self.say(f"\n🔁 Passages incertains : chargement du modèle {model_name}")
+                with span("model_load", self.timings):
+                    return get_model(model_name, self.compute_type)
+
+            stream = CascadeTranscription(model, load_accurate, chunks,
+                                          window_seconds=self.stream_window, **params)
+        else:
+            stream = StreamingTranscription(model, chunks, window_seconds=self.stream_window,
+                                            **params)
+        return stream, bar
+
+    def prepare_media(self, source):
+        """Fichier, URL ou RemoteMedia -> (média pour transcribe_and_save, nom de base des sorties)."""
+        from url_ingest import RemoteMedia
+        if isinstance(source, str) and self.is_url(source):
+            source = RemoteMedia(source)
+        if isinstance(source, RemoteMedia):
+            return source, re.sub(r'[<>:"/\\|?*]', '_', source.title)[:200]
+        return Path(source), Path(source).stem
 
     def run(self):
         self.display_header()
         try:
             source_choice = self.get_source_choice()
-            source_path = self.get_local_file() if source_choice == '1' else self.get_youtube_url()
+            source = self.get_local_file() if source_choice == '1' else self.get_youtube_url()
             model_name = self.get_model_choice()
             language = self.get_language_choice()
             options = self.get_advanced_options()
@@ -301,19 +400,15 @@ class VideoTranscriber:
 
             start_time = time.time()
 
-            with tempfile.TemporaryDirectory() as tmpd:
-                tmp_dir = Path(tmpd)
-                if self.is_url(source_path):
-                    media_file = self.download_media(source_path, tmp_dir)
-                    base_name = re.sub(r'[<>:"/\\|?*]', '_', media_file.stem)
-                else:
-                    media_file = Path(source_path)
-                    base_name = media_file.stem
-
-                wav_file = self.extract_wav(media_file, tmp_dir)
-                txt_path, srt_path, info = self.transcribe_and_save(
-                    wav_file, model_name, language, options, output_dir, base_name
+            media, base_name = self.prepare_media(source)
+            try:
+                paths, info = self.transcribe_and_save(
+                    media, model_name, language, options, output_dir, base_name
                 )
+            except RuntimeError as e:
+                print(f"❌ Erreur décodage audio : {e}")
+                print("💡 Vérifiez que FFmpeg est accessible (PATH ou FFMPEG_BIN).")
+                sys.exit(1)
 
             total_time = time.time() - start_time
             minutes, seconds = divmod(int(total_time), 60)
@@ -321,13 +416,17 @@ class VideoTranscriber:
             print("\n" + "="*60)
             print("🎉 TRANSCRIPTION TERMINÉE")
             print("="*60)
-            if options['output_format'] in ['1', '3']:
-                print(f"📄 Fichier TXT : {txt_path}")
-            if options['output_format'] in ['2', '3']:
-                print(f"🎬 Fichier SRT : {srt_path}")
+            for fmt, path in paths.items():
+                print(f"📄 Fichier {fmt.upper()} : {path}")
             print(f"🌍 Langue détectée : {info.language}")
             print(f"📊 Confiance : {info.language_probability:.1%}")
             print(f"⏱️  Temps total : {minutes:02d}:{seconds:02d}")
+            if self.cascade_stats:
+                stats = self.cascade_stats
+                print(f"🔁 Cascade : {stats['escalated_fraction']:.1%} de l'audio réécouté "
+                      f"({stats['regions']} zone(s))")
+            if self.timings:
+                print("⏱️  Étapes : " + " · ".join(f"{k} {v:.1f}s" for k, v in self.timings.items()))
             print(f"📁 Dossier de sortie : {output_dir.absolute()}")
 
         except KeyboardInterrupt:
@@ -336,7 +435,213 @@ class VideoTranscriber:
             print(f"\n❌ Erreur : {e}")
             print("💡 Vérifiez vos paramètres et réessayez")
 
-def main():
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Transcripteur vidéo/audio (sans argument : assistant interactif)")
+    sub = parser.add_subparsers(dest="command")
+
+    batch = sub.add_parser("batch", help="Transcription non interactive de plusieurs fichiers/URL")
+    batch.add_argument("inputs", nargs="*", help="Fichiers, motifs glob (ex: 'videos/**/*.mp4') ou URL")
+    batch.add_argument("--urls", help="Fichier texte contenant une URL par ligne")
+    batch.add_argument("--manifest", help="Manifeste JSON/JSONL : {\"input\": ..., \"model\": ..., \"language\": ..., \"name\": ...}")
+    batch.add_argument("--model", default="small", help="Modèle Whisper (défaut: small)")
+    batch.add_argument("--language", default=None, help="Code langue ISO (défaut: détection auto)")
+    batch.add_argument("--vad", action="store_true", help="Active la détection d'activité vocale")
+    batch.add_argument("--format", type=parse_formats, default=("txt", "srt"),
+                       help="Format(s) de sortie : txt, srt, vtt, json, séparés par des virgules, "
+                            "ou both / all (défaut: txt,srt)")
+    batch.add_argument("--words", action="store_true",
+                       help="Horodatage par mot dans la sortie JSON")
+    batch.add_argument("--cascade", nargs="?", const="true", default=None,
+                       metavar="MODELE_RAPIDE",
+                       help="Premier passage avec un petit modèle (défaut: CASCADE_FAST_MODEL, "
+                            "tiny), --model seulement sur les passages incertains")
+    batch.add_argument("--output-dir", default="transcriptions", help="Dossier de sortie")
+    batch.add_argument("--download-workers", type=int, default=2, help="Téléchargements simultanés")
+    batch.add_argument("--decode-workers", type=int, default=2, help="Décodages FFmpeg simultanés")
+    batch.add_argument("--transcribe-workers", type=int, default=1, help="Transcriptions simultanées")
+    batch.add_argument("--force", action="store_true", help="Retranscrit même si les sorties existent")
+    batch.add_argument("--summary", default=None,
+                       help="Résumé JSON (défaut: <output-dir>/batch_summary.json)")
+
+    run = sub.add_parser("run", help="Transcription non interactive, via le démon local s'il tourne")
+    run.add_argument("inputs", nargs="+", help="Fichiers ou URL")
+    run.add_argument("--model", default="small", help="Modèle Whisper (défaut: small)")
+    run.add_argument("--language", default=None, help="Code langue ISO (défaut: détection auto)")
+    run.add_argument("--vad", action="store_true", help="Active la détection d'activité vocale")
+    run.add_argument("--format", type=parse_formats, default=("txt", "srt"),
+                     help="Format(s) de sortie : txt, srt, vtt, json, both, all (défaut: txt,srt)")
+    run.add_argument("--words", action="store_true", help="Horodatage par mot dans la sortie JSON")
+    run.add_argument("--cascade", nargs="?", const="true", default=None, metavar="MODELE_RAPIDE",
+                     help="Premier passage avec un petit modèle, --model sur les passages incertains")
+    run.add_argument("--output-dir", default="transcriptions", help="Dossier de sortie")
+    run.add_argument("--no-daemon", action="store_true",
+                     help="Transcrit dans ce processus même si un démon tourne")
+    run.add_argument("--json", action="store_true",
+                     help="Une ligne JSON par fichier (mode, durée totale, temps par étape)")
+
+    daemon = sub.add_parser("daemon", help="Démon local : modèles gardés en mémoire entre les "
+                                           "exécutions de `run`")
+    daemon.add_argument("--preload", default=os.environ.get("PRELOAD_MODELS", ""),
+                        help="Modèles chargés au démarrage, ex: small,tiny")
+    daemon.add_argument("--idle-timeout", type=float, default=None,
+                        help="Arrêt après N secondes sans requête (défaut: DAEMON_IDLE_TIMEOUT, 0 = jamais)")
+    daemon.add_argument("--status", action="store_true", help="État du démon en cours d'exécution")
+    daemon.add_argument("--stop", action="store_true", help="Arrête le démon en cours d'exécution")
+
+    worker = sub.add_parser("worker", help="Worker de cluster : transcrit les jobs d'un front "
+                                           "app.py lancé avec CLUSTER_ENABLED=1")
+    worker.add_argument("--server", default=os.environ.get("CLUSTER_SERVER", "http://localhost:5000"),
+                        help="URL du front (défaut: CLUSTER_SERVER ou http://localhost:5000)")
+    worker.add_argument("--slots", type=int, default=int(os.environ.get("WORKER_SLOTS", "1")),
+                        help="Jobs transcrits en parallèle (défaut: WORKER_SLOTS, 1)")
+    worker.add_argument("--preload", default=os.environ.get("PRELOAD_MODELS", ""),
+                        help="Modèles chargés au démarrage et annoncés au front, ex: small,tiny")
+    worker.add_argument("--name", default=None, help="Nom affiché dans /workers (défaut: hôte-pid)")
+
+    search = sub.add_parser("search", help="Recherche plein texte dans les transcriptions indexées")
+    search.add_argument("query", nargs="+", help="Mots (tous requis), \"phrase exacte\" ou préfixe*")
+    search.add_argument("--limit", type=int, default=20, help="Nombre de résultats (défaut: 20)")
+    search.add_argument("--offset", type=int, default=0, help="Résultats à sauter (pagination)")
+    search.add_argument("--doc", default=None, help="Limite la recherche à un document (id de job...)")
+    search.add_argument("--json", action="store_true", help="Résultats en JSON (une ligne par résultat)")
+
+    index = sub.add_parser("index", help="Indexe des transcriptions existantes (TXT, SRT, WebVTT, JSON)")
+    index.add_argument("paths", nargs="+", help="Dossiers ou fichiers (ex: transcriptions/ sorties/)")
+    index.add_argument("--jobs", action="store_true",
+                       help="Sorties du serveur : le nom de fichier est l'identifiant du job")
+    index.add_argument("--force", action="store_true", help="Réindexe même les fichiers inchangés")
+    return parser
+
+def run_files(args, started: float) -> int:
+    """Transcrit chaque entrée via le démon local, ou dans ce processus si aucun démon ne répond.
+
+    `started` : instant de lancement (perf_counter) pour mesurer le temps total,
+    démarrage de l'interpréteur et imports compris à partir de main().
+    """
+    import json
+    import daemon
+
+    options = {"use_vad": args.vad, "formats": list(args.format), "words": args.words,
+               "cascade": args.cascade}
+    output_dir = str(Path(args.output_dir).absolute())
+    transcriber, failures = None, 0
+    for source in args.inputs:
+        req = {"op": "transcribe", "model": args.model, "language": args.language,
+               "options": options, "output_dir": output_dir,
+               # Le démon n'a pas le même dossier courant
+               "source": source if VideoTranscriber.is_url(source) else str(Path(source).absolute())}
+        result = None
+        if not args.no_daemon:
+            try:
+                result, mode = daemon.request(req, on_event=daemon.print_event), "daemon"
+            except daemon.DaemonUnavailable:
+                pass
+            except ConnectionError as e:
+                result, mode = {"event": "error", "message": str(e)}, "daemon"
+        if result is None:
+            transcriber = transcriber or VideoTranscriber()
+            result, mode = daemon.execute(transcriber, req), "local"
+        elapsed = time.perf_counter() - started
+        if args.json:
+            print(json.dumps({"input": source, "mode": mode, "wall_s": round(elapsed, 3), **result},
+                             ensure_ascii=False))
+        elif result["event"] == "done":
+            stages = " · ".join(f"{k} {v:.2f}s" for k, v in result["timings"].items())
+            print(f"✅ {source} → {', '.join(result['paths'].values())}")
+            print(f"⏱️  {elapsed:.2f}s ({'démon' if mode == 'daemon' else 'en processus'})"
+                  + (f" — {stages}" if stages else ""))
+        else:
+            print(f"❌ {source} : {result.get('message')}")
+        if result["event"] != "done":
+            failures += 1
+        started = time.perf_counter()
+    return 1 if failures else 0
+
+def run_daemon(args) -> int:
+    import daemon
+    if args.status or args.stop:
+        try:
+            reply = daemon.request({"op": "shutdown" if args.stop else "ping"})
+        except daemon.DaemonUnavailable:
+            print(f"⚪ Aucun démon sur {daemon.SOCKET_PATH}")
+            return 1
+        if args.stop:
+            print("🛑 Démon arrêté")
+        else:
+            models = ", ".join(m["model"] for m in reply["models"]) or "aucun"
+            print(f"🟢 Démon pid {reply['pid']} — {reply['requests']} requête(s), "
+                  f"actif depuis {reply['uptime_s']:.0f}s, modèles chargés : {models}"
+                  + (" (transcription en cours)" if reply["busy"] else ""))
+        return 0
+    idle = daemon.IDLE_TIMEOUT if args.idle_timeout is None else args.idle_timeout
+    try:
+        daemon.TranscriptionDaemon(preload=args.preload.split(","), idle_timeout=idle).serve()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    except KeyboardInterrupt:
+        print("\n⏹️  Démon arrêté")
+    return 0
+
+def run_worker(args) -> int:
+    from worker_node import ClusterClient, RemoteWorker
+    worker = RemoteWorker(ClusterClient(args.server), name=args.name, slots=args.slots,
+                          preload=args.preload.split(","))
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        print("\n⏹️  Worker arrêté (jobs en cours rendus au front)")
+    return 0
+
+def run_search(args) -> int:
+    import json
+    from search_index import format_ms
+    try:
+        hits = get_search_index().search(" ".join(args.query), args.limit, args.offset,
+                                         doc_id=args.doc)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+    for hit in hits:
+        if args.json:
+            print(json.dumps(hit._asdict(), ensure_ascii=False))
+        else:
+            print(f"[{format_ms(hit.start_ms)} → {format_ms(hit.end_ms)}] {hit.title or hit.doc_id}"
+                  f"  ({hit.score:.2f})\n    {hit.snippet}")
+    if not hits and not args.json:
+        print("Aucun résultat")
+    return 0
+
+def run_index(args) -> int:
+    from search_index import backfill
+
+    def on_file(path, error):
+        print(f"❌ {path} : {error}" if error else f"📇 {path}")
+
+    stats = backfill(get_search_index(), args.paths, jobs=args.jobs, force=args.force,
+                     on_file=on_file)
+    print(f"✅ {stats['indexed']} transcription(s) indexée(s) ({stats['segments']} segments), "
+          f"{stats['skipped']} inchangée(s), {stats['errors']} erreur(s)")
+    return 1 if stats["errors"] else 0
+
+def main(argv=None):
+    started = time.perf_counter()
+    args = build_parser().parse_args(argv)
+    if args.command == "batch":
+        from batch import run_batch
+        sys.exit(run_batch(args))
+    if args.command == "run":
+        sys.exit(run_files(args, started))
+    if args.command == "daemon":
+        sys.exit(run_daemon(args))
+    if args.command == "worker":
+        sys.exit(run_worker(args))
+    if args.command == "search":
+        sys.exit(run_search(args))
+    if args.command == "index":
+        sys.exit(run_index(args))
     VideoTranscriber().run()
 
 if __name__ == "__main__":
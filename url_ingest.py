@@ -0,0 +1,315 @@
+import os
+import re
+import uuid
+import threading
+from pathlib import Path
+from urllib.request import Request, urlopen
+
+from audio import SAMPLE_RATE, PcmDecoder, iter_decoder_chunks, iter_pcm_chunks
+
+# Débit audio minimal jugé suffisant pour de la parole rééchantillonnée à 16 kHz (kbit/s)
+MIN_AUDIO_ABR = float(os.environ.get("MIN_AUDIO_ABR", "40"))
+# Téléchargement HTTP par plages (les plateformes brident les requêtes d'un seul tenant)
+RANGE_BYTES = 10 * 1024 * 1024
+READ_BYTES = 256 * 1024
+HTTP_TIMEOUT = 30
+DIRECT_PROTOCOLS = ("http", "https")
+
+
+def extract_info(url: str) -> dict:
+    """Métadonnées yt-dlp (un seul aller-retour, réutilisé ensuite pour le téléchargement)."""
+    from yt_dlp import YoutubeDL
+    with YoutubeDL({"quiet": True, "no_warnings": True}) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def _format_size(fmt: dict, duration: float) -> float:
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return float(size)
+    abr = fmt.get("abr") or fmt.get("tbr") or 0
+    # Taille inconnue : estimée d'après le débit (inconnu = classé en dernier)
+    return abr * 125 * duration if abr and duration else float("inf")
+
+
+def select_audio_format(info: dict, min_abr: float = MIN_AUDIO_ABR):
+    """Plus petit format audio seul d'au moins `min_abr` kbit/s (sinon le plus proche), ou None.
+
+    À taille égale, un format téléchargeable directement en HTTP (transmis à
+    ffmpeg au fil de l'eau) passe avant un flux segmenté (HLS/DASH).
+    """
+    formats = info.get("formats") or []
+    audio = [f for f in formats
+             if f.get("vcodec") == "none" and f.get("acodec") not in (None, "none") and f.get("url")]
+    if not audio:
+        return None
+    duration = info.get("duration") or 0
+
+    def rank(f):
+        return (f.get("protocol") not in DIRECT_PROTOCOLS, _format_size(f, duration))
+
+    good = [f for f in audio if (f.get("abr") or f.get("tbr") or 0) >= min_abr]
+    if good:
+        return min(good, key=rank)
+    # Aucun format assez riche : le meilleur débit disponible
+    return max(audio, key=lambda f: f.get("abr") or f.get("tbr") or 0)
+
+
+def media_key(info: dict) -> str:
+    """Clé stable d'un média distant : extracteur + identifiant."""
+    extractor = info.get("extractor_key") or info.get("extractor") or "generic"
+    return re.sub(r"[^\w.-]", "_", f"{extractor}_{info.get('id') or 'media'}")
+
+
+class DownloadCache:
+    """Cache disque des médias téléchargés (clé extracteur+id), avec éviction LRU sur la taille.
+
+    Un fichier par média : `<clé>.<ext>`. Les téléchargements en cours sont
+    écrits dans un `.part` puis renommés, une entrée n'est donc jamais partielle.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 2048 * 1024 * 1024):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _entries(self):
+        return [p for p in self.root.iterdir() if p.is_file() and p.suffix != ".part"]
+
+    def get(self, key: str):
+        """Chemin du média en cache (et mise à jour LRU), ou None."""
+        for path in self.root.glob(f"{key}.*"):
+            if path.suffix == ".part":
+                continue
+            try:
+                os.utime(path)
+            except OSError:
+                continue
+            with self._lock:
+                self.stats["hits"] += 1
+            return path
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def part_path(self, key: str, ext: str) -> Path:
+        return self.root / f"{key}.{ext or 'bin'}.{uuid.uuid4().hex[:8]}.part"
+
+    def commit(self, part: Path, key: str, ext: str) -> Path:
+        path = self.root / f"{key}.{ext or 'bin'}"
+        os.replace(part, path)
+        with self._lock:
+            self.stats["stores"] += 1
+            self._evict_locked(keep=path)
+        return path
+
+    def _evict_locked(self, keep: Path = None):
+        if not self.max_bytes:
+            return
+        entries = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if p == keep:
+                continue
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        entries = self._entries()
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({"entries": len(entries), "size_bytes": sum(p.stat().st_size for p in entries),
+                      "max_bytes": self.max_bytes, "root": str(self.root.absolute())})
+        return stats
+
+
+def _http_blocks(fmt: dict):
+    """Octets du format, requêtes par plages de RANGE_BYTES quand la taille est connue."""
+    headers = dict(fmt.get("http_headers") or {})
+    size = fmt.get("filesize")
+    pos = 0
+    while True:
+        if size:
+            headers["Range"] = f"bytes={pos}-{min(pos + RANGE_BYTES, size) - 1}"
+        with urlopen(Request(fmt["url"], headers=headers), timeout=HTTP_TIMEOUT) as resp:
+            for block in iter(lambda: resp.read(READ_BYTES), b""):
+                pos += len(block)
+                yield block
+        if not size or pos >= size:
+            return
+
+
+class RemoteMedia:
+    """Média désigné par une URL (YouTube...) : audio seul, décodé pendant le téléchargement.
+
+    `info` (métadonnées yt-dlp) est extrait au premier besoin s'il n'est pas
+    fourni. Le fichier téléchargé est conservé dans le DownloadCache : une URL
+    déjà vue est relue depuis le disque, sans réseau.
+    """
+
+    def __init__(self, url: str, info: dict = None, cache: DownloadCache = None):
+        self.url = url
+        self._info = info
+        self.cache = cache or get_download_cache()
+
+    @property
+    def info(self) -> dict:
+        if self._info is None:
+            self._info = extract_info(self.url)
+        return self._info
+
+    @property
+    def key(self) -> str:
+        return media_key(self.info)
+
+    @property
+    def content_key(self) -> str:
+        """Remplace l'empreinte du fichier dans les clés du cache des transcriptions."""
+        return f"url:{self.key}"
+
+    @property
+    def title(self) -> str:
+        return self.info.get("title") or "media"
+
+    @property
+    def duration(self) -> float:
+        return float(self.info.get("duration") or 0.0)
+
+    def cached_path(self):
+        return self.cache.get(self.key)
+
+    def fetch(self) -> Path:
+        """Télécharge le média dans le cache (sans décoder) et retourne son chemin."""
+        path = self.cached_path()
+        if path is not None:
+            return path
+        fmt = select_audio_format(self.info)
+        if fmt is None or fmt.get("protocol") not in DIRECT_PROTOCOLS:
+            return self._fetch_ytdlp(fmt)
+        part = self.cache.part_path(self.key, fmt.get("ext"))
+        try:
+            with open(part, "wb") as f:
+                for block in _http_blocks(fmt):
+                    f.write(block)
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+        return self.cache.commit(part, self.key, fmt.get("ext"))
+
+    def _fetch_ytdlp(self, fmt: dict = None) -> Path:
+        """Flux segmentés (HLS/DASH) ou sans format audio seul : téléchargement par yt-dlp."""
+        from yt_dlp import YoutubeDL
+        tmp_name = f"{self.key}.{uuid.uuid4().hex[:8]}"
+        opts = {"outtmpl": str(self.cache.root / f"{tmp_name}.%(ext)s"),
+                "format": fmt["format_id"] if fmt else "bestaudio/best",
+                "quiet": True, "no_warnings": True}
+        with YoutubeDL(opts) as ydl:
+            info = ydl.process_ie_result(dict(self.info), download=True)
+            path = Path(ydl.prepare_filename(info))
+        ext = path.suffix.lstrip(".")
+        part = path.with_name(path.name + ".part")
+        os.replace(path, part)
+        return self.cache.commit(part, self.key, ext)
+
+    def chunks(self, ffmpeg_bin: str = None, chunk_seconds: float = 30.0, start: float = 0.0,
+               prefetch: int = 2, on_progress=None):
+        """Blocs PCM 16 kHz produits pendant le téléchargement (même interface que iter_pcm_chunks).
+
+        Les octets reçus vont à la fois dans le stdin de ffmpeg et dans le cache.
+        Si ffmpeg ne peut pas lire le conteneur en flux, le téléchargement se
+        termine dans le cache et le décodage reprend depuis le fichier.
+        """
+        path = self.cached_path()
+        fmt = None if path is not None else select_audio_format(self.info)
+        if path is None and (fmt is None or fmt.get("protocol") not in DIRECT_PROTOCOLS):
+            path = self._fetch_ytdlp(fmt)
+        if path is not None:
+            yield from iter_pcm_chunks(path, ffmpeg_bin, chunk_seconds, start, prefetch, on_progress)
+            return
+
+        ext = fmt.get("ext")
+        part = self.cache.part_path(self.key, ext)
+        dec = PcmDecoder(None, ffmpeg_bin, start, on_progress=on_progress, feed=True).open()
+        feeder_error = []
+        stop = threading.Event()
+
+        def feed():
+            stdin, feeding = dec.proc.stdin, True
+            try:
+                with open(part, "wb") as f:
+                    for block in _http_blocks(fmt):
+                        if stop.is_set():
+                            return
+                        f.write(block)
+                        if feeding:
+                            try:
+                                stdin.write(block)
+                            except (BrokenPipeError, OSError, ValueError):
+                                feeding = False  # ffmpeg a abandonné : on finit le fichier seul
+            except BaseException as e:
+                feeder_error.append(e)
+            finally:
+                try:
+                    stdin.close()
+                except (BrokenPipeError, OSError, ValueError):
+                    pass
+
+        feeder = threading.Thread(target=feed, name="url-download", daemon=True)
+        feeder.start()
+        decoded = 0
+        committed = False
+        try:
+            try:
+                for chunk in iter_decoder_chunks(dec, int(chunk_seconds * SAMPLE_RATE), prefetch):
+                    decoded += len(chunk)
+                    yield chunk
+                stream_error = None
+            except RuntimeError as e:
+                stream_error = e
+            feeder.join()
+            if feeder_error:
+                raise feeder_error[0]
+            path = self.cache.commit(part, self.key, ext)
+            committed = True
+            if stream_error is not None or not decoded:
+                # Conteneur illisible en flux (index en fin de fichier, ffmpeg sort parfois
+                # sans erreur ni audio) : relecture depuis le fichier complet
+                yield from iter_pcm_chunks(path, ffmpeg_bin, chunk_seconds,
+                                           start + decoded / SAMPLE_RATE, prefetch, on_progress)
+        finally:
+            if not committed:
+                # Abandon (ou erreur) avant la fin : le téléchargement partiel est jeté
+                stop.set()
+                if dec.proc is not None and dec.proc.poll() is None:
+                    dec.proc.kill()
+                feeder.join(timeout=HTTP_TIMEOUT)
+                part.unlink(missing_ok=True)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_download_cache() -> DownloadCache:
+    """Cache partagé par le serveur et la CLI (mêmes variables d'environnement)."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            root = Path(os.environ.get("DOWNLOAD_CACHE_DIR", "cache/downloads"))
+            max_mb = float(os.environ.get("DOWNLOAD_CACHE_MB", "2048"))
+            _default_cache = DownloadCache(root, int(max_mb * 1024 * 1024))
+        return _default_cache
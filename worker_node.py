@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import socket
+import threading
+import urllib.error
+import urllib.request
+from contextlib import closing
+
+from audio import StreamingTranscription, iter_pcm_chunks
+from cluster import CLUSTER_TOKEN, encode_info, encode_segment
+from model_cache import get_cache
+from scheduler import split_cpu_threads
+
+# Front à contacter (app.py lancé avec CLUSTER_ENABLED=1)
+CLUSTER_SERVER = os.environ.get("CLUSTER_SERVER", "http://localhost:5000")
+WORKER_SLOTS = int(os.environ.get("WORKER_SLOTS", "1"))
+COMPUTE_TYPE = os.environ.get("COMPUTE_TYPE", "int8")
+FFMPEG_PATH = os.environ.get("FFMPEG_BIN", "ffmpeg")
+STREAM_WINDOW_SECONDS = float(os.environ.get("STREAM_WINDOW_SECONDS", "600"))
+# Segments renvoyés au front par lots, au plus toutes les FLUSH_SECONDS secondes
+FLUSH_SECONDS = float(os.environ.get("WORKER_FLUSH_SECONDS", "1"))
+# Attente d'un job côté front à chaque demande (long polling)
+LEASE_WAIT = float(os.environ.get("WORKER_LEASE_WAIT", "20"))
+
+
+class JobAborted(Exception):
+    """Le front a retiré le job à ce worker (annulé ou réattribué)."""
+
+
+class ClusterClient:
+    """Appels JSON vers le front (urllib), avec le jeton partagé du cluster."""
+
+    def __init__(self, server: str = CLUSTER_SERVER, token: str = CLUSTER_TOKEN):
+        self.server = server.rstrip("/")
+        self.token = token
+
+    def url(self, path: str) -> str:
+        return self.server + path
+
+    def headers(self, lease: str = None) -> dict:
+        headers = {}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if lease:
+            headers["X-Lease"] = lease
+        return headers
+
+    def call(self, method: str, path: str, payload: dict = None, lease: str = None,
+             timeout: float = 30.0):
+        """Retourne (code HTTP, corps JSON ou None). Les erreurs réseau lèvent OSError."""
+        data = json.dumps(payload).encode() if payload is not None else None
+        headers = self.headers(lease)
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.url(path), data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                body = resp.read()
+                return resp.status, json.loads(body) if body else None
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            try:
+                return e.code, json.loads(body) if body else None
+            except ValueError:
+                return e.code, None
+
+
+class RemoteWorker:
+    """Worker de transcription d'un cluster : demande des jobs au front et lui renvoie les segments.
+
+    Chaque place (`slots`) est un thread qui demande un job, lit le média
+    depuis le front (ou l'URL d'origine), transcrit en flux et renvoie ses
+    segments par lots. Un thread de heartbeat annonce les modèles chargés et
+    les places libres, et interrompt les jobs que le front a retirés.
+    """
+
+    def __init__(self, client: ClusterClient, name: str = None, slots: int = WORKER_SLOTS,
+                 preload=(), compute_type: str = COMPUTE_TYPE):
+        self.client = client
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.slots = max(1, slots)
+        self.preload = [m.strip() for m in preload if m.strip()]
+        self.compute_type = compute_type
+        self.cpu_threads = split_cpu_threads(self.slots)
+        self.cache = get_cache()
+        # Les places partagent les instances de modèle du cache
+        self.cache.num_workers = self.slots
+        self.worker_id = None
+        self.heartbeat_seconds = 5.0
+        self._jobs = {}                 # job_id -> Event d'abandon
+        self._jobs_lock = threading.Lock()
+        self._register_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def models(self) -> list:
+        return sorted({m["model"] for m in self.cache.loaded()})
+
+    def free_slots(self) -> int:
+        with self._jobs_lock:
+            return self.slots - len(self._jobs)
+
+    def register(self, stale_id: str = None):
+        """(Ré)enregistrement ; `stale_id` évite que deux places le refassent en même temps."""
+        with self._register_lock:
+            if stale_id is not None and self.worker_id != stale_id:
+                return
+            while not self._stop.is_set():
+                try:
+                    code, body = self.client.call("POST", "/workers/register", {
+                        "name": self.name, "models": self.models(), "slots": self.slots})
+                except OSError as e:
+                    code, body = None, {"error": str(e)}
+                if code == 201:
+                    self.worker_id = body["worker_id"]
+                    self.heartbeat_seconds = body.get("heartbeat_seconds", self.heartbeat_seconds)
+                    print(f"🟢 Worker {self.name} enregistré auprès de {self.client.server} "
+                          f"({self.slots} place(s), modèles : {', '.join(self.models()) or 'aucun'})")
+                    return
+                reason = (body or {}).get("error") or code
+                print(f"⏳ {'Enregistrement refusé' if code else 'Front injoignable'} ({reason}), "
+                      f"nouvel essai…")
+                self._stop.wait(self.heartbeat_seconds)
+
+    def run(self):
+        if self.preload:
+            print(f"🧠 Préchargement des modèles : {', '.join(self.preload)}")
+            self.cache.preload(self.preload, self.compute_type, self.cpu_threads)
+        self.register()
+        threads = [threading.Thread(target=self._heartbeat_loop, name="worker-heartbeat", daemon=True)]
+        threads += [threading.Thread(target=self._slot_loop, name=f"worker-slot-{i}", daemon=True)
+                    for i in range(self.slots)]
+        for t in threads:
+            t.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Quitte le cluster : les jobs en cours sont rendus au front, qui les réattribue."""
+        if self._stop.is_set() and self.worker_id is None:
+            return
+        self._stop.set()
+        with self._jobs_lock:
+            for cancel in self._jobs.values():
+                cancel.set()
+        if self.worker_id:
+            try:
+                self.client.call("DELETE", f"/workers/{self.worker_id}", timeout=5)
+            except OSError:
+                pass
+            self.worker_id = None
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            worker_id = self.worker_id
+            with self._jobs_lock:
+                running = list(self._jobs)
+            try:
+                code, body = self.client.call("POST", f"/workers/{worker_id}/heartbeat", {
+                    "models": self.models(), "free_slots": self.free_slots(), "jobs": running})
+            except OSError:
+                continue  # front momentanément injoignable : les baux couvrent l'intervalle
+            if code == 404:
+                self.register(worker_id)
+                code, body = 200, {"cancel": running}
+            for job_id in (body or {}).get("cancel", ()):
+                with self._jobs_lock:
+                    cancel = self._jobs.get(job_id)
+                if cancel is not None:
+                    cancel.set()
+
+    def _slot_loop(self):
+        while not self._stop.is_set():
+            worker_id = self.worker_id
+            try:
+                code, job = self.client.call("POST", f"/workers/{worker_id}/lease", {
+                    "models": self.models(), "free_slots": self.free_slots(), "wait": LEASE_WAIT},
+                    timeout=LEASE_WAIT + 30)
+            except OSError:
+                self._stop.wait(self.heartbeat_seconds)
+                continue
+            if code == 404:
+                self.register(worker_id)
+            elif code == 200 and job:
+                self._run_job(job)
+            elif code != 204:
+                print(f"⚠️  Demande de job refusée ({code}) : {(job or {}).get('error', '')}")
+                self._stop.wait(self.heartbeat_seconds)
+
+    def _chunks(self, job: dict):
+        """Blocs PCM du job, à partir de son point de reprise."""
+        start = job["resume_from"]
+        if job["media"] == "url":
+            from url_ingest import RemoteMedia
+            return RemoteMedia(job["url"]).chunks(FFMPEG_PATH, start=start)
+        # ffmpeg lit le média en HTTP depuis le front (Range pour la reprise), via une
+        # URL propre au bail : sa ligne de commande est lisible par tous les utilisateurs
+        path = f"/workers/media/{job['lease']}"
+        return iter_pcm_chunks(self.client.url(path), FFMPEG_PATH, start=start)
+
+    def _transcription(self, job: dict, chunks):
+        params = job.get("params") or {}
+        if job.get("cascade"):
+            from cascade import CascadeTranscription
+            fast = self.cache.get(job["cascade"], self.compute_type, self.cpu_threads)
+            return CascadeTranscription(
+                fast, lambda: self.cache.get(job["model"], self.compute_type, self.cpu_threads),
+                chunks, window_seconds=STREAM_WINDOW_SECONDS, offset=job["resume_from"], **params)
+        model = self.cache.get(job["model"], self.compute_type, self.cpu_threads)
+        return StreamingTranscription(model, chunks, window_seconds=STREAM_WINDOW_SECONDS,
+                                      offset=job["resume_from"], **params)
+
+    def _send(self, job: dict, op: str, payload: dict):
+        """Envoi au front, réessayé pendant la durée du bail (les lots ne sont pas dupliqués)."""
+        deadline = time.monotonic() + job.get("lease_seconds", 30)
+        while True:
+            try:
+                code, body = self.client.call("POST", f"/workers/jobs/{job['job_id']}/{op}",
+                                              payload, lease=job["lease"])
+            except OSError as e:
+                code, body = None, {"error": str(e)}
+            if code == 200:
+                return body
+            if code == 409:
+                raise JobAborted((body or {}).get("error") or "Job retiré")
+            if time.monotonic() > deadline:
+                raise JobAborted(f"Front injoignable : {(body or {}).get('error') or code}")
+            self._stop.wait(1.0)
+
+    def _run_job(self, job: dict):
+        job_id = job["job_id"]
+        cancel = threading.Event()
+        with self._jobs_lock:
+            self._jobs[job_id] = cancel
+        started = time.time()
+        print(f"▶️  Job {job_id} (modèle {job['model']}, tentative {job['attempt']}"
+              + (f", reprise à {job['resume_from']:.1f}s" if job["resume_from"] else "") + ")")
+        try:
+            segments = self._transcription(job, self._chunks(job))
+            batch, first, last_flush = [], 0, time.monotonic()
+            with closing(iter(segments)) as seg_iter:
+                for seg in seg_iter:
+                    if cancel.is_set():
+                        raise JobAborted("Job retiré par le front")
+                    batch.append(encode_segment(seg))
+                    if time.monotonic() - last_flush >= FLUSH_SECONDS:
+                        self._send(job, "segments", {"first": first, "segments": batch,
+                                                     "info": encode_info(segments.info)})
+                        first, batch, last_flush = first + len(batch), [], time.monotonic()
+            if cancel.is_set():
+                raise JobAborted("Job retiré par le front")
+            summary = segments.summary() if job.get("cascade") else None
+            self._send(job, "complete", {"first": first, "segments": batch,
+                                         "info": encode_info(segments.info), "summary": summary})
+            print(f"✅ Job {job_id} terminé en {time.time() - started:.1f}s")
+        except JobAborted as e:
+            print(f"⏹️  Job {job_id} abandonné : {e}")
+        except Exception as e:
+            print(f"❌ Job {job_id} : {e}")
+            try:
+                self._send(job, "fail", {"error": str(e)})
+            except JobAborted:
+                pass
+        finally:
+            with self._jobs_lock:
+                self._jobs.pop(job_id, None)
@@ -0,0 +1,189 @@
+import re
+import json
+from pathlib import Path
+
+FORMATS = ("txt", "srt", "vtt", "json")
+# Raccourcis acceptés par --format / ?format=
+FORMAT_ALIASES = {"both": ("txt", "srt"), "all": FORMATS}
+
+
+def parse_formats(value, default=("txt",)) -> tuple:
+    """"srt,vtt" / "both" / "all" / liste -> tuple de formats valides (ValueError sinon)."""
+    if not value:
+        return tuple(default)
+    items = value.split(",") if isinstance(value, str) else list(value)
+    formats = []
+    for item in items:
+        item = item.strip().lower()
+        for fmt in FORMAT_ALIASES.get(item, (item,)):
+            if fmt not in FORMATS:
+                raise ValueError(f"Format inconnu : {fmt} (attendus : {', '.join(FORMATS)})")
+            if fmt not in formats:
+                formats.append(fmt)
+    return tuple(formats) or tuple(default)
+
+
+def format_timestamp(seconds: float, sep: str = ",") -> str:
+    """HH:MM:SS,mmm (SRT) ou HH:MM:SS.mmm (WebVTT)."""
+    ms = int(round(max(seconds, 0.0) * 1000))
+    h, ms = divmod(ms, 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}{sep}{ms:03d}"
+
+
+def format_txt_line(text: str, end: float) -> str:
+    """Ligne TXT du serveur : texte normalisé suivi de l'horodatage de fin."""
+    text = " ".join(text.strip().split())
+    h = int(end // 3600); m = int((end % 3600) // 60); s = int(end % 60)
+    return f"{text} [{h:02d}:{m:02d}:{s:02d}]\n"
+
+
+class SegmentWriter:
+    """Écrit les segments dans un fichier au fur et à mesure (rien n'est gardé en mémoire)."""
+
+    extension = ""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.f = open(self.path, "w", encoding="utf-8")
+        self.count = 0
+        self.header()
+
+    def header(self):
+        pass
+
+    def write(self, seg):
+        self.count += 1
+        self.f.write(self.format(seg))
+        self.f.flush()
+
+    def format(self, seg) -> str:
+        raise NotImplementedError
+
+    def close(self, info=None):
+        if not self.f.closed:
+            self.f.close()
+
+
+class TxtWriter(SegmentWriter):
+    """TXT "timestamped" (serveur : une ligne par segment + heure de fin) ou "plain" (CLI)."""
+
+    extension = ".txt"
+
+    def __init__(self, path: Path, style: str = "plain"):
+        self.style = style
+        super().__init__(path)
+
+    def format(self, seg) -> str:
+        if self.style == "timestamped":
+            return format_txt_line(seg.text, seg.end)
+        return seg.text.strip() + " "
+
+
+class SrtWriter(SegmentWriter):
+    extension = ".srt"
+
+    def format(self, seg) -> str:
+        text = re.sub(r"\s+", " ", seg.text.strip())
+        return (f"{self.count}\n{format_timestamp(seg.start)} --> "
+                f"{format_timestamp(seg.end)}\n{text}\n\n")
+
+
+class VttWriter(SegmentWriter):
+    extension = ".vtt"
+
+    def header(self):
+        self.f.write("WEBVTT\n\n")
+
+    def format(self, seg) -> str:
+        text = re.sub(r"\s+", " ", seg.text.strip())
+        return f"{format_timestamp(seg.start, '.')} --> {format_timestamp(seg.end, '.')}\n{text}\n\n"
+
+
+class JsonWriter(SegmentWriter):
+    """Document JSON écrit en flux : {"segments": [...], "language": ..., "duration": ...}."""
+
+    extension = ".json"
+
+    def __init__(self, path: Path, words: bool = False):
+        self.words = words
+        super().__init__(path)
+
+    def header(self):
+        self.f.write('{"segments": [\n')
+
+    def format(self, seg) -> str:
+        item = {"start": round(seg.start, 3), "end": round(seg.end, 3), "text": seg.text.strip()}
+        if self.words and getattr(seg, "words", None):
+            item["words"] = [{"start": round(w.start, 3), "end": round(w.end, 3),
+                              "word": w.word, "probability": round(w.probability, 4)}
+                             for w in seg.words]
+        sep = ",\n" if self.count > 1 else ""
+        return sep + json.dumps(item, ensure_ascii=False)
+
+    def close(self, info=None):
+        if self.f.closed:
+            return
+        meta = {"language": getattr(info, "language", None),
+                "language_probability": getattr(info, "language_probability", None),
+                "duration": getattr(info, "duration", None)}
+        tail = ", ".join(f"{json.dumps(k)}: {json.dumps(v)}" for k, v in meta.items())
+        self.f.write(f"\n], {tail}}}\n")
+        super().close()
+
+
+class MultiWriter:
+    """Un seul passage sur le générateur de segments, écrit dans tous les formats demandés.
+
+    `paths` associe chaque format à son fichier `<output_dir>/<base_name>.<ext>`.
+    En cas d'exception dans le bloc `with`, les fichiers partiels sont supprimés.
+    """
+
+    def __init__(self, output_dir: Path, base_name: str, formats=("txt",),
+                 txt_style: str = "plain", words: bool = False):
+        self.writers = {}
+        self.paths = {}
+        output_dir = Path(output_dir)
+        try:
+            for fmt in parse_formats(formats):
+                path = output_dir / f"{base_name}.{fmt}"
+                if fmt == "txt":
+                    writer = TxtWriter(path, txt_style)
+                elif fmt == "srt":
+                    writer = SrtWriter(path)
+                elif fmt == "vtt":
+                    writer = VttWriter(path)
+                else:
+                    writer = JsonWriter(path, words)
+                self.writers[fmt] = writer
+                self.paths[fmt] = path
+        except Exception:
+            self.abort()
+            raise
+
+    def write(self, seg):
+        for writer in self.writers.values():
+            writer.write(seg)
+
+    def write_all(self, segments):
+        for seg in segments:
+            self.write(seg)
+
+    def close(self, info=None):
+        for writer in self.writers.values():
+            writer.close(info)
+
+    def abort(self):
+        for writer in self.writers.values():
+            writer.close()
+            writer.path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()